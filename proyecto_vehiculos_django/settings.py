@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -51,6 +52,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'vehiculo.middleware.PrimariaStickyMiddleware',
+    'vehiculo.middleware.RateLimitMiddleware',
 ]
 
 ROOT_URLCONF = 'proyecto_vehiculos_django.urls'
@@ -67,6 +70,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'vehiculo.context_processors.user_vehiculos',
+                'vehiculo.context_processors.theme_context',
             ],
         },
     },
@@ -78,13 +82,198 @@ WSGI_APPLICATION = 'proyecto_vehiculos_django.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
+# Motor de base de datos según el entorno: SQLite por defecto, PostgreSQL
+# con DATABASE_ENGINE=postgresql (requiere requirements-postgres.txt).
+DATABASE_ENGINE = os.environ.get('DATABASE_ENGINE', 'sqlite')
+
+if DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'vehiculos'),
+            'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            # Conexiones persistentes por worker, verificadas antes de reutilizarse
+            'CONN_MAX_AGE': int(os.environ.get('POSTGRES_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+            'TEST': {
+                'NAME': os.environ.get('POSTGRES_TEST_DB', 'test_vehiculos'),
+            },
+        }
+    }
+    if os.environ.get('POSTGRES_POOL') == '1':
+        # Pool de psycopg 3 integrado en Django 5.1; reemplaza a CONN_MAX_AGE
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('POSTGRES_POOL_MIN', 2)),
+            'max_size': int(os.environ.get('POSTGRES_POOL_MAX', 10)),
+            'timeout': 10,
+        }
+    INSTALLED_APPS.append('django.contrib.postgres')
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # Tomar el candado de escritura al abrir la transacción evita
+                # errores "database is locked" al promover un lector a escritor
+                'transaction_mode': 'IMMEDIATE',
+            },
+            # Base de tests en archivo: la de memoria compartida no admite
+            # escritores concurrentes desde varios hilos
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
+    }
+
+# Réplicas de solo lectura para el catálogo (vehiculo/routers.py). Se
+# declaran por entorno: rutas de archivos SQLite en SQLITE_REPLICAS o hosts
+# en POSTGRES_REPLICA_HOSTS, separados por comas. Sin réplicas todo va a la
+# primaria.
+if DATABASE_ENGINE == 'postgresql':
+    _replicas = [
+        {**DATABASES['default'], 'HOST': host}
+        for host in filter(None, os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(','))
+    ]
+else:
+    _replicas = [
+        {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path}
+        for path in filter(None, os.environ.get('SQLITE_REPLICAS', '').split(','))
+    ]
+for _numero, _replica in enumerate(_replicas, start=1):
+    DATABASES[f'replica{_numero}'] = {**_replica, 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['vehiculo.routers.ReplicaRouter']
+
+VEHICULO_REPLICAS = {
+    'ALIASES': [f'replica{_numero}' for _numero in range(1, len(_replicas) + 1)],
+    'MODELS': ['vehiculo.vehiculo', 'vehiculo.estadisticamercado'],
+    'STICKY_SECONDS': 5,
+    'MAX_LAG': 2.0,
+    'LAG_CHECK_INTERVAL': 5.0,
+}
+
+# PRAGMA aplicados a cada conexión SQLite nueva (vehiculo/sqlite.py).
+# `manage.py benchmark_sqlite` compara este perfil contra los valores por defecto.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # Seguro con WAL; solo el último commit puede perderse ante un corte de luz
+    'busy_timeout': 5000,  # Milisegundos esperando el candado antes de fallar
+    'cache_size': -20000,  # Negativo = KiB (≈20 MB por conexión)
+    'mmap_size': 134217728,  # 128 MB mapeados en memoria
+    'temp_store': 'MEMORY',
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Backend compartido por todos los workers (L2 de vehiculo/cache.py)
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'django',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # Buckets del límite de peticiones, separados del catálogo: un cliente
+    # que rota IPs no debe desalojar las versiones de namespace de 'default'.
+    # En memoria el límite es por proceso: vale para desarrollo, pero
+    # `check --deploy` falla (vehiculo.E001) hasta definir RATELIMIT_REDIS_URL.
+    'ratelimit': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'vehiculo-ratelimit',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
+if os.environ.get('RATELIMIT_REDIS_URL'):
+    CACHES['ratelimit'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['RATELIMIT_REDIS_URL'],
     }
+
+# Caché de dos niveles de la app vehiculo: TTL por namespace en segundos
+VEHICULO_CACHE = {
+    'ALIAS': 'default',
+    'L1_MAX_ENTRIES': 1000,
+    'L1_TTL': 30,
+    'NAMESPACES': {
+        'imagenes': 3600,
+        'filtros': 300,
+        'tarjetas': 900,  # La clave ya cambia con fecha_actualizacion
+        'paginas': 600,  # La clave ya cambia con la versión del catálogo
+    },
+}
+
+
+# Límite de peticiones por nombre de URL (vehiculo/ratelimit.py): token
+# bucket por IP y por usuario en la caché 'ratelimit'. '120/m' = ráfaga de
+# 120 y recarga de 120 por minuto. VEHICULO_RATELIMIT=0 lo desactiva.
+# Detrás de un proxy: RATELIMIT_IP_HEADER=HTTP_X_FORWARDED_FOR y
+# RATELIMIT_TRUSTED_PROXIES = cuántos proxies propios añaden una entrada.
+# Cada intento paga el hash PBKDF2; las tres URLs de login gastan del mismo
+# bucket 'auth' para que alternarlas no triplique el límite
+_LOGIN = {'tasa': '10/m', 'metodos': ['POST'], 'bucket': 'auth'}
+VEHICULO_RATELIMIT = {
+    'ENABLED': os.environ.get('VEHICULO_RATELIMIT', '1') != '0',
+    'CACHE_ALIAS': 'ratelimit',
+    'IP_HEADER': os.environ.get('RATELIMIT_IP_HEADER') or None,
+    'TRUSTED_PROXIES': int(os.environ.get('RATELIMIT_TRUSTED_PROXIES', 1)),
+    'RULES': {
+        'vehiculo:vehiculos_api': '120/m',
+        'vehiculo:vehiculos_api_async': '120/m',
+        'vehiculo:vehiculos_batch': '120/m',
+        'vehiculo:estadisticas': '120/m',
+        'vehiculo:detalle_api_async': '120/m',
+        'vehiculo:toggle_favorito': '60/m',
+        'vehiculo:toggle_favorito_async': '60/m',
+        'vehiculo:favorito': '60/m',
+        'vehiculo:favoritos_batch': '30/m',
+        'vehiculo:vehiculos_eventos': '30/m',  # Reconexiones del feed SSE
+        'unified_auth': _LOGIN,
+        'login': _LOGIN,
+        'signup': _LOGIN,
+    },
 }
 
+# Feed SSE del catálogo (vehiculo/eventos.py), servido de forma async bajo ASGI
+VEHICULO_SSE = {
+    'POLL_INTERVAL': 1.0,
+    'HEARTBEAT': 15.0,
+    'MAX_DURATION': 300.0,
+    'COMMIT_MARGIN': 1.0,
+}
+
+# Sincronización incremental de vehiculos_api con ?since= (vehiculo/delta.py).
+# Los cambios se conservan RETENCION_DIAS; compactar con `manage.py compactar_cambios`.
+# MARGEN (segundos) debe superar la transacción de escritura más larga: las
+# filas de una transacción que tarde más se pierden del delta.
+VEHICULO_DELTA = {
+    'MARGEN': 60.0,
+    'RETENCION_DIAS': 30,
+}
+
+# Sesiones: lectura desde la caché y escritura en la base de datos.
+# Las filas vencidas se eliminan con `manage.py purgar_sesiones`.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# El tema visual vive en una cookie firmada, no en la sesión, para que las
+# páginas anónimas no lean ni creen sesiones
+THEME_COOKIE_NAME = 'tema'
+THEME_COOKIE_AGE = 365 * 24 * 60 * 60
+
+
+# Precompilar plantillas e importar módulos pesados en cada worker al
+# arrancar (sin consultas). Activar en producción con VEHICULO_WARMUP=1;
+# `manage.py warmup` además ceba las cachés compartidas tras un deploy.
+VEHICULO_WARMUP_ON_STARTUP = os.environ.get('VEHICULO_WARMUP') == '1'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -133,6 +322,10 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Proxy local de imágenes externas (ver vehiculo/image_proxy.py). El resto
+# de su configuración (tamaño de la caché, timeouts) vive en vehiculo/cdn_config.py
+IMAGE_PROXY_CACHE_DIR = BASE_DIR / 'cache' / 'imagenes'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
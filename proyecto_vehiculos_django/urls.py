@@ -24,6 +24,8 @@ urlpatterns = [
     path('login/', views.unified_auth, name='login'),  # Usar vista unificada
     path('logout/', custom_logout, name='logout'),
     path('vehiculo/', include('vehiculo.urls')),
+    path('img/', views.imagen_proxy, name='imagen_proxy'),
+    path('tema/', views.cambiar_tema, name='cambiar_tema'),
     
     # Redirecciones para compatibilidad con URLs antiguas
     path('listar/', RedirectView.as_view(url='/vehiculo/lista/', permanent=True)),
@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class VehiculoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'vehiculo'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+
+        from . import checks, signals  # noqa: F401
+        from .sqlite import aplicar_pragmas
+
+        connection_created.connect(aplicar_pragmas, dispatch_uid='vehiculo.sqlite_pragmas')
+
+        if getattr(settings, 'VEHICULO_WARMUP_ON_STARTUP', False):
+            from .warmup import al_arrancar
+            al_arrancar()
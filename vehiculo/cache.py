@@ -0,0 +1,324 @@
+"""
+Caché de dos niveles para la app vehiculo.
+
+- L1: LRU acotado en memoria de cada proceso, con TTL corto.
+- L2: backend compartido de Django (``settings.CACHES``), visible para todos
+  los workers de gunicorn.
+
+Las claves se agrupan en namespaces con su propio TTL (``VEHICULO_CACHE``
+en settings). Cada namespace tiene una versión en L2; ``invalidate()`` la
+reemplaza por un token aleatorio y deja obsoletas todas sus claves en
+todos los procesos. Nunca se reutiliza una versión: si el culling de L2
+desaloja la clave de versión, la siguiente lectura crea otra nueva (la
+caché queda fría, pero no revive entradas viejas), y dos invalidaciones
+simultáneas no pueden terminar en la versión anterior como con ``incr``.
+``get_or_set`` evita estampidas: solo un hilo por proceso, y en lo posible
+un solo proceso, recalcula un valor ausente.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'L1_MAX_ENTRIES': 1000,
+    'L1_TTL': 30,  # Segundos máximos que un valor vive en L1
+    'VERSION_TTL': 5,  # Segundos que un proceso confía en su copia de la versión
+    'LOCK_TTL': 30,  # Vida máxima del candado de recálculo entre procesos
+    'LOCK_WAIT': 2.0,  # Segundos que se espera a que otro proceso recalcule
+    'DEFAULT_TTL': 300,
+    'NAMESPACES': {},
+}
+
+_MISSING = object()
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave en una sola ejecución.
+    Los demás hilos esperan y reciben el mismo resultado (o excepción).
+    """
+
+    class _Call:
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+
+class LocalLRU:
+    """LRU en memoria con expiración por entrada. Seguro entre hilos."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TwoTierCache:
+    """Fachada L1 (proceso) + L2 (compartida) con namespaces y estadísticas."""
+
+    def __init__(self, config=None):
+        self._config = config
+        self._l1 = None
+        self._single_flight = SingleFlight()
+        self._stats = defaultdict(lambda: defaultdict(int))
+        self._stats_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Configuración
+    # ------------------------------------------------------------------
+
+    @property
+    def config(self):
+        if self._config is None:
+            self._config = {**DEFAULTS, **getattr(settings, 'VEHICULO_CACHE', {})}
+        return self._config
+
+    @property
+    def l1(self):
+        if self._l1 is None:
+            self._l1 = LocalLRU(self.config['L1_MAX_ENTRIES'])
+        return self._l1
+
+    @property
+    def l2(self):
+        return caches[self.config['ALIAS']]
+
+    def ttl_for(self, namespace, ttl=None):
+        if ttl is not None:
+            return ttl
+        return self.config['NAMESPACES'].get(namespace, self.config['DEFAULT_TTL'])
+
+    def _l1_ttl(self, ttl):
+        return min(ttl, self.config['L1_TTL'])
+
+    # ------------------------------------------------------------------
+    # Versiones de namespace
+    # ------------------------------------------------------------------
+
+    def _version_key(self, namespace):
+        return f'vehiculo:ns:{namespace}:version'
+
+    def _new_version(self):
+        return uuid.uuid4().hex[:12]
+
+    def version(self, namespace):
+        """Versión actual del namespace (cacheada unos segundos en L1)."""
+        version_key = self._version_key(namespace)
+        version = self.l1.get(version_key)
+        if version is _MISSING:
+            version = self.l2.get(version_key)
+            if version is None:
+                # Nunca creada o desalojada: otro proceso puede ganar el add
+                nueva = self._new_version()
+                self.l2.add(version_key, nueva, None)
+                version = self.l2.get(version_key) or nueva
+            self.l1.set(version_key, version, self.config['VERSION_TTL'])
+        return version
+
+    def invalidate(self, namespace):
+        """Deja obsoletas todas las claves del namespace en todos los procesos."""
+        version_key = self._version_key(namespace)
+        self.l2.set(version_key, self._new_version(), None)
+        self.l1.delete(version_key)
+        self._count(namespace, 'invalidations')
+
+    def make_key(self, namespace, key):
+        return f'vehiculo:{namespace}:v{self.version(namespace)}:{key}'
+
+    # ------------------------------------------------------------------
+    # Operaciones
+    # ------------------------------------------------------------------
+
+    def _count(self, namespace, counter, amount=1):
+        with self._stats_lock:
+            self._stats[namespace][counter] += amount
+
+    def get(self, namespace, key, default=None):
+        full_key = self.make_key(namespace, key)
+        value = self.l1.get(full_key)
+        if value is not _MISSING:
+            self._count(namespace, 'l1_hits')
+            return value
+
+        value = self.l2.get(full_key, _MISSING)
+        if value is not _MISSING:
+            self._count(namespace, 'l2_hits')
+            self.l1.set(full_key, value, self._l1_ttl(self.ttl_for(namespace)))
+            return value
+
+        self._count(namespace, 'misses')
+        return default
+
+    def get_many(self, namespace, keys):
+        """Lectura en bloque: L1 primero y una sola ida a L2 para el resto."""
+        full_keys = {self.make_key(namespace, key): key for key in keys}
+        found = {}
+        remaining = []
+        for full_key, key in full_keys.items():
+            value = self.l1.get(full_key)
+            if value is _MISSING:
+                remaining.append(full_key)
+            else:
+                found[key] = value
+        self._count(namespace, 'l1_hits', len(found))
+
+        if remaining:
+            l1_ttl = self._l1_ttl(self.ttl_for(namespace))
+            from_l2 = self.l2.get_many(remaining)
+            for full_key, value in from_l2.items():
+                found[full_keys[full_key]] = value
+                self.l1.set(full_key, value, l1_ttl)
+            self._count(namespace, 'l2_hits', len(from_l2))
+            self._count(namespace, 'misses', len(remaining) - len(from_l2))
+        return found
+
+    def set(self, namespace, key, value, ttl=None):
+        ttl = self.ttl_for(namespace, ttl)
+        full_key = self.make_key(namespace, key)
+        self.l2.set(full_key, value, ttl)
+        self.l1.set(full_key, value, self._l1_ttl(ttl))
+        self._count(namespace, 'sets')
+
+    def set_many(self, namespace, mapping, ttl=None):
+        ttl = self.ttl_for(namespace, ttl)
+        full = {self.make_key(namespace, key): value for key, value in mapping.items()}
+        self.l2.set_many(full, ttl)
+        for full_key, value in full.items():
+            self.l1.set(full_key, value, self._l1_ttl(ttl))
+        self._count(namespace, 'sets', len(full))
+
+    def delete(self, namespace, key):
+        full_key = self.make_key(namespace, key)
+        self.l2.delete(full_key)
+        self.l1.delete(full_key)
+
+    def get_or_set(self, namespace, key, compute, ttl=None):
+        """
+        Devuelve el valor cacheado o lo calcula una sola vez.
+
+        Dentro del proceso los hilos concurrentes esperan al primero. Entre
+        procesos se usa un candado en L2 (``add`` atómico): quien no lo
+        obtiene espera hasta ``LOCK_WAIT`` a que aparezca el valor y, si no,
+        lo calcula igualmente.
+
+        ``ttl`` puede ser una función que recibe el valor calculado, para
+        guardar menos tiempo los valores provisionales.
+        """
+        value = self.get(namespace, key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        full_key = self.make_key(namespace, key)
+
+        def fill():
+            value = self.l2.get(full_key, _MISSING)
+            if value is not _MISSING:
+                return value
+
+            lock_key = f'{full_key}:lock'
+            if not self.l2.add(lock_key, 1, self.config['LOCK_TTL']):
+                deadline = time.monotonic() + self.config['LOCK_WAIT']
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    value = self.l2.get(full_key, _MISSING)
+                    if value is not _MISSING:
+                        self._count(namespace, 'coalesced')
+                        return value
+                lock_key = None
+
+            try:
+                value = compute()
+                self._count(namespace, 'computes')
+                self.set(namespace, key, value, ttl(value) if callable(ttl) else ttl)
+                return value
+            finally:
+                if lock_key:
+                    self.l2.delete(lock_key)
+
+        value = self._single_flight.do(full_key, fill)
+        ttl = ttl(value) if callable(ttl) else ttl
+        self.l1.set(full_key, value, self._l1_ttl(self.ttl_for(namespace, ttl)))
+        return value
+
+    # ------------------------------------------------------------------
+    # Estadísticas
+    # ------------------------------------------------------------------
+
+    def stats(self):
+        """Contadores por namespace con la tasa de aciertos L1, L2 y total."""
+        with self._stats_lock:
+            snapshot = {namespace: dict(counters) for namespace, counters in self._stats.items()}
+        for counters in snapshot.values():
+            lookups = counters.get('l1_hits', 0) + counters.get('l2_hits', 0) + counters.get('misses', 0)
+            hits = counters.get('l1_hits', 0) + counters.get('l2_hits', 0)
+            counters['hit_ratio'] = round(hits / lookups, 3) if lookups else None
+            counters['l1_hit_ratio'] = round(counters.get('l1_hits', 0) / lookups, 3) if lookups else None
+        return {'l1_entries': len(self.l1), 'namespaces': snapshot}
+
+
+vehiculo_cache = TwoTierCache()
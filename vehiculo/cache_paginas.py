@@ -0,0 +1,107 @@
+"""
+Caché de página completa para visitantes anónimos.
+
+``@cache_anonimo`` guarda el cuerpo de la respuesta, ya comprimido con
+gzip, en el namespace ``paginas`` de la caché de dos niveles. La clave
+varía por ruta, tema, idioma y versión del catálogo, así que cualquier alta
+o baja de vehículos deja obsoletas las páginas sin borrar nada. Las
+visitas repetidas se sirven desde la L1 del proceso, sin tocar la base de
+datos ni renderizar plantillas.
+
+No se cachea (y la vista corre normalmente) cuando el usuario está
+autenticado, hay mensajes pendientes, la petición no es GET/HEAD o trae
+query string, o la respuesta usó el token CSRF o fija cookies.
+"""
+import hashlib
+from functools import wraps
+
+from django.contrib import messages
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import translation
+from django.utils.cache import patch_vary_headers
+from django.utils.http import quote_etag
+from django.utils.text import compress_string
+
+from . import contadores
+from .cache import vehiculo_cache
+from .context_processors import obtener_tema
+
+NAMESPACE = 'paginas'
+
+
+def es_cacheable(request):
+    if request.method not in ('GET', 'HEAD') or request.GET:
+        return False
+    if request.user.is_authenticated:
+        return False
+    # len() no marca los mensajes como leídos: se mostrarán en la vista
+    return not len(messages.get_messages(request))
+
+
+def respuesta_guardable(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+    )
+
+
+def clave_pagina(request):
+    return ':'.join((
+        request.path,
+        obtener_tema(request),
+        translation.get_language() or '',
+        str(contadores.version()),
+    ))
+
+
+def construir_entrada(response):
+    body = response.content
+    comprimido = compress_string(body)
+    return {
+        'body': body,
+        'gzip': comprimido if len(comprimido) < len(body) else None,
+        'content_type': response['Content-Type'],
+        'etag': quote_etag(hashlib.md5(body).hexdigest()),
+    }
+
+
+def responder(request, entrada, estado):
+    if request.META.get('HTTP_IF_NONE_MATCH') == entrada['etag']:
+        response = HttpResponseNotModified()
+    else:
+        acepta_gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if acepta_gzip and entrada['gzip'] is not None:
+            response = HttpResponse(entrada['gzip'], content_type=entrada['content_type'])
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(entrada['body'], content_type=entrada['content_type'])
+    response['ETag'] = entrada['etag']
+    response['X-Page-Cache'] = estado
+    patch_vary_headers(response, ('Accept-Encoding', 'Cookie'))
+    return response
+
+
+def cache_anonimo(view):
+    """Decorador de vistas: sirve la página cacheada a los anónimos."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not es_cacheable(request):
+            return view(request, *args, **kwargs)
+
+        clave = clave_pagina(request)
+        entrada = vehiculo_cache.get(NAMESPACE, clave)
+        if entrada is not None:
+            return responder(request, entrada, 'HIT')
+
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response = response.render()
+        if not respuesta_guardable(request, response):
+            return response
+
+        entrada = construir_entrada(response)
+        vehiculo_cache.set(NAMESPACE, clave, entrada)
+        return responder(request, entrada, 'MISS')
+    return wrapper
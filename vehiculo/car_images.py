@@ -2,18 +2,21 @@
 Helper para obtener imágenes de autos desde diferentes proveedores (Unsplash, Imagin.studio)
 """
 import os
-import requests
-from django.core.cache import cache
-from django.conf import settings
+
+from asgiref.sync import sync_to_async
+
+from . import cdn_config
+from .cache import vehiculo_cache
+from .image_providers import registry
 
 
 class CarImageProvider:
     """Proveedor de imágenes de autos con soporte para múltiples APIs"""
     
-    # Configuración del proveedor
-    PROVIDER = os.environ.get('IMAGES_PROVIDER', 'unsplash')  # 'unsplash' o 'imagin'
-    UNSPLASH_ACCESS_KEY = os.environ.get('UNSPLASH_ACCESS_KEY', '')
-    IMAGIN_CUSTOMER_ID = os.environ.get('IMAGIN_CUSTOMER_ID', '')
+    # Proveedor preferido; sin valor se usa IMAGE_PROVIDERS['catalog'].
+    # Las API keys (UNSPLASH_ACCESS_KEY, IMAGIN_CUSTOMER_ID) las leen los
+    # proveedores en vehiculo/image_providers.py
+    PROVIDER = os.environ.get('IMAGES_PROVIDER') or None  # 'unsplash' o 'imagin'
     
     # Fallback local si las APIs fallan
     PLACEHOLDER_FALLBACK = '/static/images/placeholder-car.svg'
@@ -22,7 +25,7 @@ class CarImageProvider:
     CACHE_TTL = 3600  # 1 hora
     
     @classmethod
-    def get_car_image_url(cls, marca=None, modelo=None, categoria='Particular', año=None):
+    def get_car_image_url(cls, marca=None, modelo=None, categoria='Particular', año=None, rendition='full'):
         """
         Obtiene una URL de imagen de auto según el proveedor configurado.
         
@@ -31,131 +34,71 @@ class CarImageProvider:
             modelo: Modelo del vehículo (ej: 'Corolla')
             categoria: Categoría ('Particular', 'Carga', 'Transporte')
             año: Año del vehículo
+            rendition: Tamaño servido por el proxy ('full' o 'thumb')
             
         Returns:
             str: URL de la imagen del auto
         """
         # Crear clave de caché única
-        cache_key = f"car_image_{marca}_{modelo}_{categoria}_{año}"
-        
-        # Intentar obtener desde caché
-        cached_url = cache.get(cache_key)
-        if cached_url:
-            return cached_url
+        cache_key = f"car_image_url_{marca}_{modelo}_{categoria}_{año}_{rendition}"
+        width, height = cdn_config.IMAGE_RENDITIONS.get(rendition, cdn_config.IMAGE_RENDITIONS['full'])
         
-        # Obtener URL según el proveedor configurado
-        if cls.PROVIDER == 'imagin' and cls.IMAGIN_CUSTOMER_ID:
-            url = cls._get_imagin_url(marca, modelo, año)
-        else:
-            url = cls._get_unsplash_url(marca, modelo, categoria)
+        def resolver():
+            with registry.track_fallbacks() as tracker:
+                url = registry.image_url(
+                    marca, modelo, año, width, height,
+                    provider=cls.PROVIDER, context='catalog', categoria=categoria,
+                )
+            return url, tracker.used
         
-        # Guardar en caché
-        if url:
-            cache.set(cache_key, url, cls.CACHE_TTL)
+        # El registro elige el proveedor (con fallback si está degradado) y
+        # devuelve la URL del proxy local, nunca un hotlink al CDN. La caché
+        # de dos niveles comparte el resultado entre todos los workers; una
+        # URL de respaldo se guarda solo hasta que el circuito vuelve a probar.
+        url, respaldo = vehiculo_cache.get_or_set(
+            'imagenes', cache_key, resolver,
+            ttl=lambda valor: cdn_config.PROVIDER_COOLDOWN if valor[1] else cls.CACHE_TTL,
+        )
+        if respaldo:
+            # Avisa a quien cachea HTML con esta URL (tarjetas)
+            registry.note_fallback()
         
         return url or cls.PLACEHOLDER_FALLBACK
-    
-    @classmethod
-    def _get_unsplash_url(cls, marca=None, modelo=None, categoria='Particular'):
-        """
-        Obtiene una imagen de auto desde Unsplash API.
-        
-        Nota: Estas imágenes son para demos/prototipos. Para producción,
-        considerar usar Imagin.studio con IMAGIN_CUSTOMER_ID configurado.
-        """
-        if not cls.UNSPLASH_ACCESS_KEY:
-            # Sin API key, usar Unsplash Source (menos confiable pero no requiere key)
-            return cls._get_unsplash_source_url(categoria)
-        
-        try:
-            # Construir query de búsqueda
-            query_terms = []
-            if marca:
-                query_terms.append(marca.lower())
-            if modelo:
-                query_terms.append(modelo.lower())
-            
-            # Agregar términos según categoría
-            categoria_terms = {
-                'Particular': ['car', 'sedan', 'automobile'],
-                'Carga': ['pickup', 'truck', 'cargo vehicle'],
-                'Transporte': ['van', 'minibus', 'transport vehicle'],
-            }
-            query_terms.extend(categoria_terms.get(categoria, ['car', 'vehicle']))
-            
-            query = ' '.join(query_terms)
-            
-            # Llamar a Unsplash API
-            url = 'https://api.unsplash.com/photos/random'
-            params = {
-                'query': query,
-                'client_id': cls.UNSPLASH_ACCESS_KEY,
-                'orientation': 'landscape',
-                'count': 1
-            }
-            
-            response = requests.get(url, params=params, timeout=5)
-            
-            if response.status_code == 200:
-                data = response.json()
-                # Unsplash puede devolver lista o objeto único
-                if isinstance(data, list):
-                    return data[0]['urls']['regular'] if data else None
-                return data['urls']['regular']
-            
-        except Exception as e:
-            print(f"Error obteniendo imagen de Unsplash: {e}")
-        
-        return None
-    
-    @classmethod
-    def _get_unsplash_source_url(cls, categoria='Particular'):
-        """
-        Fallback usando Unsplash Source (no requiere API key pero menos control).
-        Nota: Este servicio puede estar deprecado, usar solo como último recurso.
-        """
-        categoria_queries = {
-            'Particular': 'car,sedan,automobile',
-            'Carga': 'pickup,truck',
-            'Transporte': 'van,bus',
-        }
-        query = categoria_queries.get(categoria, 'car,automobile')
-        return f"https://source.unsplash.com/800x600/?{query}"
-    
-    @classmethod
-    def _get_imagin_url(cls, marca=None, modelo=None, año=None):
-        """
-        Obtiene una imagen específica desde Imagin.studio API.
-        
-        Ideal para producción cuando se necesitan imágenes exactas por marca/modelo.
-        Requiere IMAGIN_CUSTOMER_ID configurado.
-        """
-        if not all([cls.IMAGIN_CUSTOMER_ID, marca, modelo]):
-            return None
-        
-        # Construir URL de Imagin.studio
-        # Ángulo 23 es una vista 3/4 frontal estándar
-        params = {
-            'customer': cls.IMAGIN_CUSTOMER_ID,
-            'make': marca.lower().replace(' ', '-'),
-            'modelFamily': modelo.lower().replace(' ', '-'),
-            'angle': '23',
-            'width': 800,
-            'height': 600,
-        }
-        
-        if año:
-            params['modelYear'] = año
-        
-        # Construir query string
-        query_string = '&'.join([f"{k}={v}" for k, v in params.items()])
-        return f"https://cdn.imagin.studio/getImage?{query_string}"
 
 
 # Función de conveniencia para usar en templates/views
-def get_car_image(marca=None, modelo=None, categoria='Particular', año=None):
+def get_car_image(marca=None, modelo=None, categoria='Particular', año=None, rendition='full'):
     """
     Función helper para obtener URL de imagen de auto.
     Usar esta función en views o models.
     """
-    return CarImageProvider.get_car_image_url(marca, modelo, categoria, año)
+    return CarImageProvider.get_car_image_url(marca, modelo, categoria, año, rendition)
+
+
+
+def _resolver_lote(combinaciones, rendition):
+    return [
+        get_car_image(marca, modelo, categoria, año, rendition)
+        for marca, modelo, categoria, año in combinaciones
+    ]
+
+
+async def aget_car_images(combinaciones, rendition='full'):
+    """
+    Versión async y en lote de ``get_car_image`` para vistas async.
+
+    ``combinaciones`` es una lista de ``(marca, modelo, categoria, año)``;
+    devuelve las URLs en el mismo orden. La caché y los proveedores son
+    bloqueantes (archivo, HTTP), así que todo el lote se resuelve en un solo
+    salto al pool de hilos, sin atarse al hilo de la base de datos: un salto
+    por imagen costaba más que la resolución misma.
+    """
+    if not combinaciones:
+        return []
+    return await sync_to_async(_resolver_lote, thread_sensitive=False)(list(combinaciones), rendition)
+
+
+async def aget_car_image(marca=None, modelo=None, categoria='Particular', año=None, rendition='full'):
+    """Versión async de ``get_car_image``."""
+    urls = await aget_car_images([(marca, modelo, categoria, año)], rendition)
+    return urls[0]
@@ -73,6 +73,38 @@ IMAGE_PROVIDERS = {
     'admin': 'placeholder',  # Para panel de administración
 }
 
+# Proxy local de imágenes (/img/): el navegador nunca carga los CDNs externos
+# directamente, las imágenes se descargan una vez y se sirven desde disco.
+IMAGE_RENDITIONS = {
+    'full': (DEFAULT_IMAGE_WIDTH, DEFAULT_IMAGE_HEIGHT),
+    'thumb': (THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT),
+}
+IMAGE_PROXY_ALLOWED_HOSTS = {
+    'source.unsplash.com',
+    'images.unsplash.com',
+    'picsum.photos',
+    'fastly.picsum.photos',
+    'images.pexels.com',
+    'cdn.imagin.studio',
+    'via.placeholder.com',
+}
+IMAGE_PROXY_LOCAL_HOSTS = {'via.placeholder.com'}  # Se dibujan localmente, sin descarga
+IMAGE_PROXY_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 512MB en disco
+IMAGE_PROXY_MAX_UPSTREAM_BYTES = 10 * 1024 * 1024  # Rechazar originales de más de 10MB
+IMAGE_PROXY_TIMEOUT = 5  # Segundos de espera al proveedor externo
+IMAGE_PROXY_MAX_REDIRECTS = 3  # Cada salto debe ir a un host de IMAGE_PROXY_ALLOWED_HOSTS
+IMAGE_PROXY_NEGATIVE_TTL = 60  # Segundos sin reintentar una imagen que falló
+IMAGE_PROXY_MAX_AGE = 7 * 24 * 3600  # Cache-Control para el navegador (7 días)
+
+# Circuit breaker por proveedor (ver vehiculo/image_providers.py): si en la
+# ventana móvil la tasa de errores o la latencia p90 superan el umbral, se
+# usa FALLBACK_PROVIDER durante PROVIDER_COOLDOWN segundos.
+PROVIDER_HEALTH_WINDOW = 50  # Últimas N peticiones por proveedor
+PROVIDER_MIN_SAMPLES = 5  # Mínimo de muestras antes de evaluar
+PROVIDER_MAX_ERROR_RATE = 0.5  # 50% de errores
+PROVIDER_MAX_LATENCY = 2.0  # Segundos (p90)
+PROVIDER_COOLDOWN = 30  # Segundos con el circuito abierto antes de reintentar
+
 # Configuración de búsqueda para Unsplash
 UNSPLASH_SEARCH_PARAMS = {
     'orientation': 'landscape',  # landscape, portrait, squarish
@@ -0,0 +1,36 @@
+"""
+Comprobaciones de ``manage.py check`` para la app vehiculo.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+from .ratelimit import config
+
+# Backends cuyo contenido vive en la memoria de cada proceso
+CACHES_POR_PROCESO = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, Tags.security, deploy=True)
+def check_cache_ratelimit(app_configs, **kwargs):
+    """
+    En producción los buckets del límite de peticiones deben estar en una
+    caché compartida: en memoria cada worker lleva su propia cuenta y el
+    límite real es N veces el configurado.
+    """
+    cfg = config()
+    if not cfg['ENABLED']:
+        return []
+    alias = cfg['CACHE_ALIAS']
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend not in CACHES_POR_PROCESO:
+        return []
+    return [
+        Error(
+            f"La caché '{alias}' del límite de peticiones es por proceso ({backend}).",
+            hint='Define RATELIMIT_REDIS_URL o apunta CACHE_ALIAS a una caché compartida.',
+            id='vehiculo.E001',
+        )
+    ]
@@ -0,0 +1,103 @@
+"""
+Contadores del catálogo sin COUNT(*) por petición.
+
+Las señales de Vehiculo aplican deltas atómicos (``F('valor') + n``) a la
+tabla ContadorCatalogo dentro de la misma transacción del guardado o
+borrado. La lectura pasa por la caché de dos niveles (namespace
+'catalogo') y ``manage.py reconciliar_contadores`` corrige cualquier
+desviación (por ejemplo tras un ``QuerySet.update()`` que no emite señales).
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .cache import vehiculo_cache
+from .models import ContadorCatalogo, Vehiculo
+
+NAMESPACE = 'catalogo'
+CACHE_KEY = 'contadores'
+
+
+def claves_para(activo, categoria):
+    """Claves de contador a las que aporta un vehículo con este estado."""
+    claves = ['total', f'activo:{int(bool(activo))}']
+    if activo:
+        claves.append(f'categoria:{categoria}')
+    return claves
+
+
+def aplicar_deltas(deltas, using='default'):
+    """Suma los deltas ``{clave: n}`` de forma atómica en la base de datos."""
+    deltas = {clave: delta for clave, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    manager = ContadorCatalogo.objects.using(using)
+    for clave, delta in deltas.items():
+        if not manager.filter(clave=clave).update(valor=F('valor') + delta):
+            manager.bulk_create([ContadorCatalogo(clave=clave, valor=0)], ignore_conflicts=True)
+            manager.filter(clave=clave).update(valor=F('valor') + delta)
+    transaction.on_commit(invalidar, using=using)
+
+
+def invalidar():
+    vehiculo_cache.invalidate(NAMESPACE)
+
+
+def version():
+    """Versión del catálogo: cambia con cada alta, baja o modificación."""
+    return vehiculo_cache.version(NAMESPACE)
+
+
+def obtener_contadores():
+    """Todos los contadores como ``{clave: valor}``, desde la caché."""
+    return vehiculo_cache.get_or_set(
+        NAMESPACE, CACHE_KEY,
+        lambda: dict(ContadorCatalogo.objects.values_list('clave', 'valor')),
+    )
+
+
+def contar_desde_tabla():
+    """Recalcula los contadores reales con un GROUP BY sobre Vehiculo."""
+    reales = Counter()
+    filas = Vehiculo.objects.values('activo', 'categoria').annotate(n=Count('id')).order_by()
+    for fila in filas:
+        for clave in claves_para(fila['activo'], fila['categoria']):
+            reales[clave] += fila['n']
+    return reales
+
+
+class ContadoresCatalogo:
+    """
+    Objeto perezoso para plantillas: no consulta nada hasta que se accede
+    a un atributo, así las páginas que no muestran números no pagan nada.
+    """
+
+    def __init__(self):
+        self._valores = None
+
+    @property
+    def valores(self):
+        if self._valores is None:
+            self._valores = obtener_contadores()
+        return self._valores
+
+    @property
+    def total(self):
+        return self.valores.get('total', 0)
+
+    @property
+    def activos(self):
+        return self.valores.get('activo:1', 0)
+
+    @property
+    def inactivos(self):
+        return self.valores.get('activo:0', 0)
+
+    @property
+    def por_categoria(self):
+        return {
+            clave.split(':', 1)[1]: valor
+            for clave, valor in self.valores.items()
+            if clave.startswith('categoria:') and valor
+        }
@@ -1,17 +1,44 @@
+from django.conf import settings
+
+TEMAS = ('light', 'dark')
+TEMA_COOKIE_SALT = 'vehiculo.tema'
+
+def obtener_tema(request):
+    """
+    Tema visual del visitante ('light' por defecto).
+    Se lee de una cookie firmada: no toca la sesión ni la base de datos.
+    """
+    if request is None:
+        return TEMAS[0]
+    tema = request.get_signed_cookie(
+        settings.THEME_COOKIE_NAME, default=TEMAS[0], salt=TEMA_COOKIE_SALT
+    )
+    return tema if tema in TEMAS else TEMAS[0]
+
+def guardar_tema(response, tema):
+    """Fija la cookie firmada del tema en la respuesta."""
+    response.set_signed_cookie(
+        settings.THEME_COOKIE_NAME, tema, salt=TEMA_COOKIE_SALT,
+        max_age=settings.THEME_COOKIE_AGE, samesite='Lax', httponly=True,
+    )
+    return response
+
 def theme_context(request):
-    return {'theme': request.session.get('theme', 'light')}
+    return {'theme': obtener_tema(request)}
 
 def user_vehiculos(request):
     """
     Context processor to provide vehicle-related data to all templates
     """
-    from .models import Vehiculo
+    from django.utils.functional import SimpleLazyObject
+    from .contadores import ContadoresCatalogo
     
     context = {}
     
-    # Get total count of all vehicles (since there's no owner field)
-    total_vehiculos = Vehiculo.objects.count()
-    context['total_vehiculos'] = total_vehiculos
+    # Signal-maintained counters, only read if the template uses them
+    catalogo = ContadoresCatalogo()
+    context['catalogo'] = catalogo
+    context['total_vehiculos'] = SimpleLazyObject(lambda: catalogo.total)
     
     # If user is authenticated, we can add user-specific context if needed
     if request.user.is_authenticated:
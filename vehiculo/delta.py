@@ -0,0 +1,117 @@
+"""
+Sincronización incremental del catálogo para integraciones.
+
+``vehiculos_api`` (y su versión async) devuelve, en los listados sin
+filtros, un ``token`` opaco (firmado) con el instante hasta el que el
+cliente quedó sincronizado: un listado filtrado no sincroniza el catálogo
+y su token haría perder los vehículos que no coincidían. Con ``?since=<token>`` responde
+solo los vehículos activos cuyo ``fecha_actualizacion`` cae entre ese
+instante y el actual, más las bajas (``eliminados``): vehículos borrados o
+desactivados según ``CambioVehiculo``. Ambas lecturas son rangos sobre
+columnas indexadas, así que el costo depende de los cambios y no del
+tamaño del catálogo.
+
+- El nuevo token es ``ahora - MARGEN``. ``fecha_actualizacion`` y
+  ``fecha`` se fijan con el reloj de la aplicación al guardar, no al
+  confirmar: una fila que se confirma después de la lectura con una hora
+  anterior al corte se perdería. El margen cubre ese hueco solo si es
+  mayor que la transacción de escritura más larga más el desfase de reloj
+  entre servidores; una transacción que tarde más pierde sus filas para
+  ese cliente sin aviso. Las escrituras del proyecto (vistas, admin,
+  ``importar_nhtsa``) confirman vehículo a vehículo; un proceso que edite
+  vehículos en una transacción larga debe respetar el límite o subir
+  ``MARGEN``. El precio es latencia: un cambio aparece en el delta
+  ``MARGEN`` segundos después de guardarse.
+- ``CambioVehiculo`` se conserva ``RETENCION_DIAS`` (``manage.py
+  compactar_cambios``). Un token más antiguo ya no puede garantizar las
+  bajas y se rechaza con 410: el cliente debe descargar el catálogo entero.
+- Los cambios hechos con ``QuerySet.update`` (p. ej. contadores de
+  favoritos) no tocan ``fecha_actualizacion`` y no aparecen en el delta.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import CambioVehiculo, Vehiculo
+
+DEFAULTS = {
+    # Segundos; debe superar la transacción de escritura más larga (ver arriba)
+    'MARGEN': 60.0,
+    'RETENCION_DIAS': 30,
+}
+
+SALT = 'vehiculo.delta'
+
+
+class TokenInvalido(ValueError):
+    pass
+
+
+class TokenVencido(ValueError):
+    pass
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'VEHICULO_DELTA', {})}
+
+
+def corte_actual():
+    """Instante hasta el que un delta leído ahora es completo."""
+    return timezone.now() - timedelta(seconds=config()['MARGEN'])
+
+
+def horizonte():
+    """Cambios anteriores a este instante pueden haberse compactado."""
+    return timezone.now() - timedelta(days=config()['RETENCION_DIAS'])
+
+
+def crear_token(instante):
+    return signing.dumps(instante.timestamp(), salt=SALT, compress=True)
+
+
+def leer_token(token):
+    """Instante del token; TokenInvalido si no es nuestro, TokenVencido si es anterior a la retención."""
+    try:
+        instante = datetime.fromtimestamp(float(signing.loads(token, salt=SALT)), tz=dt_timezone.utc)
+    except (signing.BadSignature, TypeError, ValueError, OverflowError):
+        raise TokenInvalido('Token de sincronización no válido')
+    if instante < horizonte():
+        raise TokenVencido(
+            'El token es anterior a la retención de cambios; descarga el catálogo completo sin since'
+        )
+    return instante
+
+
+def vehiculos_cambiados(desde, hasta):
+    """Vehículos activos modificados en ``(desde, hasta]`` (índice de fecha_actualizacion)."""
+    return Vehiculo.objects.filter(
+        activo=True, fecha_actualizacion__gt=desde, fecha_actualizacion__lte=hasta,
+    ).order_by('fecha_actualizacion', 'id')
+
+
+def _eliminados(desde, hasta):
+    return (
+        CambioVehiculo.objects.filter(fecha__gt=desde, fecha__lte=hasta)
+        .filter(Q(tipo=CambioVehiculo.ELIMINADO) | Q(activo=False))
+        .filter(~Exists(Vehiculo.objects.filter(pk=OuterRef('vehiculo_id'), activo=True)))
+        .order_by('vehiculo_id')
+        .values_list('vehiculo_id', flat=True)
+        .distinct()
+    )
+
+
+def eliminados(desde, hasta):
+    """
+    Ids borrados o desactivados en ``(desde, hasta]`` según el registro de
+    cambios (índice de fecha), sin los que hoy están activos: si se
+    reactivaron, ya vienen entre los vehículos cambiados.
+    """
+    return list(_eliminados(desde, hasta))
+
+
+async def aeliminados(desde, hasta):
+    """Versión async de ``eliminados``."""
+    return [vehiculo_id async for vehiculo_id in _eliminados(desde, hasta)]
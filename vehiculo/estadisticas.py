@@ -0,0 +1,238 @@
+"""
+Estadísticas de precios del mercado por marca, modelo, año y categoría.
+
+La tabla ``EstadisticaMercado`` se mantiene en dos tiempos:
+
+- Las señales de Vehiculo llaman a ``mover`` en la misma transacción que el
+  guardado o borrado. Un alta suma uno a la cantidad y a la suma, y
+  amplía mínimo y máximo con ``F()``. Una baja resta. En ambos casos el
+  grupo queda ``desactualizada``, porque un percentil no se puede corregir
+  sin las demás filas. Un grupo vacío que recibe un vehículo queda exacto:
+  todos sus percentiles son ese precio.
+- ``manage.py reconstruir_estadisticas`` recalcula los percentiles en
+  NumPy. Sin opciones lee todos los vehículos activos una sola vez (un
+  recorrido completo, para la madrugada). Con ``--desactualizadas`` lee
+  solo las filas de los grupos marcados, por el índice
+  ``vehiculo_grupo_mercado_idx``, y puede correr cada pocos minutos.
+
+El endpoint lee solo esta tabla, nunca Vehiculo. Si una señal toca un grupo
+mientras se reconstruye, el grupo vuelve a quedar desactualizado (ver
+``modificada``) y se corrige en la siguiente pasada.
+"""
+from decimal import Decimal
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Case, DecimalField, F, Q, Value, When
+from django.db.models.functions import Greatest, Least
+from django.utils import timezone
+
+from .models import EstadisticaMercado, Vehiculo
+
+GRUPO = ('marca', 'modelo', 'año', 'categoria')
+PERCENTILES = (('p10', 0.10), ('p25', 0.25), ('mediana', 0.50), ('p75', 0.75), ('p90', 0.90))
+CENTAVOS = Decimal('0.01')
+
+
+def aporte(activo, categoria, marca, modelo, año, precio):
+    """``(grupo, precio)`` con el que un vehículo cuenta en las estadísticas, o None si no cuenta."""
+    if not activo:
+        return None
+    return (marca, modelo, año, categoria), precio
+
+
+def aporte_de(vehiculo):
+    return aporte(vehiculo.activo, vehiculo.categoria, vehiculo.marca, vehiculo.modelo, vehiculo.año, vehiculo.precio)
+
+
+def mover(previo, nuevo, using='default'):
+    """Quita el aporte ``previo`` y suma el ``nuevo`` (cualquiera puede ser None)."""
+    if previo == nuevo:
+        return
+    if previo is not None:
+        restar(*previo, using=using)
+    if nuevo is not None:
+        sumar(*nuevo, using=using)
+
+
+def _precio(precio):
+    return Value(Decimal(str(precio)), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def _si_vacio(valor, sino):
+    """En un UPDATE, ``cantidad`` es el valor anterior: un grupo vacío toma ``valor``."""
+    return Case(When(cantidad__lte=0, then=valor), default=sino)
+
+
+def sumar(grupo, precio, using='default'):
+    ahora = timezone.now()
+    manager = EstadisticaMercado.objects.using(using)
+    filtro = manager.filter(**dict(zip(GRUPO, grupo)))
+    precio = _precio(precio)
+    cambios = {
+        'cantidad': _si_vacio(Value(1), F('cantidad') + 1),
+        'suma_precios': _si_vacio(precio, F('suma_precios') + precio),
+        'precio_min': _si_vacio(precio, Least('precio_min', precio)),
+        'precio_max': _si_vacio(precio, Greatest('precio_max', precio)),
+        'desactualizada': _si_vacio(Value(False), Value(True)),
+        'modificada': Value(ahora),
+        **{nombre: _si_vacio(precio, F(nombre)) for nombre, _ in PERCENTILES},
+    }
+    if not filtro.update(**cambios):
+        # Grupo nuevo: se crea vacío y el mismo UPDATE lo llena (otro proceso puede ganar el INSERT)
+        valor = precio.value
+        manager.bulk_create([EstadisticaMercado(
+            **dict(zip(GRUPO, grupo)), cantidad=0, suma_precios=0, precio_min=valor, precio_max=valor,
+            fecha_calculo=ahora, **{nombre: valor for nombre, _ in PERCENTILES},
+        )], ignore_conflicts=True)
+        filtro.update(**cambios)
+
+
+def restar(grupo, precio, using='default'):
+    # Un grupo que queda en cero se conserva hasta la siguiente reconstrucción,
+    # que lo borra: así ``modificada`` protege también las bajas
+    precio = _precio(precio)
+    EstadisticaMercado.objects.using(using).filter(**dict(zip(GRUPO, grupo))).update(
+        cantidad=F('cantidad') - 1,
+        suma_precios=F('suma_precios') - precio,
+        desactualizada=True,
+        modificada=Value(timezone.now()),
+    )
+
+
+def calcular(filas):
+    """
+    Estadísticas por grupo desde pares ``(grupo, precio)``, vectorizado en
+    NumPy: un ``lexsort`` ordena por grupo y precio, y cada percentil se
+    interpola para todos los grupos a la vez sobre el arreglo ordenado
+    (mismo resultado que ``numpy.percentile`` con el método lineal).
+    Devuelve ``{grupo: {campo: Decimal}}``.
+    """
+    # Import local: NumPy solo hace falta en la reconstrucción, no en cada worker
+    import numpy as np
+
+    indices, grupos, precios = {}, [], []
+    for grupo, precio in filas:
+        grupos.append(indices.setdefault(grupo, len(indices)))
+        precios.append(precio)
+    if not indices:
+        return {}
+
+    grupos = np.array(grupos, dtype=np.int64)
+    precios = np.array(precios, dtype=np.float64)
+    orden = np.lexsort((precios, grupos))
+    ordenados = precios[orden]
+    cantidades = np.bincount(grupos, minlength=len(indices))
+    inicios = np.concatenate(([0], np.cumsum(cantidades)[:-1]))
+
+    columnas = {
+        'cantidad': cantidades,
+        'suma_precios': np.add.reduceat(ordenados, inicios),
+        'precio_min': ordenados[inicios],
+        'precio_max': ordenados[inicios + cantidades - 1],
+    }
+    for nombre, q in PERCENTILES:
+        posicion = inicios + q * (cantidades - 1)
+        abajo = np.floor(posicion).astype(np.int64)
+        arriba = np.ceil(posicion).astype(np.int64)
+        columnas[nombre] = ordenados[abajo] + (ordenados[arriba] - ordenados[abajo]) * (posicion - abajo)
+
+    # Una conversión por columna (tolist) en lugar de una por celda
+    columnas = {
+        nombre: valores.tolist() if nombre == 'cantidad'
+        else [Decimal(repr(v)).quantize(CENTAVOS) for v in valores.tolist()]
+        for nombre, valores in columnas.items()
+    }
+    return {
+        grupo: {nombre: valores[i] for nombre, valores in columnas.items()}
+        for grupo, i in indices.items()
+    }
+
+
+def _filas(queryset, chunk_size):
+    for marca, modelo, año, categoria, precio in queryset.values_list(*GRUPO, 'precio').iterator(chunk_size):
+        yield (marca, modelo, año, categoria), precio
+
+
+def reconstruir(grupos=None, chunk_size=5000, lote=500):
+    """
+    Recalcula las estadísticas de ``grupos`` (tuplas marca, modelo, año,
+    categoría) o, sin grupos, de todo el catálogo activo. Escribe con un
+    upsert por lotes y borra los grupos que quedaron sin vehículos.
+    Devuelve ``(grupos escritos, grupos borrados)``.
+
+    Todo se lee y escribe en la primaria: con réplicas, una lectura atrasada
+    calcularía percentiles viejos y los marcaría como al día.
+    """
+    inicio = timezone.now()
+    tabla = EstadisticaMercado.objects.using(DEFAULT_DB_ALIAS)
+    queryset = Vehiculo.objects.using(DEFAULT_DB_ALIAS).filter(activo=True).order_by()
+    existentes = tabla.all()
+    if grupos is not None:
+        grupos = set(grupos)
+        if not grupos:
+            return 0, 0
+        filtro = Q()
+        for grupo in grupos:
+            filtro |= Q(**dict(zip(GRUPO, grupo)))
+        queryset = queryset.filter(filtro)
+        existentes = existentes.filter(filtro)
+
+    resultados = calcular(_filas(queryset, chunk_size))
+    campos = ['cantidad', 'suma_precios', 'precio_min', 'precio_max', *(n for n, _ in PERCENTILES)]
+    tabla.bulk_create(
+        [
+            EstadisticaMercado(
+                **dict(zip(GRUPO, grupo)), **valores, desactualizada=False, fecha_calculo=inicio,
+            )
+            for grupo, valores in resultados.items()
+        ],
+        batch_size=lote,
+        update_conflicts=True,
+        unique_fields=list(GRUPO),
+        update_fields=[*campos, 'desactualizada', 'fecha_calculo'],
+    )
+
+    # Grupos sin vehículos activos, salvo los que una señal tocó durante la lectura
+    vacios = [
+        pk for pk, *grupo in existentes.filter(Q(modificada__isnull=True) | Q(modificada__lt=inicio))
+        .values_list('pk', *GRUPO)
+        if tuple(grupo) not in resultados
+    ]
+    for desde in range(0, len(vacios), lote):
+        tabla.filter(pk__in=vacios[desde:desde + lote]).delete()
+
+    # Lo que cambió mientras se leía puede no estar en el cálculo
+    tabla.filter(modificada__gte=inicio).update(desactualizada=True)
+    return len(resultados), len(vacios)
+
+
+def grupos_desactualizados():
+    """Grupos marcados por las señales, leídos de la primaria (ver ``reconstruir``)."""
+    return list(EstadisticaMercado.objects.using(DEFAULT_DB_ALIAS).filter(desactualizada=True).values_list(*GRUPO))
+
+
+def parse_filtros(params):
+    """Filtros del endpoint desde el query string; ValueError si alguno no es válido."""
+    filtros = {nombre: params[nombre] for nombre in ('marca', 'modelo', 'categoria') if params.get(nombre)}
+    if params.get('año'):
+        try:
+            filtros['año'] = int(params['año'])
+        except ValueError:
+            raise ValueError('año debe ser un número entero')
+    return filtros
+
+
+def consultar(filtros):
+    """Grupos con vehículos activos que cumplen ``filtros``, listos para JSON."""
+    precios = ['precio_min', *(nombre for nombre, _ in PERCENTILES), 'precio_max']
+    return [
+        {
+            **{nombre: getattr(fila, nombre) for nombre in GRUPO},
+            'cantidad': fila.cantidad,
+            'precio_promedio': str(fila.precio_promedio),
+            **{nombre: str(getattr(fila, nombre)) for nombre in precios},
+            'desactualizada': fila.desactualizada,
+            'fecha_calculo': fila.fecha_calculo.isoformat(),
+        }
+        for fila in EstadisticaMercado.objects.filter(cantidad__gt=0, **filtros)
+    ]
@@ -0,0 +1,275 @@
+"""
+Feed Server-Sent Events de altas, cambios y bajas del catálogo.
+
+Se alimenta de ``CambioVehiculo``, que las señales de Vehiculo escriben en
+la misma transacción que el cambio. Un solo ``Difusor`` por proceso (por
+event loop) consulta los cambios posteriores al último id leído, un rango
+corto sobre la clave primaria, y los reparte a las conexiones abiertas por
+colas en memoria: N clientes cuestan una consulta por ``POLL_INTERVAL``,
+no N, y una conexión en espera no ocupa un hilo ni una conexión a la base.
+
+- El id de cada evento es el id del cambio; el navegador lo reenvía en
+  ``Last-Event-ID`` al reconectar y la conexión nueva lee de la base lo que
+  le falta hasta alcanzar al difusor.
+- Los filtros (marca, categoría, rango de precio) se aplican sobre la copia
+  guardada en el cambio con las mismas estrategias que ``vehiculos_api``
+  (vehiculo/services/vehicle_filter_service.py): la marca por subcadena
+  sin distinguir mayúsculas. Las bajas y desactivaciones se envían siempre,
+  para que el cliente pueda retirar vehículos aunque ya no coincidan. Un
+  cambio que saca un vehículo del filtro (p. ej. de precio) no se envía.
+- Un cliente que no lee y acumula ``MAX_QUEUE`` eventos se desconecta;
+  reconecta solo y se pone al día desde la base.
+- Cada conexión dura como mucho ``MAX_DURATION`` segundos; el cliente
+  reconecta solo tras ``RETRY_MS``.
+
+El feed es *best-effort*, no un registro garantizado. El cursor avanza por
+id, y un id menor puede confirmarse después de uno mayor. En SQLite no
+ocurre porque las escrituras se serializan (``BEGIN IMMEDIATE``). En
+PostgreSQL solo se leen cambios con más de ``COMMIT_MARGIN`` segundos, pero
+``fecha`` se fija en el INSERT con el reloj de la aplicación, no en el
+commit: un cambio cuya transacción tarde más que el margen en confirmarse
+se salta para siempre. Para un estado exacto el cliente debe reconciliar
+con ``vehiculos_api?since=<token>`` (vehiculo/delta.py) al reconectar.
+"""
+import asyncio
+import json
+import logging
+import time
+import weakref
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import CambioVehiculo
+from .services.vehicle_filter_service import FILTER_STRATEGIES
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'POLL_INTERVAL': 1.0,  # Segundos entre consultas de cambios nuevos
+    'HEARTBEAT': 15.0,  # Segundos sin eventos antes de enviar un comentario
+    'MAX_DURATION': 300.0,  # Vida máxima de una conexión
+    'RETRY_MS': 3000,
+    'BATCH': 500,  # Cambios leídos por consulta
+    'COMMIT_MARGIN': 1.0,
+    'MAX_QUEUE': 1000,  # Eventos pendientes de un cliente antes de desconectarlo
+}
+
+
+MAX_ID = 2 ** 63 - 1
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'VEHICULO_SSE', {})}
+
+
+def _decimal(valor, nombre):
+    try:
+        return Decimal(valor)
+    except InvalidOperation:
+        raise ValueError(f'{nombre} debe ser un número válido')
+
+
+def parse_filtros(params):
+    """Filtros del cliente desde el query string (mismos nombres que vehiculos_api)."""
+    filtros = {}
+    for nombre in ('marca', 'categoria'):
+        if params.get(nombre):
+            filtros[nombre] = params[nombre]
+    for nombre in ('precio_min', 'precio_max'):
+        if params.get(nombre):
+            filtros[nombre] = _decimal(params[nombre], nombre)
+    return filtros
+
+
+def parse_last_event_id(request):
+    """
+    Id desde el que continuar: cabecera ``Last-Event-ID`` (reconexión del
+    navegador) o ``?last_event_id=`` (primera conexión). None si no viene.
+    """
+    valor = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    if not valor:
+        return None
+    if not (valor.isascii() and valor.isdigit()) or int(valor) > MAX_ID:
+        raise ValueError('Last-Event-ID no válido')
+    return int(valor)
+
+
+async def aultimo_id():
+    """Id del último cambio registrado (0 si no hay ninguno)."""
+    resultado = await CambioVehiculo.objects.aaggregate(ultimo=Max('id'))
+    return resultado['ultimo'] or 0
+
+
+def coincide(cambio, filtros):
+    if cambio.tipo == CambioVehiculo.ELIMINADO or not cambio.activo:
+        return True
+    precio = {'min': filtros.get('precio_min'), 'max': filtros.get('precio_max')}
+    return (
+        FILTER_STRATEGIES['marca'].matches(cambio, filtros.get('marca'))
+        and FILTER_STRATEGIES['categoria'].matches(cambio, filtros.get('categoria'))
+        and FILTER_STRATEGIES['precio'].matches(cambio, precio)
+    )
+
+
+def formatear(cambio):
+    data = {
+        'id': cambio.vehiculo_id,
+        'marca': cambio.marca,
+        'modelo': cambio.modelo,
+        'año': cambio.año,
+        'precio': str(cambio.precio),
+        'categoria': cambio.categoria,
+        'activo': cambio.activo,
+        'fecha': cambio.fecha.isoformat(),
+    }
+    return f'id: {cambio.pk}\nevent: {cambio.tipo}\ndata: {json.dumps(data)}\n\n'
+
+
+async def leer_cambios(desde_id, limite, hasta_id=None):
+    """
+    Cambios posteriores a ``desde_id``. Sin ``hasta_id`` solo los que tienen
+    más de ``COMMIT_MARGIN`` segundos (lectura del difusor); con ``hasta_id``
+    el rango ya lo recorrió el difusor y se lee sin margen.
+    """
+    queryset = CambioVehiculo.objects.filter(id__gt=desde_id)
+    if hasta_id is None:
+        margen = timezone.now() - timedelta(seconds=config()['COMMIT_MARGIN'])
+        queryset = queryset.filter(fecha__lte=margen)
+    else:
+        queryset = queryset.filter(id__lte=hasta_id)
+    return [cambio async for cambio in queryset.order_by('id')[:limite]]
+
+
+class Difusor:
+    """
+    Una sola consulta de cambios por event loop, repartida a las colas de
+    las conexiones suscritas. La tarea de sondeo arranca con el primer
+    suscriptor y termina con el último.
+    """
+
+    def __init__(self):
+        self.suscriptores = set()
+        self.ultimo_id = 0
+        self._tarea = None
+        self._listo = None
+
+    async def suscribir(self):
+        """Registra una cola y devuelve ``(cola, id hasta el que ya se leyó)``."""
+        cola = asyncio.Queue()
+        self.suscriptores.add(cola)
+        if self._tarea is None:
+            self._listo = asyncio.Event()
+            self._tarea = asyncio.create_task(self._sondear())
+        await self._listo.wait()
+        if cola not in self.suscriptores:
+            raise RuntimeError('El sondeo de cambios no pudo iniciar')
+        # Sin await entre el registro de la cola (o la espera) y esta lectura:
+        # todo cambio posterior a ``ultimo_id`` llega a la cola
+        return cola, self.ultimo_id
+
+    def desuscribir(self, cola):
+        self.suscriptores.discard(cola)
+        if not self.suscriptores and self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+
+    def _cerrar(self, cola):
+        # None indica al cliente que termine; reconecta y se pone al día desde la base
+        self.suscriptores.discard(cola)
+        cola.put_nowait(None)
+
+    async def _sondear(self):
+        cfg = config()
+        try:
+            self.ultimo_id = await aultimo_id()
+            self._listo.set()
+            while self.suscriptores:
+                cambios = await leer_cambios(self.ultimo_id, cfg['BATCH'])
+                if cambios:
+                    self.ultimo_id = cambios[-1].pk
+                    for cola in list(self.suscriptores):
+                        if cola.qsize() + len(cambios) > cfg['MAX_QUEUE']:
+                            self._cerrar(cola)
+                            continue
+                        for cambio in cambios:
+                            cola.put_nowait(cambio)
+                    if len(cambios) == cfg['BATCH']:
+                        continue
+                await asyncio.sleep(cfg['POLL_INTERVAL'])
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception('Error leyendo cambios para el feed SSE')
+            for cola in list(self.suscriptores):
+                self._cerrar(cola)
+        finally:
+            self._listo.set()
+            if self._tarea is asyncio.current_task():
+                self._tarea = None
+
+
+_difusores = weakref.WeakKeyDictionary()
+
+
+def difusor():
+    """El difusor del event loop actual (uno por proceso en ASGI)."""
+    loop = asyncio.get_running_loop()
+    if loop not in _difusores:
+        _difusores[loop] = Difusor()
+    return _difusores[loop]
+
+
+async def flujo(filtros, ultimo_id=None):
+    """
+    Generador async del cuerpo SSE. Sin ``ultimo_id`` empieza en el punto
+    del difusor; con él, primero lee de la base los cambios que le faltan
+    hasta ese punto. El id enviado avanza con todos los cambios, coincidan
+    o no con el filtro.
+    """
+    cfg = config()
+    yield f"retry: {cfg['RETRY_MS']}\n\n"
+
+    actual = difusor()
+    cola, cursor = await actual.suscribir()
+    try:
+        inicio = ultimo_envio = time.monotonic()
+        if ultimo_id is None:
+            ultimo_id = cursor
+        while ultimo_id < cursor:
+            cambios = await leer_cambios(ultimo_id, cfg['BATCH'], hasta_id=cursor)
+            if not cambios:
+                break
+            for cambio in cambios:
+                if coincide(cambio, filtros):
+                    yield formatear(cambio)
+                    ultimo_envio = time.monotonic()
+            ultimo_id = cambios[-1].pk
+        ultimo_id = max(ultimo_id, cursor)
+
+        while (restante := cfg['MAX_DURATION'] - (time.monotonic() - inicio)) > 0:
+            espera = min(restante, cfg['HEARTBEAT'] - (time.monotonic() - ultimo_envio))
+            try:
+                cambio = await asyncio.wait_for(cola.get(), max(espera, 0))
+            except asyncio.TimeoutError:
+                if time.monotonic() - ultimo_envio >= cfg['HEARTBEAT']:
+                    # Sin datos el navegador no dispara evento, pero sí guarda el id:
+                    # al reconectar no vuelve a recorrer cambios que no coincidían
+                    yield f': ping\nid: {ultimo_id}\n\n'
+                    ultimo_envio = time.monotonic()
+                continue
+            if cambio is None:
+                break
+            if cambio.pk <= ultimo_id:
+                continue
+            ultimo_id = cambio.pk
+            if coincide(cambio, filtros):
+                yield formatear(cambio)
+                ultimo_envio = time.monotonic()
+    finally:
+        actual.desuscribir(cola)
+
+    yield f'id: {ultimo_id}\n\n'
@@ -0,0 +1,67 @@
+"""
+Caché de fragmentos HTML para las tarjetas de vehículos.
+
+Cada tarjeta se guarda en el namespace ``tarjetas`` con la clave
+``(plantilla, id, fecha_actualizacion, rendition, tema)``: al guardar un
+vehículo cambia su ``fecha_actualizacion`` y la tarjeta vieja deja de
+leerse sola, sin invalidaciones explícitas. Una página completa se resuelve
+con un único ``get_many`` y solo las tarjetas ausentes se renderizan.
+
+Una tarjeta que muestra una imagen de respaldo (proveedor con el circuito
+abierto) se guarda solo ``PROVIDER_COOLDOWN`` segundos, para volver a la
+imagen normal cuando el proveedor se recupere.
+
+Lo que depende del usuario (el corazón de favorito) o de contadores que se
+actualizan con ``F()`` sin tocar ``fecha_actualizacion`` (``total_favoritos``)
+debe quedar fuera del fragmento.
+"""
+from django.db.models import prefetch_related_objects
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from . import cdn_config
+from .cache import vehiculo_cache
+from .image_providers import registry
+
+NAMESPACE = 'tarjetas'
+
+
+def clave_tarjeta(plantilla, vehiculo, rendition, tema):
+    version = vehiculo.fecha_actualizacion.timestamp() if vehiculo.fecha_actualizacion else 0
+    return f'{plantilla}:{vehiculo.pk}:{version}:{rendition}:{tema}'
+
+
+def renderizar_tarjetas(vehiculos, plantilla, rendition='full', tema='light'):
+    """
+    Devuelve una lista de pares ``(vehiculo, html)`` en el orden recibido.
+    La plantilla recibe ``vehiculo``, ``rendition`` y ``theme``.
+    """
+    vehiculos = list(vehiculos)
+    if not vehiculos:
+        return []
+
+    claves = [clave_tarjeta(plantilla, vehiculo, rendition, tema) for vehiculo in vehiculos]
+    fragmentos = vehiculo_cache.get_many(NAMESPACE, claves)
+
+    faltantes = [
+        (clave, vehiculo)
+        for clave, vehiculo in zip(claves, vehiculos)
+        if clave not in fragmentos
+    ]
+    if faltantes:
+        # Un solo SELECT de vendedores para todas las tarjetas por renderizar
+        prefetch_related_objects([vehiculo for _, vehiculo in faltantes], 'vendedor')
+        template = get_template(plantilla)
+        nuevos, provisionales = {}, {}
+        for clave, vehiculo in faltantes:
+            with registry.track_fallbacks() as tracker:
+                html = template.render({'vehiculo': vehiculo, 'rendition': rendition, 'theme': tema})
+            (provisionales if tracker.used else nuevos)[clave] = html
+        if nuevos:
+            vehiculo_cache.set_many(NAMESPACE, nuevos)
+        if provisionales:
+            vehiculo_cache.set_many(NAMESPACE, provisionales, ttl=cdn_config.PROVIDER_COOLDOWN)
+        fragmentos.update(nuevos)
+        fragmentos.update(provisionales)
+
+    return [(vehiculo, mark_safe(fragmentos[clave])) for clave, vehiculo in zip(claves, vehiculos)]
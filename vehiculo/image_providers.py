@@ -0,0 +1,422 @@
+"""
+Registro único de proveedores de imágenes con circuit breaker.
+
+Todas las rutas que generan URLs de imágenes (template tags, modelo y
+``CarImageProvider``) piden la URL al ``registry``. Cada proveedor lleva
+estadísticas móviles de latencia y errores; cuando un proveedor se degrada
+su circuito se abre y el registro responde con ``FALLBACK_PROVIDER`` hasta
+que pasa el tiempo de enfriamiento. El proxy /img/ consulta el mismo
+circuito antes de descargar, así que las URLs ya emitidas tampoco insisten
+con un proveedor degradado.
+
+Una URL de respaldo elegida con un circuito abierto es temporal: quien la
+guarde en caché debe hacerlo por poco tiempo (ver ``track_fallbacks``).
+"""
+import hashlib
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+
+from . import cdn_config
+
+
+# ============================================================================
+# PROVEEDORES
+# ============================================================================
+
+class ImageProvider(ABC):
+    """
+    Interfaz de un proveedor de imágenes.
+    ``performs_request`` indica si ``build_url`` hace peticiones de red.
+    """
+
+    name = None
+    hosts = ()
+    performs_request = False
+
+    def is_available(self):
+        return True
+
+    @abstractmethod
+    def build_url(self, marca, modelo, año=None, width=800, height=600, categoria=None):
+        """URL original de la imagen, o None si el proveedor no tiene una."""
+
+
+class UnsplashProvider(ImageProvider):
+    """
+    Fotos de Unsplash. Con ``UNSPLASH_ACCESS_KEY`` busca una foto concreta en
+    la API; sin ella usa Unsplash Source (puede estar deprecado).
+    """
+
+    name = 'unsplash'
+    hosts = ('source.unsplash.com', 'images.unsplash.com', 'api.unsplash.com')
+
+    def __init__(self):
+        self.access_key = os.environ.get('UNSPLASH_ACCESS_KEY', '')
+        self.performs_request = bool(self.access_key)
+
+    def build_url(self, marca, modelo, año=None, width=800, height=600, categoria=None):
+        if self.access_key:
+            return self._search_api(marca, modelo, categoria)
+
+        query = f"{marca}+{modelo}"
+        if año:
+            query += f"+{año}"
+        query += "+car+vehicle"
+        return f"https://source.unsplash.com/{width}x{height}/?{query}"
+
+    def _search_api(self, marca, modelo, categoria):
+        query_terms = [term.lower() for term in (marca, modelo) if term]
+        categoria_terms = {
+            'Particular': ['car', 'sedan', 'automobile'],
+            'Carga': ['pickup', 'truck', 'cargo vehicle'],
+            'Transporte': ['van', 'minibus', 'transport vehicle'],
+        }
+        query_terms.extend(categoria_terms.get(categoria, ['car', 'vehicle']))
+
+        response = requests.get(
+            'https://api.unsplash.com/photos/random',
+            params={
+                'query': ' '.join(query_terms),
+                'client_id': self.access_key,
+                'orientation': cdn_config.UNSPLASH_SEARCH_PARAMS['orientation'],
+                'count': 1,
+            },
+            timeout=cdn_config.IMAGE_PROXY_TIMEOUT,
+        )
+        response.raise_for_status()
+        data = response.json()
+        # Unsplash puede devolver lista o objeto único
+        if isinstance(data, list):
+            data = data[0]
+        return data['urls']['regular']
+
+
+class PexelsProvider(ImageProvider):
+    """Fotos de Pexels (requiere API key para uso en producción)."""
+
+    name = 'pexels'
+    hosts = ('images.pexels.com',)
+
+    def build_url(self, marca, modelo, año=None, width=800, height=600, categoria=None):
+        # Para producción, usar: https://api.pexels.com/v1/search?query=...
+        return f"https://images.pexels.com/photos/car.jpeg?auto=compress&cs=tinysrgb&w={width}&h={height}"
+
+
+class PicsumProvider(ImageProvider):
+    """Picsum con seed: siempre la misma imagen para el mismo vehículo."""
+
+    name = 'picsum'
+    hosts = ('picsum.photos', 'fastly.picsum.photos')
+
+    def build_url(self, marca, modelo, año=None, width=800, height=600, categoria=None):
+        seed = f"{marca}{modelo}".replace(" ", "")
+        return f"https://picsum.photos/seed/{seed}/{width}/{height}"
+
+
+class PlaceholderProvider(ImageProvider):
+    """Placeholder de color por marca, dibujado localmente por el proxy."""
+
+    name = 'placeholder'
+    hosts = ('via.placeholder.com',)
+
+    def build_url(self, marca, modelo, año=None, width=800, height=600, categoria=None):
+        color_hash = hashlib.md5((marca or '').encode()).hexdigest()[:6]
+        text = f"{marca}+{modelo}".replace(" ", "+")
+        return f"https://via.placeholder.com/{width}x{height}/{color_hash}/ffffff?text={text}"
+
+
+class ImaginProvider(ImageProvider):
+    """
+    Imágenes exactas por marca/modelo desde Imagin.studio.
+    Solo disponible con ``IMAGIN_CUSTOMER_ID`` configurado.
+    """
+
+    name = 'imagin'
+    hosts = ('cdn.imagin.studio',)
+
+    def __init__(self):
+        self.customer_id = os.environ.get('IMAGIN_CUSTOMER_ID', '')
+
+    def is_available(self):
+        return bool(self.customer_id)
+
+    def build_url(self, marca, modelo, año=None, width=800, height=600, categoria=None):
+        if not (marca and modelo):
+            return None
+        # Ángulo 23 es una vista 3/4 frontal estándar
+        params = {
+            'customer': self.customer_id,
+            'make': marca.lower().replace(' ', '-'),
+            'modelFamily': modelo.lower().replace(' ', '-'),
+            'angle': '23',
+            'width': width,
+            'height': height,
+        }
+        if año:
+            params['modelYear'] = año
+        query_string = '&'.join([f"{k}={v}" for k, v in params.items()])
+        return f"https://cdn.imagin.studio/getImage?{query_string}"
+
+
+# ============================================================================
+# SALUD Y CIRCUIT BREAKER
+# ============================================================================
+
+class ProviderHealth:
+    """
+    Ventana móvil de latencias y errores de un proveedor más su circuit breaker.
+
+    Estados: ``closed`` (normal), ``open`` (se usa el fallback) y
+    ``half_open`` (pasado el enfriamiento se deja pasar una prueba).
+
+    ``is_available`` solo consulta y sirve para emitir URLs; ``allow``
+    consume la prueba y solo debe llamarlo quien hace la petición y luego
+    registra el resultado con ``record``.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, window=None, max_error_rate=None, max_latency=None,
+                 min_samples=None, cooldown=None):
+        self.samples = deque(maxlen=window or cdn_config.PROVIDER_HEALTH_WINDOW)
+        self.max_error_rate = max_error_rate if max_error_rate is not None else cdn_config.PROVIDER_MAX_ERROR_RATE
+        self.max_latency = max_latency if max_latency is not None else cdn_config.PROVIDER_MAX_LATENCY
+        self.min_samples = min_samples if min_samples is not None else cdn_config.PROVIDER_MIN_SAMPLES
+        self.cooldown = cooldown if cooldown is not None else cdn_config.PROVIDER_COOLDOWN
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.total_requests = 0
+        self.total_errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency, ok):
+        with self._lock:
+            self.total_requests += 1
+            if not ok:
+                self.total_errors += 1
+
+            if self.state == self.HALF_OPEN:
+                # La prueba decide: cerrar con ventana limpia o volver a abrir
+                if ok and latency <= self.max_latency:
+                    self.samples.clear()
+                    self.state = self.CLOSED
+                else:
+                    self._open()
+                self.samples.append((latency, ok))
+                return
+
+            self.samples.append((latency, ok))
+            if self.state == self.CLOSED and self._is_degraded():
+                self._open()
+
+    def is_available(self):
+        """Indica, sin cambiar el estado, si el circuito está cerrado o admite una prueba."""
+        with self._lock:
+            return self.state == self.CLOSED or time.monotonic() - self.opened_at >= self.cooldown
+
+    def allow(self):
+        """Indica si se puede hacer una petición ahora; pasado el enfriamiento, esa petición es la prueba."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            # Abierto (o prueba sin respuesta): tras el enfriamiento se deja
+            # pasar una nueva prueba
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+
+    def _is_degraded(self):
+        if len(self.samples) < self.min_samples:
+            return False
+        return self._error_rate() > self.max_error_rate or self._latency_p90() > self.max_latency
+
+    def _error_rate(self):
+        if not self.samples:
+            return 0.0
+        return sum(1 for _latency, ok in self.samples if not ok) / len(self.samples)
+
+    def _latency_p90(self):
+        if not self.samples:
+            return 0.0
+        latencies = sorted(latency for latency, _ok in self.samples)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.9))]
+
+    def stats(self):
+        with self._lock:
+            latencies = [latency for latency, _ok in self.samples]
+            return {
+                'state': self.state,
+                'samples': len(self.samples),
+                'error_rate': round(self._error_rate(), 3),
+                'latency_avg_ms': round(1000 * sum(latencies) / len(latencies), 1) if latencies else None,
+                'latency_p90_ms': round(1000 * self._latency_p90(), 1) if latencies else None,
+                'total_requests': self.total_requests,
+                'total_errors': self.total_errors,
+            }
+
+
+# ============================================================================
+# REGISTRO
+# ============================================================================
+
+class ProviderRegistry:
+    """
+    Registro de proveedores. Resuelve qué proveedor usar según el contexto
+    (``IMAGE_PROVIDERS``) y su salud, con ``FALLBACK_PROVIDER`` y finalmente
+    ``placeholder`` (local, siempre disponible) como respaldo.
+    """
+
+    LAST_RESORT = 'placeholder'
+
+    def __init__(self):
+        self._providers = {}
+        self._health = {}
+        self._hosts = {}
+        self._local = threading.local()
+
+    def register(self, provider):
+        self._providers[provider.name] = provider
+        self._health[provider.name] = ProviderHealth()
+        for host in provider.hosts:
+            self._hosts[host] = provider.name
+        return provider
+
+    def get(self, name):
+        return self._providers[name]
+
+    def provider_for_host(self, host):
+        return self._hosts.get(host)
+
+    def _candidates(self, provider=None, context=None):
+        preferred = provider or cdn_config.IMAGE_PROVIDERS.get(context) or cdn_config.DEFAULT_IMAGE_PROVIDER
+        seen = []
+        for name in (preferred, cdn_config.FALLBACK_PROVIDER, self.LAST_RESORT):
+            if name in self._providers and name not in seen:
+                seen.append(name)
+        return seen
+
+    def resolve(self, provider=None, context=None):
+        """Devuelve el primer proveedor disponible y con el circuito cerrado (o a prueba)."""
+        candidates = self._candidates(provider, context)
+        for name in candidates:
+            if self._providers[name].is_available() and self._health[name].is_available():
+                return self._providers[name]
+        return self._providers[candidates[-1]]
+
+    def build_url(self, marca, modelo, año=None, width=800, height=600,
+                  provider=None, context=None, categoria=None):
+        """
+        Devuelve la URL original del proveedor resuelto. Si un proveedor que
+        hace peticiones falla, se registra el error y se prueba el siguiente.
+        Solo esos proveedores consumen la prueba del circuito: para los demás
+        la prueba es la descarga en /img/ (``allow_url``).
+        """
+        for name in self._candidates(provider, context):
+            instance = self._providers[name]
+            if not instance.is_available():
+                continue
+            health = self._health[name]
+            if not (health.allow() if instance.performs_request else health.is_available()):
+                self.note_fallback()
+                continue
+            start = time.monotonic()
+            try:
+                url = instance.build_url(marca, modelo, año, width, height, categoria)
+            except Exception:
+                self.record(name, time.monotonic() - start, ok=False)
+                self.note_fallback()
+                continue
+            if instance.performs_request:
+                self.record(name, time.monotonic() - start, ok=True)
+            if url:
+                return url
+        return self._providers[self.LAST_RESORT].build_url(marca, modelo, año, width, height, categoria)
+
+    def image_url(self, marca, modelo, año=None, width=800, height=600,
+                  provider=None, context=None, categoria=None):
+        """URL servida a través del proxy local /img/."""
+        from .image_proxy import proxy_url, rendition_for
+
+        return proxy_url(
+            self.build_url(marca, modelo, año, width, height, provider, context, categoria),
+            rendition_for(width, height),
+        )
+
+    @contextmanager
+    def track_fallbacks(self):
+        """
+        Indica si dentro del bloque (en este hilo) se emitió alguna URL de
+        respaldo por un circuito abierto o un proveedor que falló::
+
+            with registry.track_fallbacks() as tracker:
+                url = registry.image_url(...)
+            ttl = cdn_config.PROVIDER_COOLDOWN if tracker.used else 3600
+        """
+        tracker = _FallbackTracker()
+        trackers = self._trackers()
+        trackers.append(tracker)
+        try:
+            yield tracker
+        finally:
+            trackers.remove(tracker)
+
+    def note_fallback(self):
+        """Marca los bloques ``track_fallbacks`` activos (también al leer un respaldo de caché)."""
+        for tracker in self._trackers():
+            tracker.used = True
+
+    def _trackers(self):
+        if not hasattr(self._local, 'trackers'):
+            self._local.trackers = []
+        return self._local.trackers
+
+    def allow_url(self, url):
+        """
+        Indica si se puede descargar ``url`` ahora (circuito de su proveedor
+        cerrado o a prueba). Consume la prueba: el llamador debe registrar el
+        resultado con ``record_url``.
+        """
+        name = self.provider_for_host(urlsplit(url).hostname)
+        return name is None or self._health[name].allow()
+
+    def record(self, name, latency, ok):
+        health = self._health.get(name)
+        if health is not None:
+            health.record(latency, ok)
+
+    def record_url(self, url, latency, ok):
+        """Registra el resultado de una descarga según el host de la URL."""
+        name = self.provider_for_host(urlsplit(url).hostname)
+        if name:
+            self.record(name, latency, ok)
+
+    def health(self):
+        return {name: health.stats() for name, health in self._health.items()}
+
+
+class _FallbackTracker:
+    __slots__ = ('used',)
+
+    def __init__(self):
+        self.used = False
+
+
+registry = ProviderRegistry()
+for _provider_class in (UnsplashProvider, PexelsProvider, PicsumProvider,
+                        PlaceholderProvider, ImaginProvider):
+    registry.register(_provider_class())
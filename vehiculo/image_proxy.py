@@ -0,0 +1,351 @@
+"""
+Proxy local de imágenes con caché LRU en disco.
+
+En lugar de que el navegador cargue directamente imágenes de Unsplash, Picsum
+o via.placeholder.com, las plantillas apuntan a ``/img/?src=...&r=...``. La
+vista descarga la imagen una sola vez, la redimensiona a la variante pedida
+y la guarda en disco; las siguientes peticiones se sirven localmente con
+cabeceras ``Cache-Control`` y ``ETag`` fuertes.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode, urljoin, urlsplit, parse_qs
+
+import requests
+from django.conf import settings
+from django.urls import reverse
+
+from . import cdn_config
+from .cache import SingleFlight
+from .image_providers import registry
+
+
+class DiskLRUCache:
+    """
+    Caché en disco acotada por tamaño total con desalojo LRU.
+
+    El orden de uso se guarda en el ``mtime`` de cada archivo, que se
+    actualiza en cada acierto; al superar ``max_bytes`` se eliminan los
+    archivos menos usados hasta bajar al 90% del límite.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fh:
+                data = fh.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return data
+
+    def set(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Escritura atómica: otro proceso nunca ve un archivo a medias
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_total()
+            else:
+                self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _iter_entries(self):
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _scan_total(self):
+        return sum(size for _path, size, _mtime in self._iter_entries())
+
+    def _evict(self):
+        entries = sorted(self._iter_entries(), key=lambda entry: entry[2])
+        total = sum(size for _path, size, _mtime in entries)
+        target = int(self.max_bytes * 0.9)
+        for path, size, _mtime in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                total -= size
+        self._total_bytes = total
+
+
+class UpstreamError(Exception):
+    """El proveedor externo no devolvió una imagen válida."""
+
+
+class CircuitoAbierto(UpstreamError):
+    """El circuit breaker del proveedor está abierto: no se le pide nada."""
+
+
+class FallosRecientes:
+    """
+    Caché negativa por proceso: una imagen que falló no se vuelve a pedir al
+    proveedor hasta pasados ``ttl`` segundos, se sirve el placeholder.
+    """
+
+    def __init__(self, ttl, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._hasta = {}
+
+    def activo(self, key):
+        with self._lock:
+            hasta = self._hasta.get(key)
+            if hasta is None:
+                return False
+            if hasta <= time.monotonic():
+                del self._hasta[key]
+                return False
+            return True
+
+    def registrar(self, key):
+        ahora = time.monotonic()
+        with self._lock:
+            if len(self._hasta) >= self.max_entries:
+                for vencida in [k for k, v in self._hasta.items() if v <= ahora]:
+                    del self._hasta[vencida]
+                if len(self._hasta) >= self.max_entries:
+                    self._hasta.clear()
+            self._hasta[key] = ahora + self.ttl
+
+
+_cache = None
+_cache_lock = threading.Lock()
+_single_flight = SingleFlight()
+_fallos = FallosRecientes(cdn_config.IMAGE_PROXY_NEGATIVE_TTL)
+
+
+def get_cache():
+    """Devuelve la caché en disco compartida por el proceso."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DiskLRUCache(
+                    getattr(settings, 'IMAGE_PROXY_CACHE_DIR',
+                            os.path.join(settings.BASE_DIR, 'cache', 'imagenes')),
+                    cdn_config.IMAGE_PROXY_CACHE_MAX_BYTES,
+                )
+    return _cache
+
+
+def is_allowed_source(src):
+    """Solo se hace proxy de los hosts de proveedores conocidos."""
+    try:
+        parts = urlsplit(src)
+    except ValueError:
+        return False
+    return parts.scheme in ('http', 'https') and parts.hostname in cdn_config.IMAGE_PROXY_ALLOWED_HOSTS
+
+
+def rendition_for(width, height):
+    """Elige la variante predefinida más cercana a las dimensiones pedidas."""
+    try:
+        area = int(width) * int(height)
+    except (TypeError, ValueError):
+        return 'full'
+    return min(
+        cdn_config.IMAGE_RENDITIONS,
+        key=lambda name: abs(
+            cdn_config.IMAGE_RENDITIONS[name][0] * cdn_config.IMAGE_RENDITIONS[name][1] - area
+        ),
+    )
+
+
+def proxy_url(src, rendition='full'):
+    """
+    Convierte una URL externa en una URL del proxy local.
+    Las URLs que no pertenecen a un proveedor conocido se devuelven sin cambios.
+    """
+    if not src or not is_allowed_source(src):
+        return src
+    if rendition not in cdn_config.IMAGE_RENDITIONS:
+        rendition = 'full'
+    return f"{reverse('imagen_proxy')}?{urlencode({'src': src, 'r': rendition})}"
+
+
+def get_image(src, rendition):
+    """
+    Devuelve ``(bytes, content_type, cacheable)`` para la imagen pedida.
+
+    Los fallos concurrentes para la misma imagen se agrupan en una sola
+    descarga; si el proveedor falla se genera un placeholder local que no
+    se guarda en caché, y durante ``IMAGE_PROXY_NEGATIVE_TTL`` segundos esa
+    imagen se responde con el placeholder sin volver a pedirla.
+    """
+    key = f'{rendition}:{src}'
+    cache = get_cache()
+
+    data = cache.get(key)
+    if data is not None:
+        return data, 'image/jpeg', True
+    if _fallos.activo(key):
+        return render_placeholder(rendition, text='AutoElite'), 'image/jpeg', False
+
+    def fill():
+        # Otro hilo pudo haber llenado la caché mientras esperábamos
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        data = _fetch_rendition(src, rendition)
+        cache.set(key, data)
+        return data
+
+    try:
+        return _single_flight.do(key, fill), 'image/jpeg', True
+    except CircuitoAbierto:
+        # Sin caché negativa: al cerrarse el circuito la imagen se pide de nuevo
+        return render_placeholder(rendition, text='AutoElite'), 'image/jpeg', False
+    except UpstreamError:
+        _fallos.registrar(key)
+        return render_placeholder(rendition, text='AutoElite'), 'image/jpeg', False
+
+
+def _fetch_rendition(src, rendition):
+    if urlsplit(src).hostname in cdn_config.IMAGE_PROXY_LOCAL_HOSTS:
+        return _render_placeholder_url(src, rendition)
+    if not registry.allow_url(src):
+        # Las URLs /img/ ya emitidas respetan el circuito igual que las nuevas:
+        # se sirve el placeholder local sin esperar al proveedor degradado
+        raise CircuitoAbierto(f'Proveedor degradado: {src}')
+
+    max_bytes = cdn_config.IMAGE_PROXY_MAX_UPSTREAM_BYTES
+    start = time.monotonic()
+    try:
+        with _get_upstream(src) as response:
+            response.raise_for_status()
+            body = io.BytesIO()
+            for chunk in response.iter_content(64 * 1024):
+                body.write(chunk)
+                if body.tell() > max_bytes:
+                    raise UpstreamError(f'Imagen demasiado grande: {src}')
+        body.seek(0)
+        data = _resize(body, rendition)
+    except (requests.RequestException, UpstreamError) as e:
+        # La salud del proveedor alimenta su circuit breaker
+        registry.record_url(src, time.monotonic() - start, ok=False)
+        if isinstance(e, UpstreamError):
+            raise
+        raise UpstreamError(str(e)) from e
+
+    registry.record_url(src, time.monotonic() - start, ok=True)
+    return data
+
+
+def _get_upstream(src):
+    """
+    GET en streaming siguiendo las redirecciones a mano: cada salto debe ir
+    a un host permitido, o un proveedor permitido podría llevar el proxy a
+    cualquier dirección (incluida la red interna).
+    """
+    url = src
+    for _ in range(cdn_config.IMAGE_PROXY_MAX_REDIRECTS + 1):
+        response = requests.get(
+            url, timeout=cdn_config.IMAGE_PROXY_TIMEOUT, stream=True, allow_redirects=False,
+        )
+        if not response.is_redirect:
+            return response
+        response.close()
+        destino = urljoin(url, response.headers['Location'])
+        if not is_allowed_source(destino) or urlsplit(destino).hostname in cdn_config.IMAGE_PROXY_LOCAL_HOSTS:
+            raise UpstreamError(f'Redirección a un host no permitido: {destino}')
+        url = destino
+    raise UpstreamError(f'Demasiadas redirecciones: {src}')
+
+
+def _resize(stream, rendition):
+    from PIL import Image, ImageOps
+
+    try:
+        image = Image.open(stream)
+        image.load()
+    except Exception as e:
+        raise UpstreamError(f'Respuesta no es una imagen: {e}') from e
+
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    size = cdn_config.IMAGE_RENDITIONS[rendition]
+    image = ImageOps.fit(image, size, method=Image.LANCZOS)
+    return _encode_jpeg(image)
+
+
+def _encode_jpeg(image):
+    out = io.BytesIO()
+    image.save(out, format='JPEG', quality=cdn_config.IMAGE_QUALITY,
+               optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def _render_placeholder_url(src, rendition):
+    """
+    via.placeholder.com ya no está disponible: las URLs con ese formato
+    (``/800x600/<color>/<texto>?text=...``) se dibujan localmente.
+    """
+    parts = urlsplit(src)
+    segments = [s for s in parts.path.split('/') if s]
+    color = segments[1] if len(segments) > 1 else None
+    text = parse_qs(parts.query).get('text', [''])[0].replace('+', ' ')
+    return render_placeholder(rendition, color=color, text=text)
+
+
+def render_placeholder(rendition, color=None, text=''):
+    """Dibuja un placeholder plano con texto centrado."""
+    from PIL import Image, ImageDraw
+
+    size = cdn_config.IMAGE_RENDITIONS.get(rendition, cdn_config.IMAGE_RENDITIONS['full'])
+    try:
+        background = tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
+    except (TypeError, ValueError, IndexError):
+        background = (44, 62, 80)
+
+    image = Image.new('RGB', size, background)
+    if text:
+        draw = ImageDraw.Draw(image)
+        left, top, right, bottom = draw.textbbox((0, 0), text)
+        draw.text(((size[0] - (right - left)) / 2, (size[1] - (bottom - top)) / 2),
+                  text, fill=(255, 255, 255))
+    return _encode_jpeg(image)
+
+
+def compute_etag(data):
+    return '"%s"' % hashlib.sha256(data).hexdigest()[:32]
+
+
+def cache_control(cacheable):
+    if cacheable:
+        return f'public, max-age={cdn_config.IMAGE_PROXY_MAX_AGE}'
+    return 'public, max-age=60'
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.asgi import get_asgi_application
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara vehiculos_api (sync) con vehiculos_api_async bajo ASGI, con la misma '
+        'concurrencia, llamando a la aplicación ASGI en el mismo proceso como lo haría el servidor'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests simultáneos (default: 50)')
+        parser.add_argument('--requests', type=int, default=500, help='Requests por vista (default: 500)')
+        parser.add_argument(
+            '--query',
+            default='expand=vendedor,imagenes',
+            help="Query string de cada request (default: 'expand=vendedor,imagenes')",
+        )
+        parser.add_argument('--host', default='localhost', help='Host de los requests, debe estar permitido (default: localhost)')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError('--concurrency y --requests deben ser mayores que 0')
+
+        self.application = get_asgi_application()
+        vistas = [
+            ('sync', reverse('vehiculo:vehiculos_api')),
+            ('async', reverse('vehiculo:vehiculos_api_async')),
+        ]
+        self.stdout.write(
+            f"⏱️  {options['requests']} requests por vista, {options['concurrency']} simultáneos, "
+            f"?{options['query']}"
+        )
+
+        # El límite de peticiones cortaría la prueba con 429 desde la misma IP
+        with override_settings(VEHICULO_RATELIMIT={**getattr(settings, 'VEHICULO_RATELIMIT', {}), 'ENABLED': False}):
+            for nombre, url in vistas:
+                self.comparar(nombre, url, options)
+
+    def comparar(self, nombre, url, options):
+        # Calentar cachés y conexiones para que ambas vistas partan igual
+        async_to_sync(self.medir)(url, options['query'], 1, min(options['concurrency'], 10), options['host'])
+        resultado = async_to_sync(self.medir)(
+            url, options['query'], options['concurrency'], options['requests'], options['host']
+        )
+
+        self.stdout.write(self.style.SUCCESS(f"📊 {nombre}: {url}?{options['query']}"))
+        self.stdout.write(
+            f"  • {resultado['requests'] / resultado['segundos']:.0f} req/s, "
+            f"p50 {self.percentil(resultado['latencias'], 0.50) * 1000:.1f} ms, "
+            f"p99 {self.percentil(resultado['latencias'], 0.99) * 1000:.1f} ms"
+        )
+        self.stdout.write(
+            f"  • {resultado['errores']} errores, hasta {resultado['hilos']} hilos vivos durante la prueba"
+        )
+
+    async def get(self, path, query, host):
+        """Un GET directo a la aplicación ASGI; devuelve el status."""
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'headers': [(b'host', host.encode())],
+            'client': ('127.0.0.1', 0),
+            'server': (host, 80),
+        }
+        status = None
+        cuerpo_enviado = False
+        respondido = asyncio.Event()
+
+        async def receive():
+            nonlocal cuerpo_enviado
+            if not cuerpo_enviado:
+                cuerpo_enviado = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # Como un servidor real: el cliente se "desconecta" al recibir la respuesta
+            await respondido.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(mensaje):
+            nonlocal status
+            if mensaje['type'] == 'http.response.start':
+                status = mensaje['status']
+            elif mensaje['type'] == 'http.response.body' and not mensaje.get('more_body'):
+                respondido.set()
+
+        await self.application(scope, receive, send)
+        return status
+
+    async def medir(self, path, query, concurrency, total, host):
+        pendientes = iter(range(total))
+        latencias = []
+        errores = 0
+        hilos = threading.active_count()
+        terminado = asyncio.Event()
+
+        async def cliente():
+            nonlocal errores
+            for _ in pendientes:
+                inicio = time.perf_counter()
+                status = await self.get(path, query, host)
+                latencias.append(time.perf_counter() - inicio)
+                if status != 200:
+                    errores += 1
+
+        async def contar_hilos():
+            nonlocal hilos
+            while not terminado.is_set():
+                hilos = max(hilos, threading.active_count())
+                await asyncio.sleep(0.01)
+
+        muestreo = asyncio.create_task(contar_hilos())
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente() for _ in range(concurrency)))
+        segundos = time.perf_counter() - inicio
+        terminado.set()
+        await muestreo
+
+        return {
+            'requests': len(latencias),
+            'segundos': segundos,
+            'latencias': latencias,
+            'errores': errores,
+            'hilos': hilos,
+        }
+
+    def percentil(self, valores, p):
+        if not valores:
+            return 0.0
+        valores = sorted(valores)
+        return valores[min(len(valores) - 1, int(len(valores) * p))]
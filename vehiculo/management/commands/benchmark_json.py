@@ -0,0 +1,75 @@
+import gzip
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from vehiculo.models import Vehiculo
+from vehiculo.serializers import VehiculoSerializer, parse_expand, parse_fields
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide filas por segundo al codificar el listado de la API: dicts + DjangoJSONEncoder '
+        'contra los codificadores precalculados de VehiculoSerializer, y el ahorro de gzip'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50000, help='Filas a codificar por ronda (default: 50000)')
+        parser.add_argument('--rounds', type=int, default=5, help='Rondas por método; se reporta la mejor (default: 5)')
+        parser.add_argument('--fields', help='Campos como en ?fields= (default: los de vehiculos_api)')
+        parser.add_argument('--expand', help='Expansiones como en ?expand= (default: ninguna)')
+
+    def handle(self, *args, **options):
+        try:
+            serializer = VehiculoSerializer(parse_fields(options['fields']), parse_expand(options['expand']))
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        # Las filas se leen una vez y se repiten en memoria: solo se mide la codificación
+        muestra = list(Vehiculo.objects.values_list(*serializer.columnas)[:options['rows']])
+        if not muestra:
+            raise CommandError('No hay vehículos; ejecuta primero poblar_vehiculos')
+        filas = (muestra * (options['rows'] // len(muestra) + 1))[:options['rows']]
+
+        metodos = [
+            ('DjangoJSONEncoder', lambda: json.dumps(
+                {'success': True, 'vehiculos': [serializer.serialize_fila(fila) for fila in filas]},
+                cls=DjangoJSONEncoder,
+            )),
+            ('codificadores precalculados', lambda: (
+                '{"success":true,"vehiculos":' + serializer.codificar_json(filas) + '}'
+            )),
+        ]
+
+        self.stdout.write(f"⏱️  {len(filas)} filas ({len(muestra)} distintas), mejor de {options['rounds']} rondas")
+        base = None
+        for nombre, codificar in metodos:
+            segundos, cuerpo = self.medir(codificar, options['rounds'])
+            filas_por_segundo = len(filas) / segundos
+            base = base or filas_por_segundo
+            self.stdout.write(self.style.SUCCESS(f'📊 {nombre}'))
+            self.stdout.write(
+                f'  • {filas_por_segundo:,.0f} filas/s ({filas_por_segundo / base:.1f}x), '
+                f'{len(cuerpo.encode()) / 1024:,.0f} KB'
+            )
+
+        datos = cuerpo.encode()
+        inicio = time.perf_counter()
+        comprimido = gzip.compress(datos, compresslevel=6)
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS('🗜️  gzip (nivel 6, como GZipMiddleware)'))
+        self.stdout.write(
+            f'  • {len(comprimido) / 1024:,.0f} KB ({len(comprimido) / len(datos):.0%} del original) '
+            f'en {segundos * 1000:.0f} ms'
+        )
+
+    def medir(self, codificar, rondas):
+        mejor = None
+        for _ in range(max(1, rondas)):
+            inicio = time.perf_counter()
+            cuerpo = codificar()
+            segundos = time.perf_counter() - inicio
+            mejor = segundos if mejor is None else min(mejor, segundos)
+        return mejor, cuerpo
@@ -0,0 +1,142 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from vehiculo.sqlite import sentencias_pragma
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide lecturas y escrituras concurrentes sobre una base SQLite temporal, '
+        'con los valores por defecto y con SQLITE_PRAGMAS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4, help='Hilos lectores (default: 4)')
+        parser.add_argument('--writers', type=int, default=2, help='Hilos escritores (default: 2)')
+        parser.add_argument('--duration', type=float, default=5.0, help='Segundos por perfil (default: 5)')
+        parser.add_argument('--rows', type=int, default=20000, help='Filas de la tabla de prueba (default: 20000)')
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=5.0,
+            help=(
+                'Timeout de la conexión en segundos, igual en ambos perfiles; SQLITE_PRAGMAS lo '
+                'reemplaza si fija busy_timeout (default: 5, el de sqlite3 y Django)'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        perfiles = [
+            ('por defecto', []),
+            ('SQLITE_PRAGMAS', sentencias_pragma(getattr(settings, 'SQLITE_PRAGMAS', {}))),
+        ]
+        self.stdout.write(
+            f"⏱️  {options['readers']} lectores, {options['writers']} escritores, "
+            f"{options['duration']:.0f} s por perfil, {options['rows']} filas"
+        )
+
+        for nombre, pragmas in perfiles:
+            with tempfile.TemporaryDirectory() as directorio:
+                path = os.path.join(directorio, 'benchmark.sqlite3')
+                self.crear_base(path, options['rows'])
+                resultado = self.medir(path, pragmas, options)
+
+            self.stdout.write(self.style.SUCCESS(f'📊 {nombre}'))
+            for tipo in ('lecturas', 'escrituras'):
+                datos = resultado[tipo]
+                self.stdout.write(
+                    f"  • {tipo}: {datos['ops'] / options['duration']:.0f} ops/s, "
+                    f"p99 {self.percentil(datos['latencias'], 0.99) * 1000:.1f} ms, "
+                    f"{datos['errores']} errores 'database is locked'"
+                )
+
+    def crear_base(self, path, rows):
+        conn = sqlite3.connect(path)
+        conn.execute(
+            'CREATE TABLE vehiculo (id INTEGER PRIMARY KEY, precio REAL, '
+            'categoria TEXT, total_favoritos INTEGER NOT NULL DEFAULT 0)'
+        )
+        conn.execute('CREATE INDEX vehiculo_categoria ON vehiculo (categoria)')
+        categorias = ('Sedán', 'SUV', 'Deportivo', 'Eléctrico', 'Híbrido')
+        conn.executemany(
+            'INSERT INTO vehiculo (id, precio, categoria) VALUES (?, ?, ?)',
+            ((i, random.uniform(5000, 90000), categorias[i % len(categorias)]) for i in range(1, rows + 1)),
+        )
+        conn.commit()
+        conn.close()
+
+    def conectar(self, path, pragmas, timeout):
+        conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        for sentencia in pragmas:
+            conn.execute(sentencia)
+        return conn
+
+    def medir(self, path, pragmas, options):
+        rows = options['rows']
+        resultado = {
+            'lecturas': {'ops': 0, 'errores': 0, 'latencias': []},
+            'escrituras': {'ops': 0, 'errores': 0, 'latencias': []},
+        }
+        lock = threading.Lock()
+        listos = threading.Barrier(options['readers'] + options['writers'] + 1)
+        fin = [0.0]
+
+        def trabajador(tipo, operacion):
+            conn = self.conectar(path, pragmas, options['timeout'])
+            ops = errores = 0
+            latencias = []
+            listos.wait()
+            while time.perf_counter() < fin[0]:
+                inicio = time.perf_counter()
+                try:
+                    operacion(conn)
+                    ops += 1
+                    latencias.append(time.perf_counter() - inicio)
+                except sqlite3.OperationalError:
+                    errores += 1
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+            conn.close()
+            with lock:
+                resultado[tipo]['ops'] += ops
+                resultado[tipo]['errores'] += errores
+                resultado[tipo]['latencias'].extend(latencias)
+
+        def leer(conn):
+            desde = random.randint(1, rows)
+            conn.execute(
+                'SELECT id, precio, total_favoritos FROM vehiculo WHERE id BETWEEN ? AND ?',
+                (desde, desde + 50),
+            ).fetchall()
+            conn.execute('SELECT categoria, COUNT(*) FROM vehiculo GROUP BY categoria').fetchall()
+
+        def escribir(conn):
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(
+                'UPDATE vehiculo SET total_favoritos = total_favoritos + 1 WHERE id = ?',
+                (random.randint(1, rows),),
+            )
+            conn.execute('COMMIT')
+
+        hilos = [threading.Thread(target=trabajador, args=('lecturas', leer)) for _ in range(options['readers'])]
+        hilos += [threading.Thread(target=trabajador, args=('escrituras', escribir)) for _ in range(options['writers'])]
+        for hilo in hilos:
+            hilo.start()
+        fin[0] = time.perf_counter() + options['duration']
+        listos.wait()
+        for hilo in hilos:
+            hilo.join()
+        return resultado
+
+    def percentil(self, valores, p):
+        if not valores:
+            return 0.0
+        valores = sorted(valores)
+        return valores[min(len(valores) - 1, int(len(valores) * p))]
@@ -0,0 +1,94 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from vehiculo.delta import config as config_delta
+from vehiculo.models import CambioVehiculo
+
+
+class Command(BaseCommand):
+    help = (
+        'Compacta el registro de cambios del catálogo: borra lo anterior a la retención '
+        'y, en lo más antiguo, deja solo el último cambio de cada vehículo'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            help='Días de retención (default: VEHICULO_DELTA["RETENCION_DIAS"])',
+        )
+        parser.add_argument(
+            '--colapsar-horas',
+            type=float,
+            default=24.0,
+            help='Cambios más antiguos que esto se colapsan al último por vehículo (default: 24)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Filas borradas por transacción (default: 1000)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.0,
+            help='Segundos de pausa entre lotes para dejar pasar escrituras',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo contar lo que se borraría',
+        )
+
+    def handle(self, *args, **options):
+        dias = options['dias'] if options['dias'] is not None else config_delta()['RETENCION_DIAS']
+        if options['dias'] is not None and dias < config_delta()['RETENCION_DIAS']:
+            # Los tokens dentro de la retención configurada perderían bajas sin recibir 410
+            raise CommandError(
+                f'--dias no puede ser menor que VEHICULO_DELTA["RETENCION_DIAS"] '
+                f'({config_delta()["RETENCION_DIAS"]})'
+            )
+
+        ahora = timezone.now()
+        vencidos = CambioVehiculo.objects.filter(fecha__lt=ahora - timedelta(days=dias))
+        # Un alta o cambio seguido de otro cambio del mismo vehículo ya no aporta
+        # nada: el delta lee el estado actual y las bajas viven en el último cambio
+        superados = CambioVehiculo.objects.filter(
+            fecha__lt=ahora - timedelta(hours=options['colapsar_horas']),
+        ).exclude(tipo=CambioVehiculo.ELIMINADO).filter(
+            Exists(CambioVehiculo.objects.filter(vehiculo_id=OuterRef('vehiculo_id'), id__gt=OuterRef('id')))
+        )
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f'📊 {vencidos.count()} cambios fuera de la retención de {dias} días, '
+                f'{superados.count()} superados por un cambio posterior'
+            ))
+            return
+
+        self.stdout.write('🧹 Compactando el registro de cambios...')
+        borrados_vencidos = self.borrar(vencidos, options)
+        borrados_superados = self.borrar(superados, options)
+        self.stdout.write(self.style.SUCCESS(
+            f'🎉 {borrados_vencidos} cambios vencidos y {borrados_superados} superados eliminados'
+        ))
+
+    def borrar(self, queryset, options):
+        borrados = 0
+        while True:
+            ids = list(queryset.values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            # Borrar por clave primaria mantiene cada transacción corta
+            count, _ = CambioVehiculo.objects.filter(id__in=ids).delete()
+            borrados += count
+            if options['verbosity'] > 1:
+                self.stdout.write(f'  • {borrados} cambios eliminados')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        return borrados
@@ -0,0 +1,156 @@
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+
+import requests
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageDraw
+
+from vehiculo import cdn_config
+from vehiculo.models import Vehiculo
+
+# Directorio del bundle dentro de los estáticos de la app
+LOGOS_DIR = Path(__file__).resolve().parents[2] / 'static' / 'img' / 'marcas'
+STATIC_PREFIX = 'img/marcas'
+LOGO_SIZE = 128
+SPRITE_COLUMNS = 5
+
+
+class Command(BaseCommand):
+    help = 'Descarga y optimiza los logos de marcas en static/ (con sprite y manifest con hash)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--offline',
+            action='store_true',
+            help='No descargar nada: generar logos locales con las iniciales de cada marca',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=int,
+            default=10,
+            help='Segundos de espera por logo (default: 10)',
+        )
+
+    def handle(self, *args, **options):
+        offline = options['offline']
+        LOGOS_DIR.mkdir(parents=True, exist_ok=True)
+
+        self.stdout.write(f'🏷️  Construyendo bundle de logos en {LOGOS_DIR}...')
+
+        logos = {}
+        for marca, _label in Vehiculo.MARCAS:
+            image = None
+            if not offline:
+                image = self.fetch_logo(marca, options['timeout'])
+            if image is None:
+                image = self.render_stand_in(marca)
+                self.stdout.write(f'  • {marca}: logo local generado')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'  ✅ {marca}: descargado'))
+            logos[marca] = self.normalize(image)
+
+        old_files = {p.name for p in LOGOS_DIR.iterdir() if p.name != 'manifest.json'}
+        manifest = {'version': 1, 'logos': {}, 'sprite': {}}
+
+        for marca, image in logos.items():
+            manifest['logos'][marca] = self.write_hashed(image, self.slugify(marca))
+        manifest['placeholder'] = self.write_hashed(self.render_stand_in('?'), 'placeholder')
+        manifest['sprite'] = self.write_sprite(logos)
+
+        (LOGOS_DIR / 'manifest.json').write_text(
+            json.dumps(manifest, indent=2, ensure_ascii=False, sort_keys=True) + '\n',
+            encoding='utf-8',
+        )
+
+        # Eliminar versiones anteriores que ya no están en el manifest
+        current = {Path(path).name for path in manifest['logos'].values()}
+        current.add(Path(manifest['placeholder']).name)
+        current.update(Path(manifest['sprite'][key]).name for key in ('image', 'css'))
+        for name in old_files - current:
+            os.remove(LOGOS_DIR / name)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'🎉 Bundle listo: {len(logos)} logos, sprite y manifest.json')
+        )
+
+    def slugify(self, marca):
+        return marca.lower().replace(' ', '-')
+
+    def fetch_logo(self, marca, timeout):
+        url = f'{cdn_config.BRAND_LOGO_CDN}{self.slugify(marca)}-logo.png'
+        try:
+            response = requests.get(url, timeout=timeout)
+            response.raise_for_status()
+            image = Image.open(io.BytesIO(response.content))
+            image.load()
+            return image
+        except Exception as e:
+            self.stdout.write(self.style.WARNING(f'  ⚠️ {marca}: no se pudo descargar ({e})'))
+            return None
+
+    def render_stand_in(self, marca):
+        """Logo local: círculo con las iniciales, color estable por marca."""
+        color = hashlib.md5(marca.encode()).hexdigest()[:6]
+        fill = tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
+        image = Image.new('RGBA', (LOGO_SIZE, LOGO_SIZE), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(image)
+        draw.ellipse((4, 4, LOGO_SIZE - 4, LOGO_SIZE - 4), fill=fill + (255,))
+
+        initials = ''.join(word[0] for word in marca.replace('-', ' ').split())[:2].upper()
+        left, top, right, bottom = draw.textbbox((0, 0), initials)
+        draw.text(((LOGO_SIZE - (right - left)) / 2, (LOGO_SIZE - (bottom - top)) / 2),
+                  initials, fill=(255, 255, 255, 255))
+        return image
+
+    def normalize(self, image):
+        """Ajusta el logo a un lienzo cuadrado transparente de LOGO_SIZE."""
+        image = image.convert('RGBA')
+        image.thumbnail((LOGO_SIZE, LOGO_SIZE), Image.LANCZOS)
+        canvas = Image.new('RGBA', (LOGO_SIZE, LOGO_SIZE), (0, 0, 0, 0))
+        canvas.paste(image, ((LOGO_SIZE - image.width) // 2, (LOGO_SIZE - image.height) // 2), image)
+        return canvas
+
+    def encode_png(self, image):
+        out = io.BytesIO()
+        image.save(out, format='PNG', optimize=True)
+        return out.getvalue()
+
+    def write_bytes(self, data, stem, extension):
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        name = f'{stem}.{digest}.{extension}'
+        (LOGOS_DIR / name).write_bytes(data)
+        return f'{STATIC_PREFIX}/{name}'
+
+    def write_hashed(self, image, stem):
+        return self.write_bytes(self.encode_png(image), stem, 'png')
+
+    def write_sprite(self, logos):
+        rows = -(-len(logos) // SPRITE_COLUMNS)
+        sprite = Image.new('RGBA', (SPRITE_COLUMNS * LOGO_SIZE, rows * LOGO_SIZE), (0, 0, 0, 0))
+        positions = {}
+        for index, (marca, image) in enumerate(logos.items()):
+            x = (index % SPRITE_COLUMNS) * LOGO_SIZE
+            y = (index // SPRITE_COLUMNS) * LOGO_SIZE
+            sprite.paste(image, (x, y))
+            positions[marca] = [x, y]
+
+        sprite_path = self.write_hashed(sprite, 'sprite')
+        sprite_name = Path(sprite_path).name
+
+        css = [
+            '.brand-logo {',
+            f'    background-image: url("{sprite_name}");',
+            '    background-repeat: no-repeat;',
+            f'    width: {LOGO_SIZE}px;',
+            f'    height: {LOGO_SIZE}px;',
+            '    display: inline-block;',
+            '}',
+        ]
+        for marca, (x, y) in positions.items():
+            css.append(f'.brand-logo-{self.slugify(marca)} {{ background-position: -{x}px -{y}px; }}')
+        css_path = self.write_bytes(('\n'.join(css) + '\n').encode('utf-8'), 'sprite', 'css')
+
+        return {'image': sprite_path, 'css': css_path, 'size': LOGO_SIZE, 'positions': positions}
@@ -0,0 +1,134 @@
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from vehiculo import contadores
+from vehiculo.models import Vehiculo, vehiculo_image_path, es_ruta_fragmentada
+
+
+class Command(BaseCommand):
+    help = (
+        'Mueve las imágenes existentes al esquema vehiculos/ab/cd/<hash>.<ext> '
+        'por lotes y actualiza las referencias en la base de datos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Vehículos procesados por lote (default: 200)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.0,
+            help='Segundos de pausa entre lotes para no saturar el disco en producción',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Número máximo de archivos a mover en esta ejecución',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo contar los archivos pendientes de mover',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        limit = options['limit']
+        dry_run = options['dry_run']
+
+        self.stdout.write('📦 Migrando imágenes al esquema repartido por hash...')
+
+        moved = pending = missing = conflicts = 0
+        last_pk = 0
+
+        while limit is None or moved < limit:
+            # Paginación por clave: cada lote es una consulta indexada corta
+            batch = list(
+                Vehiculo.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', *Vehiculo.CAMPOS_IMAGEN)[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+
+            for pk, *names in batch:
+                if limit is not None and moved >= limit:
+                    break
+                old_values = {
+                    field: name
+                    for field, name in zip(Vehiculo.CAMPOS_IMAGEN, names)
+                    if name and not es_ruta_fragmentada(name)
+                }
+                if not old_values:
+                    continue
+                pending += len(old_values)
+                if dry_run:
+                    continue
+
+                result = self.migrate_row(pk, old_values)
+                moved += result['moved']
+                missing += result['missing']
+                conflicts += result['conflict']
+
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(f'📊 {pending} archivos pendientes de migrar'))
+            return
+
+        if moved:
+            # Las páginas completas cacheadas dependen de la versión del catálogo
+            contadores.invalidar()
+        self.stdout.write(self.style.SUCCESS(f'🎉 {moved} archivos movidos'))
+        if missing:
+            self.stdout.write(self.style.WARNING(f'⚠️ {missing} referencias apuntan a archivos inexistentes'))
+        if conflicts:
+            self.stdout.write(self.style.WARNING(
+                f'⏭️  {conflicts} vehículos cambiaron durante la migración; se reintentarán en la próxima ejecución'
+            ))
+
+    def migrate_row(self, pk, old_values):
+        """
+        Copia los archivos de un vehículo a sus nuevas rutas y actualiza la
+        fila con un único UPDATE condicionado a las rutas antiguas, de modo
+        que una edición concurrente nunca se pisa. ``update()`` no toca
+        ``fecha_actualizacion`` por sí solo: se fija a mano para que las
+        tarjetas cacheadas y los deltas ``?since=`` vean las rutas nuevas.
+        """
+        result = {'moved': 0, 'missing': 0, 'conflict': 0}
+        new_values = {}
+
+        for field, old_name in old_values.items():
+            if not default_storage.exists(old_name):
+                result['missing'] += 1
+                continue
+            with default_storage.open(old_name, 'rb') as fh:
+                new_values[field] = default_storage.save(vehiculo_image_path(None, old_name), fh)
+
+        if not new_values:
+            return result
+
+        updated = Vehiculo.objects.filter(
+            pk=pk, **{field: old_values[field] for field in new_values}
+        ).update(**new_values, fecha_actualizacion=timezone.now())
+
+        if updated:
+            for field in new_values:
+                default_storage.delete(old_values[field])
+            result['moved'] = len(new_values)
+        else:
+            # La fila cambió entre la lectura y el UPDATE: descartar las copias
+            for new_name in new_values.values():
+                default_storage.delete(new_name)
+            result['conflict'] = 1
+        return result
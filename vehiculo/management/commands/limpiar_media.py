@@ -0,0 +1,154 @@
+import hashlib
+import posixpath
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from vehiculo.models import Vehiculo
+
+
+def path_digest(name):
+    """
+    Huella de 64 bits de una ruta. Un set de enteros ocupa mucho menos que
+    uno de cadenas; una colisión solo haría conservar un huérfano, nunca
+    borrar un archivo referenciado.
+    """
+    return int.from_bytes(hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class Command(BaseCommand):
+    help = 'Elimina de media/ los archivos de vehículos que ya no están referenciados en la base de datos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo reportar los huérfanos y los bytes a recuperar, sin borrar nada',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Hilos para borrar en paralelo (default: 1)',
+        )
+        parser.add_argument(
+            '--prefix',
+            type=str,
+            default='vehiculos',
+            help='Directorio del storage a recorrer (default: vehiculos)',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=24,
+            help='Horas mínimas de antigüedad para borrar un huérfano, protege subidas en curso (default: 24)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Filas leídas por lote de la base de datos (default: 2000)',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        workers = max(1, options['workers'])
+        cutoff = timezone.now() - timedelta(hours=options['min_age'])
+
+        self.stdout.write('🧹 Cargando rutas referenciadas en la base de datos...')
+        referenced = self.referenced_digests(options['chunk_size'])
+        self.stdout.write(f'📊 {len(referenced)} rutas referenciadas')
+
+        scanned = orphans = skipped_recent = failed = 0
+        reclaimed = 0
+        pending = set()
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for name in self.walk(options['prefix']):
+                scanned += 1
+                if path_digest(name) in referenced:
+                    continue
+                try:
+                    if default_storage.get_modified_time(name) > cutoff:
+                        skipped_recent += 1
+                        continue
+                except (OSError, NotImplementedError):
+                    pass
+
+                orphans += 1
+                if dry_run:
+                    reclaimed += self.size(name)
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f'  • {name}')
+                    continue
+
+                pending.add(executor.submit(self.delete, name))
+                # Acotar los borrados en vuelo para no acumular millones de futures
+                if len(pending) >= workers * 64:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    reclaimed, failed = self.collect(done, reclaimed, failed)
+
+            done, _ = wait(pending)
+            reclaimed, failed = self.collect(done, reclaimed, failed)
+
+        action = 'a recuperar' if dry_run else 'recuperados'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'🎉 {scanned} archivos revisados, {orphans} huérfanos, '
+                f'{self.format_bytes(reclaimed)} {action}'
+            )
+        )
+        if skipped_recent:
+            self.stdout.write(f'⏭️  {skipped_recent} huérfanos recientes conservados (--min-age)')
+        if failed:
+            self.stdout.write(self.style.ERROR(f'❌ {failed} archivos no se pudieron borrar'))
+
+    def referenced_digests(self, chunk_size):
+        referenced = set()
+        rows = Vehiculo.objects.values_list(*Vehiculo.CAMPOS_IMAGEN).iterator(chunk_size=chunk_size)
+        for row in rows:
+            for name in row:
+                if name:
+                    referenced.add(path_digest(name))
+        return referenced
+
+    def walk(self, path):
+        """Recorre el storage directorio por directorio, sin listar todo de golpe."""
+        try:
+            directories, files = default_storage.listdir(path)
+        except FileNotFoundError:
+            return
+        for name in files:
+            yield posixpath.join(path, name)
+        for directory in directories:
+            yield from self.walk(posixpath.join(path, directory))
+
+    def size(self, name):
+        try:
+            return default_storage.size(name)
+        except OSError:
+            return 0
+
+    def delete(self, name):
+        size = self.size(name)
+        default_storage.delete(name)
+        return size
+
+    def collect(self, futures, reclaimed, failed):
+        for future in futures:
+            try:
+                reclaimed += future.result()
+            except OSError as e:
+                failed += 1
+                self.stderr.write(f'⚠️ {e}')
+        return reclaimed, failed
+
+    def format_bytes(self, size):
+        for unit in ('B', 'KB', 'MB', 'GB'):
+            if size < 1024:
+                return f'{size:.1f} {unit}'
+            size /= 1024
+        return f'{size:.1f} TB'
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from vehiculo.sqlite import pragmas_actuales
+
+
+class Command(BaseCommand):
+    help = (
+        'Mantenimiento periódico de SQLite: PRAGMA optimize, ANALYZE opcional y '
+        'checkpoint del WAL. Pensado para ejecutarse desde cron'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            default='default',
+            help='Alias de la base de datos (default: default)',
+        )
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Ejecutar ANALYZE completo además de PRAGMA optimize',
+        )
+        parser.add_argument(
+            '--vacuum',
+            action='store_true',
+            help='Ejecutar VACUUM (bloquea la base mientras dura; usar en ventanas de mantenimiento)',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'optimizar_db solo aplica a SQLite (motor actual: {connection.vendor})')
+
+        self.stdout.write('🛠️  Optimizando la base de datos SQLite...')
+        actuales = pragmas_actuales(
+            connection, ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size')
+        )
+        self.stdout.write('  • ' + ', '.join(f'{k}={v}' for k, v in actuales.items()))
+
+        pasos = []
+        if options['analyze']:
+            pasos.append(('ANALYZE', 'ANALYZE'))
+        pasos.append(('PRAGMA optimize', 'PRAGMA optimize'))
+        if options['vacuum']:
+            pasos.append(('VACUUM', 'VACUUM'))
+        if str(actuales['journal_mode']).lower() == 'wal':
+            pasos.append(('checkpoint WAL', 'PRAGMA wal_checkpoint(TRUNCATE)'))
+
+        with connection.cursor() as cursor:
+            for nombre, sentencia in pasos:
+                inicio = time.perf_counter()
+                cursor.execute(sentencia)
+                self.stdout.write(f'  • {nombre}: {(time.perf_counter() - inicio) * 1000:.0f} ms')
+
+        self.stdout.write(self.style.SUCCESS('🎉 Base de datos optimizada'))
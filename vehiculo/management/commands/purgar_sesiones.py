@@ -0,0 +1,55 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        'Elimina las sesiones vencidas por lotes pequeños, sin bloquear la base '
+        'de datos con un único DELETE como clearsessions'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Sesiones borradas por transacción (default: 500)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.0,
+            help='Segundos de pausa entre lotes para dejar pasar escrituras',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo contar las sesiones vencidas',
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        expired = Session.objects.filter(expire_date__lt=now)
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'📊 {expired.count()} sesiones vencidas'))
+            return
+
+        self.stdout.write('🧹 Purgando sesiones vencidas...')
+        deleted = 0
+        while True:
+            keys = list(expired.values_list('session_key', flat=True)[:options['batch_size']])
+            if not keys:
+                break
+            # Borrar por clave primaria mantiene cada transacción corta
+            count, _ = Session.objects.filter(session_key__in=keys, expire_date__lt=now).delete()
+            deleted += count
+            if options['verbosity'] > 1:
+                self.stdout.write(f'  • {deleted} sesiones eliminadas')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'🎉 {deleted} sesiones vencidas eliminadas'))
@@ -0,0 +1,98 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from vehiculo import contadores
+from vehiculo.models import ContadorCatalogo, EstadisticaUsuario, Favorito, Vehiculo
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores desnormalizados y corrige las desviaciones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo reportar las desviaciones, sin corregirlas',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        self.stdout.write('🔢 Reconciliando contadores...')
+
+        corregidos = self.reconciliar_catalogo(dry_run)
+        corregidos += self.reconciliar_favoritos_vehiculos(dry_run)
+        corregidos += self.reconciliar_favoritos_usuarios(dry_run)
+
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(f'📊 {corregidos} contadores con desviación'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'🎉 {corregidos} contadores corregidos'))
+
+    def reconciliar_catalogo(self, dry_run):
+        with transaction.atomic():
+            # Primero el bloqueo y luego el conteo: un delta confirmado entre
+            # ambas lecturas quedaría pisado por un conteo viejo
+            actuales = dict(
+                ContadorCatalogo.objects.select_for_update().values_list('clave', 'valor')
+            )
+            reales = contadores.contar_desde_tabla()
+
+            desviados = {
+                clave: reales.get(clave, 0)
+                for clave in set(reales) | set(actuales)
+                if reales.get(clave, 0) != actuales.get(clave, 0)
+            }
+            for clave, valor in sorted(desviados.items()):
+                self.stdout.write(f'  • catálogo {clave}: {actuales.get(clave, 0)} → {valor}')
+
+            if desviados and not dry_run:
+                for clave, valor in desviados.items():
+                    ContadorCatalogo.objects.update_or_create(clave=clave, defaults={'valor': valor})
+                transaction.on_commit(contadores.invalidar)
+        return len(desviados)
+
+    def reconciliar_favoritos_vehiculos(self, dry_run):
+        desviados = list(
+            Vehiculo.objects.annotate(reales=Count('favoritos'))
+            .exclude(total_favoritos=F('reales'))
+            .values_list('pk', 'total_favoritos', 'reales')
+        )
+        for pk, actual, reales in desviados:
+            self.stdout.write(f'  • vehículo #{pk} favoritos: {actual} → {reales}')
+
+        if desviados and not dry_run:
+            # Recontar en el propio UPDATE para no pisar toggles ocurridos desde la lectura
+            reales = (Favorito.objects.filter(vehiculo=OuterRef('pk'))
+                      .values('vehiculo').annotate(n=Count('id')).values('n'))
+            Vehiculo.objects.filter(pk__in=[pk for pk, _, _ in desviados]).update(
+                total_favoritos=Coalesce(Subquery(reales), 0)
+            )
+        return len(desviados)
+
+    def reconciliar_favoritos_usuarios(self, dry_run):
+        with transaction.atomic():
+            # Como en el catálogo: bloquear antes de contar
+            actuales = dict(
+                EstadisticaUsuario.objects.select_for_update().values_list('usuario_id', 'total_favoritos')
+            )
+            reales = dict(
+                Favorito.objects.values('usuario').annotate(n=Count('id')).order_by()
+                .values_list('usuario', 'n')
+            )
+
+            desviados = {
+                usuario_id: reales.get(usuario_id, 0)
+                for usuario_id in set(reales) | set(actuales)
+                if reales.get(usuario_id, 0) != actuales.get(usuario_id, 0)
+            }
+            for usuario_id, valor in sorted(desviados.items()):
+                self.stdout.write(f'  • usuario #{usuario_id} favoritos: {actuales.get(usuario_id, 0)} → {valor}')
+
+            if desviados and not dry_run:
+                for usuario_id, valor in desviados.items():
+                    EstadisticaUsuario.objects.update_or_create(
+                        usuario_id=usuario_id, defaults={'total_favoritos': valor}
+                    )
+        return len(desviados)
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from vehiculo import estadisticas
+from vehiculo.models import EstadisticaMercado
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula las estadísticas de precios del mercado (percentiles por marca, modelo, año '
+        'y categoría) con NumPy. Sin opciones recorre todo el catálogo activo: programarlo fuera '
+        'de las horas pico. Con --desactualizadas lee solo los grupos que cambiaron'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--desactualizadas',
+            action='store_true',
+            help='Solo los grupos marcados por las señales (lectura por índice, apto para cada pocos minutos)',
+        )
+        parser.add_argument(
+            '--grupos-por-consulta',
+            type=int,
+            default=200,
+            help='Grupos leídos por consulta con --desactualizadas (default: 200)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Filas por lectura del cursor (default: 5000)',
+        )
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+
+        if options['desactualizadas']:
+            grupos = estadisticas.grupos_desactualizados()
+            if not grupos:
+                self.stdout.write(self.style.SUCCESS('✅ No hay grupos desactualizados'))
+                return
+            self.stdout.write(f'🔄 Recalculando {len(grupos)} grupos desactualizados...')
+            escritos = borrados = 0
+            paso = max(1, options['grupos_por_consulta'])
+            for desde in range(0, len(grupos), paso):
+                e, b = estadisticas.reconstruir(grupos[desde:desde + paso], chunk_size=options['chunk_size'])
+                escritos += e
+                borrados += b
+        else:
+            self.stdout.write('🔄 Reconstruyendo las estadísticas de todo el catálogo activo...')
+            escritos, borrados = estadisticas.reconstruir(chunk_size=options['chunk_size'])
+
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'🎉 {escritos} grupos calculados y {borrados} vacíos eliminados en {segundos:.2f} s'
+        ))
+        pendientes = EstadisticaMercado.objects.using(DEFAULT_DB_ALIAS).filter(desactualizada=True).count()
+        if pendientes:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️  {pendientes} grupos cambiaron durante el cálculo; quedan para la próxima pasada'
+            ))
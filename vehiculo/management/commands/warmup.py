@@ -0,0 +1,36 @@
+from functools import partial
+
+from django.core.management.base import BaseCommand
+
+from vehiculo import warmup
+
+
+class Command(BaseCommand):
+    help = 'Precompila plantillas, importa módulos pesados y ceba las cachés compartidas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sin-caches',
+            action='store_true',
+            help='No consultar la base de datos: solo módulos y plantillas',
+        )
+        parser.add_argument(
+            '--tarjetas',
+            type=int,
+            default=50,
+            help='Tarjetas de vehículos a renderizar en la caché de fragmentos (default: 50)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('🔥 Precalentando...')
+
+        pasos = list(warmup.PASOS_ARRANQUE)
+        if not options['sin_caches']:
+            pasos.append(('cachés', partial(warmup.cebar_caches, options['tarjetas'])))
+
+        total = 0
+        for nombre, segundos, detalle in warmup.ejecutar(pasos):
+            total += segundos
+            self.stdout.write(f'  • {nombre}: {detalle} ({segundos * 1000:.0f} ms)')
+
+        self.stdout.write(self.style.SUCCESS(f'🎉 Precalentamiento listo en {total * 1000:.0f} ms'))
@@ -0,0 +1,99 @@
+"""
+Middlewares de la app vehiculo.
+
+Todos admiten sync y async: un middleware solo sync obligaría a Django a
+ejecutar las vistas async de la cadena en un hilo bajo ASGI.
+"""
+import math
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import HttpResponse, JsonResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from .ratelimit import claves_request, config as config_ratelimit, limiter
+from .routers import config as config_replicas, iniciar_request, terminar_request
+
+
+class PrimariaStickyMiddleware:
+    """
+    Envía a la primaria las lecturas del catálogo de quien acaba de escribir.
+
+    Si el request escribe un modelo replicado, la respuesta lleva una cookie
+    de vida corta; mientras exista, los requests de ese navegador leen de la
+    primaria y nunca ven una réplica anterior a su propio cambio.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        cfg = config_replicas()
+        if not cfg['ALIASES']:
+            return self.get_response(request)
+
+        estado, token = iniciar_request(forzar_primaria=cfg['STICKY_COOKIE'] in request.COOKIES)
+        try:
+            response = self.get_response(request)
+        finally:
+            terminar_request(token)
+        return self.marcar_sticky(response, estado, cfg)
+
+    async def __acall__(self, request):
+        cfg = config_replicas()
+        if not cfg['ALIASES']:
+            return await self.get_response(request)
+
+        # sync_to_async copia el contexto, así que el ORM async ve el mismo estado
+        estado, token = iniciar_request(forzar_primaria=cfg['STICKY_COOKIE'] in request.COOKIES)
+        try:
+            response = await self.get_response(request)
+        finally:
+            terminar_request(token)
+        return self.marcar_sticky(response, estado, cfg)
+
+    def marcar_sticky(self, response, estado, cfg):
+        if estado.escribio:
+            response.set_cookie(
+                cfg['STICKY_COOKIE'], '1', max_age=cfg['STICKY_SECONDS'],
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+
+class RateLimitMiddleware(MiddlewareMixin):
+    """
+    Aplica ``VEHICULO_RATELIMIT['RULES']`` según el nombre de la URL
+    resuelta y corta con 429 + ``Retry-After`` antes de ejecutar la vista.
+    Debe ir después de AuthenticationMiddleware para conocer al usuario.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not config_ratelimit()['ENABLED'] or request.resolver_match is None:
+            return None
+        regla = limiter.regla(request.resolver_match.view_name)
+        if regla is None or not regla.aplica(request.method):
+            return None
+
+        for clave in claves_request(regla, request):
+            espera = limiter.consumir(regla, clave)
+            if espera:
+                return self.respuesta_429(request, math.ceil(espera))
+        return None
+
+    def respuesta_429(self, request, retry_after):
+        mensaje = 'Demasiadas solicitudes. Intenta de nuevo en unos segundos.'
+        if 'text/html' in request.headers.get('Accept', ''):
+            response = HttpResponse(mensaje, status=429, content_type='text/plain; charset=utf-8')
+        else:
+            response = JsonResponse(
+                {'success': False, 'error': mensaje, 'retry_after': retry_after}, status=429
+            )
+        response['Retry-After'] = str(retry_after)
+        return response
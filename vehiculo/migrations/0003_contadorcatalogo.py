@@ -0,0 +1,48 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:28
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def inicializar_contadores(apps, schema_editor):
+    Vehiculo = apps.get_model('vehiculo', 'Vehiculo')
+    ContadorCatalogo = apps.get_model('vehiculo', 'ContadorCatalogo')
+    db_alias = schema_editor.connection.alias
+
+    valores = Counter()
+    filas = (Vehiculo.objects.using(db_alias)
+             .values('activo', 'categoria').annotate(n=Count('id')).order_by())
+    for fila in filas:
+        valores['total'] += fila['n']
+        valores[f"activo:{int(fila['activo'])}"] += fila['n']
+        if fila['activo']:
+            valores[f"categoria:{fila['categoria']}"] += fila['n']
+
+    ContadorCatalogo.objects.using(db_alias).bulk_create(
+        [ContadorCatalogo(clave=clave, valor=valor) for clave, valor in valores.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehiculo', '0002_favorito'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=50, unique=True)),
+                ('valor', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Contador del catálogo',
+                'verbose_name_plural': 'Contadores del catálogo',
+            },
+        ),
+        migrations.RunPython(inicializar_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def inicializar_contadores_favoritos(apps, schema_editor):
+    Vehiculo = apps.get_model('vehiculo', 'Vehiculo')
+    Favorito = apps.get_model('vehiculo', 'Favorito')
+    EstadisticaUsuario = apps.get_model('vehiculo', 'EstadisticaUsuario')
+    db_alias = schema_editor.connection.alias
+
+    por_vehiculo = (Favorito.objects.using(db_alias)
+                    .filter(vehiculo=OuterRef('pk'))
+                    .values('vehiculo').annotate(n=Count('id')).values('n'))
+    Vehiculo.objects.using(db_alias).update(total_favoritos=Coalesce(Subquery(por_vehiculo), 0))
+
+    filas = (Favorito.objects.using(db_alias)
+             .values('usuario').annotate(n=Count('id')).order_by())
+    EstadisticaUsuario.objects.using(db_alias).bulk_create(
+        [EstadisticaUsuario(usuario_id=fila['usuario'], total_favoritos=fila['n']) for fila in filas]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehiculo', '0003_contadorcatalogo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehiculo',
+            name='total_favoritos',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='EstadisticaUsuario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_favoritos', models.IntegerField(default=0)),
+                ('usuario', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='estadisticas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Estadística de usuario',
+                'verbose_name_plural': 'Estadísticas de usuarios',
+            },
+        ),
+        migrations.RunPython(inicializar_contadores_favoritos, migrations.RunPython.noop),
+    ]
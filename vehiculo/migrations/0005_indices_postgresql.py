@@ -0,0 +1,45 @@
+from django.db import migrations
+
+# Índices exclusivos de PostgreSQL. En SQLite la migración no hace nada.
+#
+# - BRIN sobre fecha_creacion: índice de pocas páginas para filtros por
+#   rango de fecha. No sirve al ORDER BY ... LIMIT de los listados; 0009 lo
+#   reemplaza por un btree.
+# - Trigramas sobre modelo: Django traduce icontains a
+#   UPPER("modelo"::text) LIKE UPPER(%s), por eso el índice es de expresión.
+INDICES = (
+    'CREATE INDEX IF NOT EXISTS vehiculo_fecha_creacion_brin '
+    'ON vehiculo_vehiculo USING brin (fecha_creacion)',
+    'CREATE INDEX IF NOT EXISTS vehiculo_modelo_trgm '
+    'ON vehiculo_vehiculo USING gin (UPPER("modelo"::text) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS vehiculo_marca_trgm '
+    'ON vehiculo_vehiculo USING gin (UPPER("marca"::text) gin_trgm_ops)',
+)
+
+NOMBRES = ('vehiculo_fecha_creacion_brin', 'vehiculo_modelo_trgm', 'vehiculo_marca_trgm')
+
+
+def crear_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for sentencia in INDICES:
+        schema_editor.execute(sentencia)
+
+
+def eliminar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for nombre in NOMBRES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {nombre}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehiculo', '0004_contadores_favoritos'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, eliminar_indices),
+    ]
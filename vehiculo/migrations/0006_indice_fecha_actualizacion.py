@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehiculo', '0005_indices_postgresql'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vehiculo',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
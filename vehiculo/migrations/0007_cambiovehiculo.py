@@ -0,0 +1,32 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehiculo', '0006_indice_fecha_actualizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CambioVehiculo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vehiculo_id', models.BigIntegerField(db_index=True)),
+                ('tipo', models.CharField(choices=[('creado', 'Creado'), ('actualizado', 'Actualizado'), ('eliminado', 'Eliminado')], max_length=12)),
+                ('marca', models.CharField(max_length=50)),
+                ('modelo', models.CharField(max_length=100)),
+                ('año', models.IntegerField()),
+                ('precio', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('categoria', models.CharField(max_length=20)),
+                ('activo', models.BooleanField()),
+                ('fecha', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Cambio de vehículo',
+                'verbose_name_plural': 'Cambios de vehículos',
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehiculo', '0007_cambiovehiculo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaMercado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('marca', models.CharField(max_length=50)),
+                ('modelo', models.CharField(max_length=100)),
+                ('año', models.IntegerField()),
+                ('categoria', models.CharField(max_length=20)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('suma_precios', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('precio_min', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('p10', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('p25', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('mediana', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('p75', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('p90', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('precio_max', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('desactualizada', models.BooleanField(db_index=True, default=False)),
+                ('fecha_calculo', models.DateTimeField()),
+                ('modificada', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Estadística de mercado',
+                'verbose_name_plural': 'Estadísticas de mercado',
+                'ordering': ['marca', 'modelo', '-año', 'categoria'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='vehiculo',
+            index=models.Index(fields=['marca', 'modelo', 'año', 'categoria'], name='vehiculo_grupo_mercado_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='estadisticamercado',
+            constraint=models.UniqueConstraint(fields=('marca', 'modelo', 'año', 'categoria'), name='estadistica_mercado_grupo_unico'),
+        ),
+    ]
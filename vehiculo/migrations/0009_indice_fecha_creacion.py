@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-19 16:12
+
+from django.db import migrations, models
+
+# El BRIN de 0005 solo acelera filtros por rango de fecha, no el
+# ORDER BY fecha_creacion DESC LIMIT de los listados: lo reemplaza un btree.
+BRIN = (
+    'CREATE INDEX IF NOT EXISTS vehiculo_fecha_creacion_brin '
+    'ON vehiculo_vehiculo USING brin (fecha_creacion)'
+)
+
+
+def eliminar_brin(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS vehiculo_fecha_creacion_brin')
+
+
+def crear_brin(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(BRIN)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vehiculo', '0008_estadisticamercado'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='vehiculo',
+            name='fecha_creacion',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.RunPython(eliminar_brin, crear_brin),
+    ]
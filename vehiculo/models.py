@@ -1,9 +1,31 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.contrib.auth.models import User
 import os
+import re
+import uuid
+from decimal import Decimal
+
+# vehiculos/ab/cd/<32 hex>.<ext>
+RUTA_FRAGMENTADA_RE = re.compile(r'^vehiculos/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{32}\.\w+$')
+
 
 def vehiculo_image_path(instance, filename):
-    return f'vehiculos/{instance.marca}_{instance.modelo}/{filename}'
+    """
+    Ruta de subida repartida por hash: ``vehiculos/ab/cd/<uuid>.<ext>``.
+
+    El nombre es un UUID aleatorio, así que no colisiona aunque los
+    importadores suban siempre ``{marca}_{modelo}_{año}.jpg``; los dos
+    primeros bytes reparten los archivos en 65536 directorios en lugar de
+    uno por modelo.
+    """
+    extension = os.path.splitext(filename)[1].lower() or '.jpg'
+    digest = uuid.uuid4().hex
+    return f'vehiculos/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def es_ruta_fragmentada(name):
+    """Indica si una ruta de imagen ya usa el esquema repartido por hash."""
+    return bool(name) and bool(RUTA_FRAGMENTADA_RE.match(name))
 
 class Vehiculo(models.Model):
     MARCAS = [
@@ -78,6 +100,9 @@ class Vehiculo(models.Model):
         ('Otro', 'Otro'),
     ]
 
+    # Campos de imagen, en orden (el primero es la imagen principal)
+    CAMPOS_IMAGEN = ('imagen_principal', 'imagen_2', 'imagen_3', 'imagen_4', 'imagen_5')
+
     # Información básica
     marca = models.CharField(max_length=50, choices=MARCAS)
     modelo = models.CharField(max_length=100)
@@ -120,19 +145,39 @@ class Vehiculo(models.Model):
     email_contacto = models.EmailField(blank=True, null=True)
     
     # Metadatos
-    fecha_creacion = models.DateTimeField(auto_now_add=True)
-    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    # Índice btree: los listados ordenan por -fecha_creacion con LIMIT
+    fecha_creacion = models.DateTimeField(auto_now_add=True, db_index=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True, db_index=True)
     activo = models.BooleanField(default=True)
     destacado = models.BooleanField(default=False)
 
+    # Contador desnormalizado, mantenido por vehiculo/services/favorite_service.py
+    total_favoritos = models.IntegerField(default=0, editable=False)
+
     class Meta:
         ordering = ['-fecha_creacion']
         verbose_name = 'Vehículo'
         verbose_name_plural = 'Vehículos'
+        indexes = [
+            # Recalcular un grupo de EstadisticaMercado lee solo sus filas
+            models.Index(fields=['marca', 'modelo', 'año', 'categoria'], name='vehiculo_grupo_mercado_idx'),
+        ]
 
     def __str__(self):
         return f"{self.marca} {self.modelo} {self.año}"
 
+    def save(self, *args, **kwargs):
+        # Las señales post_save (contadores del catálogo) se ejecutan dentro
+        # de la misma transacción que el INSERT/UPDATE
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            return super().delete(*args, **kwargs)
+
     @property
     def precio_formateado(self):
         return f"${self.precio:,.2f}"
@@ -144,20 +189,20 @@ class Vehiculo(models.Model):
     def get_imagenes(self):
         """Devuelve una lista de todas las imágenes del vehículo"""
         imagenes = []
-        for i in range(1, 6):
-            imagen = getattr(self, f'imagen_{i}' if i > 1 else 'imagen_principal')
+        for campo in self.CAMPOS_IMAGEN:
+            imagen = getattr(self, campo)
             if imagen:
                 imagenes.append(imagen)
         return imagenes
 
-    def get_imagen_principal_url(self):
+    def get_imagen_principal_url(self, rendition='full'):
         """Devuelve la URL de la imagen principal o una por defecto"""
         if self.imagen_principal:
             return self.imagen_principal.url
         # Si no hay imagen, usar URL de CDN con foto real del vehículo
-        return self.get_cdn_image_url()
+        return self.get_cdn_image_url(rendition)
     
-    def get_cdn_image_url(self):
+    def get_cdn_image_url(self, rendition='full'):
         """
         Genera URL de imagen desde CDN usando el helper de imágenes.
         Soporta Unsplash (para demos) e Imagin.studio (para producción).
@@ -169,16 +214,19 @@ class Vehiculo(models.Model):
             marca=self.marca,
             modelo=self.modelo,
             categoria=self.categoria,
-            año=self.año
+            año=self.año,
+            rendition=rendition,
         )
     
     def get_placeholder_image_url(self, seed=None):
         """Genera URL de imagen placeholder específica para el vehículo"""
+        from .image_providers import registry
+
         if seed is None:
-            # Usar combinación de marca y modelo como seed para consistencia
-            seed = f"{self.marca}{self.modelo}".replace(" ", "")
-        # Picsum con seed para obtener siempre la misma imagen para el mismo vehículo
-        return f"https://picsum.photos/seed/{seed}/800/600"
+            # Picsum usa marca y modelo como seed: siempre la misma imagen
+            # para el mismo vehículo
+            return registry.image_url(self.marca, self.modelo, provider='picsum')
+        return registry.image_url(seed, '', provider='picsum')
 
 
 class Favorito(models.Model):
@@ -195,3 +243,133 @@ class Favorito(models.Model):
     
     def __str__(self):
         return f"{self.usuario.username} - {self.vehiculo}"
+
+
+class EstadisticaUsuario(models.Model):
+    """
+    Estadísticas desnormalizadas por usuario (una fila por usuario, creada
+    al primer favorito). Se mantienen con incrementos F() en la misma
+    transacción que el cambio de favoritos.
+    """
+    usuario = models.OneToOneField(User, on_delete=models.CASCADE, related_name='estadisticas')
+    total_favoritos = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Estadística de usuario'
+        verbose_name_plural = 'Estadísticas de usuarios'
+
+    def __str__(self):
+        return f"{self.usuario.username}: {self.total_favoritos} favoritos"
+
+
+class ContadorCatalogo(models.Model):
+    """
+    Contadores del catálogo mantenidos por las señales de Vehiculo.
+    Claves: 'total', 'activo:1', 'activo:0' y 'categoria:<categoría>'
+    (vehículos activos por categoría). Ver vehiculo/contadores.py.
+    """
+    clave = models.CharField(max_length=50, unique=True)
+    valor = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Contador del catálogo'
+        verbose_name_plural = 'Contadores del catálogo'
+
+    def __str__(self):
+        return f"{self.clave}: {self.valor}"
+
+
+class CambioVehiculo(models.Model):
+    """
+    Registro de altas, cambios y bajas del catálogo, escrito por las señales
+    de Vehiculo en la misma transacción que el cambio. El id es el
+    identificador de evento del feed SSE (Last-Event-ID). Guarda una copia
+    de los campos filtrables para filtrar sin unir con Vehiculo, que puede
+    ya no existir.
+    """
+    CREADO = 'creado'
+    ACTUALIZADO = 'actualizado'
+    ELIMINADO = 'eliminado'
+    TIPOS = [
+        (CREADO, 'Creado'),
+        (ACTUALIZADO, 'Actualizado'),
+        (ELIMINADO, 'Eliminado'),
+    ]
+
+    vehiculo_id = models.BigIntegerField(db_index=True)
+    tipo = models.CharField(max_length=12, choices=TIPOS)
+    marca = models.CharField(max_length=50)
+    modelo = models.CharField(max_length=100)
+    año = models.IntegerField()
+    precio = models.DecimalField(max_digits=12, decimal_places=2)
+    categoria = models.CharField(max_length=20)
+    activo = models.BooleanField()
+    fecha = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Cambio de vehículo'
+        verbose_name_plural = 'Cambios de vehículos'
+
+    def __str__(self):
+        return f"#{self.pk} {self.tipo} vehículo {self.vehiculo_id}"
+
+    @classmethod
+    def registrar(cls, vehiculo, tipo, using=None):
+        return cls.objects.using(using).create(
+            vehiculo_id=vehiculo.pk,
+            tipo=tipo,
+            marca=vehiculo.marca,
+            modelo=vehiculo.modelo,
+            año=vehiculo.año,
+            precio=vehiculo.precio,
+            categoria=vehiculo.categoria,
+            activo=vehiculo.activo,
+        )
+
+
+class EstadisticaMercado(models.Model):
+    """
+    Precios de los vehículos activos por marca, modelo, año y categoría,
+    materializados para no agrupar Vehiculo en cada consulta. Las señales
+    ajustan cantidad, suma, mínimo y máximo en la misma transacción que el
+    cambio y marcan el grupo como desactualizado; los percentiles los
+    recalcula ``manage.py reconstruir_estadisticas``. Ver
+    vehiculo/estadisticas.py.
+    """
+    marca = models.CharField(max_length=50)
+    modelo = models.CharField(max_length=100)
+    año = models.IntegerField()
+    categoria = models.CharField(max_length=20)
+    cantidad = models.IntegerField(default=0)
+    suma_precios = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    precio_min = models.DecimalField(max_digits=12, decimal_places=2)
+    p10 = models.DecimalField(max_digits=12, decimal_places=2)
+    p25 = models.DecimalField(max_digits=12, decimal_places=2)
+    mediana = models.DecimalField(max_digits=12, decimal_places=2)
+    p75 = models.DecimalField(max_digits=12, decimal_places=2)
+    p90 = models.DecimalField(max_digits=12, decimal_places=2)
+    precio_max = models.DecimalField(max_digits=12, decimal_places=2)
+    # Un cambio posterior al cálculo: percentiles (y mínimo/máximo tras una baja) aproximados
+    desactualizada = models.BooleanField(default=False, db_index=True)
+    fecha_calculo = models.DateTimeField()
+    # Último ajuste de las señales; una reconstrucción en curso no lo sobrescribe
+    modificada = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['marca', 'modelo', '-año', 'categoria']
+        verbose_name = 'Estadística de mercado'
+        verbose_name_plural = 'Estadísticas de mercado'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['marca', 'modelo', 'año', 'categoria'], name='estadistica_mercado_grupo_unico',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.marca} {self.modelo} {self.año} ({self.categoria}): {self.cantidad}"
+
+    @property
+    def precio_promedio(self):
+        if not self.cantidad:
+            return None
+        return (self.suma_precios / self.cantidad).quantize(Decimal('0.01'))
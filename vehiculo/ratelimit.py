@@ -0,0 +1,193 @@
+"""
+Límite de peticiones por token bucket para la API y la autenticación.
+
+Las reglas se declaran por nombre de URL en ``VEHICULO_RATELIMIT['RULES']``
+con una tasa ``'120/m'`` (capacidad de ráfaga 120, recarga de 120 por
+minuto) o un diccionario ``{'tasa': '10/m', 'metodos': ['POST'], 'bucket':
+'auth'}``. Cada regla tiene un bucket por IP y, si el usuario está
+autenticado, otro por usuario; el request pasa solo si ambos tienen fichas.
+Las reglas con el mismo ``bucket`` comparten fichas: varias URLs que hacen
+lo mismo (los tres formularios de login) no multiplican el límite.
+
+Los buckets viven en su propia caché (``CACHE_ALIAS``, por defecto
+``'ratelimit'``), nunca en la del catálogo: las claves por IP son
+ilimitadas y, en una caché acotada, desalojarían las versiones de
+namespace. Con LocMem el límite es por proceso (N workers admiten N veces
+la tasa), así que ``check --deploy`` lo rechaza (``vehiculo.E001``); con
+Redis o memcached vale para todos. La caché no ofrece una
+operación atómica de lectura y escritura: dos procesos pueden gastar la
+misma ficha, y el límite es aproximado por arriba. Cuando un bucket se
+vacía, el proceso recuerda hasta cuándo está bloqueado y rechaza los
+siguientes requests sin tocar la caché ni la base de datos.
+"""
+import math
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULTS = {
+    'ENABLED': True,
+    'CACHE_ALIAS': 'ratelimit',
+    'RULES': {},
+    # Cabecera con la IP del cliente si hay un proxy de confianza delante,
+    # p. ej. 'HTTP_X_FORWARDED_FOR'; sin valor se usa REMOTE_ADDR
+    'IP_HEADER': None,
+    # Proxies propios que añaden una entrada a la cabecera: la IP del
+    # cliente es la entrada TRUSTED_PROXIES contando desde la derecha
+    'TRUSTED_PROXIES': 1,
+    'LOCAL_MAX_ENTRIES': 10000,
+}
+
+PERIODOS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'VEHICULO_RATELIMIT', {})}
+
+
+def parse_tasa(tasa):
+    """``'120/m'`` -> ``(capacidad, fichas por segundo)``."""
+    try:
+        cantidad, periodo = tasa.split('/')
+        capacidad = int(cantidad)
+        segundos = PERIODOS[periodo.strip().lower()[0]]
+    except (AttributeError, ValueError, KeyError, IndexError):
+        raise ValueError(f'Tasa no válida: {tasa!r}; usa el formato "120/m"')
+    if capacidad < 1:
+        raise ValueError(f'Tasa no válida: {tasa!r}; la cantidad debe ser mayor que 0')
+    return capacidad, capacidad / segundos
+
+
+class Regla:
+    __slots__ = ('nombre', 'bucket', 'capacidad', 'recarga', 'metodos')
+
+    def __init__(self, nombre, definicion):
+        if isinstance(definicion, str):
+            definicion = {'tasa': definicion}
+        self.nombre = nombre
+        self.bucket = definicion.get('bucket') or nombre
+        self.capacidad, self.recarga = parse_tasa(definicion['tasa'])
+        metodos = definicion.get('metodos')
+        self.metodos = frozenset(m.upper() for m in metodos) if metodos else None
+
+    def aplica(self, metodo):
+        return self.metodos is None or metodo in self.metodos
+
+    @property
+    def ttl(self):
+        """Segundos hasta que un bucket vacío vuelve a estar lleno."""
+        return math.ceil(self.capacidad / self.recarga) + 1
+
+
+class TokenBucketLimiter:
+    """Buckets en la caché compartida, bloqueos y contadores por proceso."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloqueados = {}  # clave -> instante (time.time) en que vuelve a haber ficha
+        self._stats = defaultdict(lambda: defaultdict(int))
+        self._reglas = {}
+        self._reglas_origen = None
+
+    def regla(self, nombre_url):
+        reglas = config()['RULES']
+        if reglas is not self._reglas_origen:
+            self._reglas = {nombre: Regla(nombre, definicion) for nombre, definicion in reglas.items()}
+            self._reglas_origen = reglas
+        return self._reglas.get(nombre_url)
+
+    def _count(self, regla, contador):
+        with self._lock:
+            self._stats[regla][contador] += 1
+
+    def bloqueado_hasta(self, clave, ahora):
+        with self._lock:
+            hasta = self._bloqueados.get(clave)
+            if hasta is not None and hasta <= ahora:
+                del self._bloqueados[clave]
+                hasta = None
+        return hasta
+
+    def _bloquear(self, clave, hasta, ahora):
+        with self._lock:
+            if len(self._bloqueados) >= config()['LOCAL_MAX_ENTRIES']:
+                for vencida in [k for k, v in self._bloqueados.items() if v <= ahora]:
+                    del self._bloqueados[vencida]
+                if len(self._bloqueados) >= config()['LOCAL_MAX_ENTRIES']:
+                    self._bloqueados.clear()
+            self._bloqueados[clave] = hasta
+
+    def consumir(self, regla, clave, ahora=None):
+        """
+        Gasta una ficha del bucket ``clave``. Devuelve 0 si se permitió o los
+        segundos a esperar si no.
+        """
+        ahora = time.time() if ahora is None else ahora
+        hasta = self.bloqueado_hasta(clave, ahora)
+        if hasta is not None:
+            self._count(regla.nombre, 'rechazados_locales')
+            return hasta - ahora
+
+        cache = caches[config()['CACHE_ALIAS']]
+        fichas, instante = cache.get(clave) or (regla.capacidad, ahora)
+        fichas = min(regla.capacidad, fichas + (ahora - instante) * regla.recarga)
+
+        if fichas < 1:
+            espera = (1 - fichas) / regla.recarga
+            self._bloquear(clave, ahora + espera, ahora)
+            self._count(regla.nombre, 'rechazados')
+            return espera
+
+        cache.set(clave, (fichas - 1, ahora), regla.ttl)
+        self._count(regla.nombre, 'permitidos')
+        return 0
+
+    def reset(self):
+        with self._lock:
+            self._bloqueados.clear()
+            self._stats.clear()
+
+    def stats(self):
+        with self._lock:
+            reglas = {nombre: dict(contadores) for nombre, contadores in self._stats.items()}
+            bloqueos = len(self._bloqueados)
+        for contadores in reglas.values():
+            total = sum(contadores.values())
+            rechazados = contadores.get('rechazados', 0) + contadores.get('rechazados_locales', 0)
+            contadores['tasa_rechazo'] = round(rechazados / total, 3) if total else None
+        return {'bloqueos_locales': bloqueos, 'reglas': reglas}
+
+
+limiter = TokenBucketLimiter()
+
+
+def ip_cliente(request):
+    """
+    IP del cliente. Con ``IP_HEADER`` se lee la entrada que escribió el
+    último proxy propio: lo que está a su izquierda lo manda el cliente y
+    podría cambiarlo en cada request para estrenar bucket.
+    """
+    cfg = config()
+    cabecera = cfg['IP_HEADER']
+    if cabecera and request.META.get(cabecera):
+        # X-Forwarded-For: "<lo que mande el cliente>, cliente, proxy1"
+        entradas = [entrada.strip() for entrada in request.META[cabecera].split(',')]
+        confiables = max(1, cfg['TRUSTED_PROXIES'])
+        if len(entradas) >= confiables and entradas[-confiables]:
+            return entradas[-confiables]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def claves_request(regla, request):
+    """
+    Buckets que debe pasar el request: siempre su IP y, si hay sesión, su
+    usuario. Es un generador: si la IP ya está bloqueada, el usuario (y su
+    consulta a la sesión) no llega a cargarse.
+    """
+    yield f'vehiculo:rl:{regla.bucket}:ip:{ip_cliente(request)}'
+    usuario = getattr(request, 'user', None)
+    if usuario is not None and usuario.is_authenticated:
+        yield f'vehiculo:rl:{regla.bucket}:usuario:{usuario.pk}'
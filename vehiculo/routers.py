@@ -0,0 +1,158 @@
+"""
+Router de réplicas de lectura para el catálogo.
+
+Las lecturas de los modelos en ``VEHICULO_REPLICAS['MODELS']`` se reparten
+entre las réplicas configuradas; todo lo demás (y toda escritura) va a la
+primaria. Las lecturas vuelven a la primaria cuando:
+
+- hay una transacción abierta en la primaria (``atomic``);
+- el mismo request ya escribió un modelo del catálogo, o el navegador trae
+  la cookie que ``PrimariaStickyMiddleware`` fija tras una escritura, de
+  modo que el usuario siempre ve su propio cambio;
+- la réplica está atrasada más de ``MAX_LAG`` segundos o no responde.
+
+El retraso se mide como mucho cada ``LAG_CHECK_INTERVAL`` segundos por
+proceso: en PostgreSQL con las funciones de replicación y en el resto
+comparando ``MAX(fecha_actualizacion)`` de los vehículos.
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ALIASES': [],
+    'MODELS': ['vehiculo.vehiculo'],
+    'STICKY_SECONDS': 5,  # Segundos de lecturas en la primaria tras escribir
+    'STICKY_COOKIE': 'db_primaria',
+    'MAX_LAG': 2.0,
+    'LAG_CHECK_INTERVAL': 5.0,
+}
+
+# Estado del request actual: si debe leer de la primaria y si escribió
+_estado = contextvars.ContextVar('vehiculo_replicas', default=None)
+
+
+def config():
+    return {**DEFAULTS, **getattr(settings, 'VEHICULO_REPLICAS', {})}
+
+
+class EstadoRequest:
+    __slots__ = ('forzar_primaria', 'escribio')
+
+    def __init__(self, forzar_primaria=False):
+        self.forzar_primaria = forzar_primaria
+        self.escribio = False
+
+
+def iniciar_request(forzar_primaria=False):
+    """Abre el estado de un request; devuelve ``(estado, token)`` para ``terminar_request``."""
+    estado = EstadoRequest(forzar_primaria)
+    return estado, _estado.set(estado)
+
+
+def terminar_request(token):
+    _estado.reset(token)
+
+
+class ReplicaLagGuard:
+    """Mide y cachea por proceso el retraso de cada réplica."""
+
+    SQL_POSTGRESQL = (
+        'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+        'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._mediciones = {}  # alias -> (instante, retraso o None si falló)
+
+    def reset(self):
+        with self._lock:
+            self._mediciones.clear()
+
+    def disponible(self, alias):
+        cfg = config()
+        ahora = time.monotonic()
+        with self._lock:
+            medicion = self._mediciones.get(alias)
+        if medicion is None or ahora - medicion[0] >= cfg['LAG_CHECK_INTERVAL']:
+            retraso = self.medir(alias)
+            with self._lock:
+                self._mediciones[alias] = (ahora, retraso)
+        else:
+            retraso = medicion[1]
+        return retraso is not None and retraso <= cfg['MAX_LAG']
+
+    def medir(self, alias):
+        """Segundos de retraso de la réplica, o None si no se pudo medir."""
+        try:
+            connection = connections[alias]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(self.SQL_POSTGRESQL)
+                    return float(cursor.fetchone()[0] or 0)
+            return self.retraso_por_datos(alias)
+        except Exception:
+            logger.warning('No se pudo medir el retraso de la réplica %s', alias, exc_info=True)
+            return None
+
+    def retraso_por_datos(self, alias):
+        from django.db.models import Max
+        from .models import Vehiculo
+
+        def ultima(db):
+            return Vehiculo.objects.using(db).aggregate(m=Max('fecha_actualizacion'))['m']
+
+        primaria, replica = ultima(DEFAULT_DB_ALIAS), ultima(alias)
+        if primaria is None or (replica is not None and replica >= primaria):
+            return 0.0
+        if replica is None:
+            return float('inf')
+        return (primaria - replica).total_seconds()
+
+
+lag_guard = ReplicaLagGuard()
+
+
+class ReplicaRouter:
+    """Lecturas del catálogo a las réplicas sanas; escrituras a la primaria."""
+
+    def _es_catalogo(self, model):
+        return model._meta.label_lower in config()['MODELS']
+
+    def db_for_read(self, model, **hints):
+        if not self._es_catalogo(model):
+            return None
+        estado = _estado.get()
+        if estado is not None and (estado.forzar_primaria or estado.escribio):
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+
+        replicas = [alias for alias in config()['ALIASES'] if lag_guard.disponible(alias)]
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if self._es_catalogo(model):
+            estado = _estado.get()
+            if estado is not None:
+                estado.escribio = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplicas y primaria contienen los mismos datos
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in config()['ALIASES']:
+            return False
+        return None
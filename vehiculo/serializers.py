@@ -0,0 +1,321 @@
+"""
+Serialización de vehículos para la API sin instanciar modelos.
+
+``?fields=`` elige columnas de una lista permitida y ``?expand=`` agrega
+datos relacionados. Todo se resuelve con un único ``values_list()``: el
+vendedor con un LEFT JOIN y las imágenes desde las columnas de la propia
+fila, así una respuesta grande no construye ningún ``Vehiculo``.
+
+``aserialize`` es la variante para vistas async: lee con ``aiterator()`` y
+resuelve las imágenes de catálogo en un lote, una vez por combinación.
+
+``serialize_json``/``aserialize_json`` devuelven directamente el JSON del
+listado: cada campo tiene su codificador y cada fila se arma con una
+plantilla precalculada de claves, sin pasar por ``DjangoJSONEncoder``.
+"""
+from itertools import islice
+from json.encoder import encode_basestring_ascii as _cadena_json
+from operator import itemgetter
+
+from django.core.files.storage import default_storage
+
+from .car_images import aget_car_images, get_car_image
+from .models import Vehiculo
+
+
+def _texto(valor):
+    return str(valor) if valor is not None else None
+
+
+def _fecha(valor):
+    return valor.isoformat() if valor is not None else None
+
+
+# Codificadores JSON por tipo de columna; la salida es la misma que la de
+# JsonResponse (ensure_ascii) pero sin separadores con espacios
+def _json_cadena(valor):
+    return 'null' if valor is None else _cadena_json(valor)
+
+
+def _json_texto(valor):
+    # Decimal como cadena, igual que _texto: '15000.00' y no 15000.0
+    return 'null' if valor is None else _cadena_json(str(valor))
+
+
+def _json_entero(valor):
+    return 'null' if valor is None else str(int(valor))
+
+
+def _json_bool(valor):
+    return 'null' if valor is None else ('true' if valor else 'false')
+
+
+def _json_fecha(valor):
+    return 'null' if valor is None else f'"{valor.isoformat()}"'
+
+
+# Para columnas NOT NULL los tipos simples se codifican con funciones en C
+_CODIFICADORES_SIN_NULL = {
+    _json_cadena: _cadena_json,
+    _json_entero: int.__str__,
+    _json_bool: {True: 'true', False: 'false'}.__getitem__,
+}
+
+
+def _codificador(columna, codificar):
+    if Vehiculo._meta.get_field(columna).null:
+        return codificar
+    return _CODIFICADORES_SIN_NULL.get(codificar, codificar)
+
+
+# Campo público -> (columna, conversión o None, codificador JSON)
+CAMPOS = {
+    'id': ('id', None, _json_entero),
+    'marca': ('marca', None, _json_cadena),
+    'modelo': ('modelo', None, _json_cadena),
+    'año': ('año', None, _json_entero),
+    'precio': ('precio', _texto, _json_texto),
+    'condicion': ('condicion', None, _json_cadena),
+    'kilometraje': ('kilometraje', None, _json_entero),
+    'transmision': ('transmision', None, _json_cadena),
+    'combustible': ('combustible', None, _json_cadena),
+    'categoria': ('categoria', None, _json_cadena),
+    'color': ('color', None, _json_cadena),
+    'puertas': ('puertas', None, _json_entero),
+    'destacado': ('destacado', None, _json_bool),
+    'total_favoritos': ('total_favoritos', None, _json_entero),
+    'fecha_creacion': ('fecha_creacion', _fecha, _json_fecha),
+    'fecha_actualizacion': ('fecha_actualizacion', _fecha, _json_fecha),
+}
+
+# La respuesta histórica de vehiculos_api
+CAMPOS_POR_DEFECTO = ('id', 'marca', 'modelo', 'año', 'precio', 'categoria')
+
+# Máximo de ids aceptados por vehiculos_batch_api
+MAX_IDS_LOTE = 100
+MAX_PK = 2 ** 63 - 1  # BigAutoField; un id mayor desborda el INTEGER de la base
+
+# Expansión -> columnas que necesita
+EXPANSIONES = {
+    'vendedor': ('vendedor_id', 'vendedor__username'),
+    'imagenes': Vehiculo.CAMPOS_IMAGEN + ('marca', 'modelo', 'categoria', 'año'),
+}
+
+
+def parse_lista(valor, permitidos, por_defecto, nombre):
+    """
+    ``'a,b'`` -> ``('a', 'b')`` validando contra ``permitidos``.
+    Lanza ValueError con los nombres no válidos o si el valor no nombra
+    ninguno (``?fields=,``): una lista vacía no es la de por defecto.
+    """
+    if not valor:
+        return tuple(por_defecto)
+    elegidos = []
+    for item in valor.split(','):
+        item = item.strip()
+        if item and item not in elegidos:
+            elegidos.append(item)
+    if not elegidos:
+        raise ValueError(f"{nombre}: indica al menos uno. Permitidos: {', '.join(permitidos)}")
+    invalidos = [item for item in elegidos if item not in permitidos]
+    if invalidos:
+        raise ValueError(
+            f"{nombre} no válidos: {', '.join(invalidos)}. "
+            f"Permitidos: {', '.join(permitidos)}"
+        )
+    return tuple(elegidos)
+
+
+def parse_ids(valor, maximo=MAX_IDS_LOTE):
+    """``'3,1,3'`` -> ``[3, 1]``: enteros únicos en el orden pedido, dentro del rango de la clave."""
+    ids = []
+    for item in (valor or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        # isdigit() acepta dígitos Unicode ('²') que int() rechaza
+        if not (item.isascii() and item.isdigit()) or int(item) > MAX_PK:
+            raise ValueError(f'Id no válido: {item}')
+        pk = int(item)
+        if pk not in ids:
+            ids.append(pk)
+    if not ids:
+        raise ValueError('Indica al menos un id con ?ids=1,2,3')
+    if len(ids) > maximo:
+        raise ValueError(f'Se aceptan como máximo {maximo} ids por petición')
+    return ids
+
+
+def parse_fields(valor):
+    return parse_lista(valor, CAMPOS, CAMPOS_POR_DEFECTO, 'Campos')
+
+
+def parse_expand(valor):
+    return parse_lista(valor, EXPANSIONES, (), 'Expansiones')
+
+
+class VehiculoSerializer:
+    """
+    Precalcula qué columnas pedir y en qué posición de la tupla está cada
+    una; ``serialize`` solo indexa tuplas y arma diccionarios.
+    """
+
+    def __init__(self, fields=CAMPOS_POR_DEFECTO, expand=()):
+        self.fields = tuple(fields)
+        self.expand = tuple(expand)
+
+        self.columnas = ['id']  # Siempre presente para indexar por id
+        for campo in self.fields:
+            self._columna(CAMPOS[campo][0])
+        for expansion in self.expand:
+            for columna in EXPANSIONES[expansion]:
+                self._columna(columna)
+
+        self._campos = [
+            (campo, self.columnas.index(CAMPOS[campo][0]), CAMPOS[campo][1])
+            for campo in self.fields
+        ]
+        self._indice = {columna: i for i, columna in enumerate(self.columnas)}
+
+        # '{"id":%s,"marca":%s,...}': las claves se codifican una sola vez
+        self._codificadores = [
+            (itemgetter(self.columnas.index(CAMPOS[campo][0])), _codificador(CAMPOS[campo][0], CAMPOS[campo][2]))
+            for campo in self.fields
+        ]
+        claves = [*self.fields, *(e for e in ('vendedor', 'imagenes') if e in self.expand)]
+        self._plantilla = '{' + ','.join(f'{_cadena_json(clave)}:%s' for clave in claves) + '}'
+
+    def _columna(self, columna):
+        if columna not in self.columnas:
+            self.columnas.append(columna)
+
+    def serialize(self, queryset):
+        # Sin select_related: values_list hace el JOIN del vendedor por sí solo
+        filas = queryset.values_list(*self.columnas).iterator(chunk_size=2000)
+        return [self.serialize_fila(fila) for fila in filas]
+
+    def serialize_ids(self, queryset, ids):
+        """
+        Un único SELECT ... WHERE id IN (...) en lugar de una consulta por
+        vehículo. ``in_bulk()`` no admite ``values_list()``, así que el
+        diccionario por id se arma aquí con el mismo resultado.
+        Devuelve ``(vehiculos en el orden de ids, ids no encontrados)``.
+        """
+        por_id = {
+            fila[0]: fila
+            for fila in queryset.filter(pk__in=ids).values_list(*self.columnas)
+        }
+        encontrados = [self.serialize_fila(por_id[pk]) for pk in ids if pk in por_id]
+        no_encontrados = [pk for pk in ids if pk not in por_id]
+        return encontrados, no_encontrados
+
+    def serialize_json(self, queryset, chunk_size=2000):
+        """
+        Como ``serialize`` pero devuelve el arreglo JSON ya codificado. Se
+        codifica por lotes de ``chunk_size`` filas a medida que llegan del
+        cursor: en memoria solo conviven un lote de tuplas y el JSON.
+        """
+        filas = queryset.values_list(*self.columnas).iterator(chunk_size=chunk_size)
+        partes = []
+        while lote := list(islice(filas, chunk_size)):
+            partes.append(self._codificar_filas(lote))
+        return '[' + ','.join(partes) + ']'
+
+    async def aserialize_json(self, queryset):
+        filas = await self._afilas(queryset)
+        return self.codificar_json(filas, await self._acatalogo(filas))
+
+    def codificar_json(self, filas, catalogo=None):
+        """
+        Codifica por columnas: cada columna pasa entera por su codificador
+        con ``map`` y las filas se arman con la plantilla, así el bucle por
+        fila no corre en Python salvo para las expansiones.
+        """
+        return '[' + self._codificar_filas(filas, catalogo) + ']'
+
+    def _codificar_filas(self, filas, catalogo=None):
+        """Las filas codificadas y separadas por comas, sin los corchetes."""
+        columnas = [list(map(codificar, map(columna, filas))) for columna, codificar in self._codificadores]
+        if 'vendedor' in self.expand:
+            columnas.append([self._vendedor_json(fila) for fila in filas])
+        if 'imagenes' in self.expand:
+            columnas.append([
+                self._imagenes_json(self._imagenes(fila, catalogo.get(self._clave_catalogo(fila)) if catalogo else None))
+                for fila in filas
+            ])
+        return ','.join(map(self._plantilla.__mod__, zip(*columnas)))
+
+    def _vendedor_json(self, fila):
+        vendedor_id = fila[self._indice['vendedor_id']]
+        if vendedor_id is None:
+            return 'null'
+        return f'{{"id":{vendedor_id},"username":{_cadena_json(fila[self._indice["vendedor__username"]])}}}'
+
+    def _imagenes_json(self, imagenes):
+        galeria = ','.join(map(_cadena_json, imagenes['galeria']))
+        return f'{{"principal":{_cadena_json(imagenes["principal"])},"galeria":[{galeria}]}}'
+
+    async def _afilas(self, queryset):
+        # named=True: en Django 5.1 el iterable de tuplas simples ejecuta la
+        # consulta al crearse, fuera del hilo de sync_to_async, y aiterator()
+        # falla. Las namedtuple se indexan igual que las tuplas.
+        return [
+            fila async for fila in
+            queryset.values_list(*self.columnas, named=True).aiterator(chunk_size=2000)
+        ]
+
+    async def _acatalogo(self, filas):
+        """Imágenes de catálogo de las filas sin imagen subida, por combinación."""
+        if 'imagenes' not in self.expand:
+            return {}
+        claves = list({self._clave_catalogo(fila) for fila in filas if not self._tiene_principal(fila)})
+        return dict(zip(claves, await aget_car_images(claves)))
+
+    async def aserialize(self, queryset):
+        return await self.aserialize_filas(await self._afilas(queryset))
+
+    async def aserialize_filas(self, filas):
+        catalogo = await self._acatalogo(filas)
+        return [
+            self.serialize_fila(fila, catalogo.get(self._clave_catalogo(fila)) if catalogo else None)
+            for fila in filas
+        ]
+
+    def serialize_fila(self, fila, imagen_catalogo=None):
+        data = {
+            campo: (conversion(fila[i]) if conversion else fila[i])
+            for campo, i, conversion in self._campos
+        }
+        if 'vendedor' in self.expand:
+            data['vendedor'] = self._vendedor(fila)
+        if 'imagenes' in self.expand:
+            data['imagenes'] = self._imagenes(fila, imagen_catalogo)
+        return data
+
+    def _vendedor(self, fila):
+        vendedor_id = fila[self._indice['vendedor_id']]
+        if vendedor_id is None:
+            return None
+        return {'id': vendedor_id, 'username': fila[self._indice['vendedor__username']]}
+
+    def _tiene_principal(self, fila):
+        return bool(fila[self._indice['imagen_principal']])
+
+    def _clave_catalogo(self, fila):
+        return tuple(fila[self._indice[columna]] for columna in ('marca', 'modelo', 'categoria', 'año'))
+
+    def _imagenes(self, fila, imagen_catalogo=None):
+        galeria = [
+            default_storage.url(fila[self._indice[campo]])
+            for campo in Vehiculo.CAMPOS_IMAGEN
+            if fila[self._indice[campo]]
+        ]
+        if self._tiene_principal(fila):
+            principal = galeria[0]
+        elif imagen_catalogo is not None:
+            principal = imagen_catalogo
+        else:
+            # Misma regla que Vehiculo.get_imagen_principal_url, sin el modelo
+            marca, modelo, categoria, año = self._clave_catalogo(fila)
+            principal = get_car_image(marca=marca, modelo=modelo, categoria=categoria, año=año)
+        return {'principal': principal, 'galeria': galeria}
@@ -133,12 +133,15 @@ class CacheableService(BaseService):
 # Importar y exportar servicios específicos
 from .vehicle_filter_service import VehicleFilterService
 from .vehicle_management_service import VehicleCreationService, VehicleUpdateService, VehicleFactory
+from .favorite_service import FavoriteBatchService, FavoriteToggleService
 
 # Crear instancias de servicios como singletons
 vehicle_filter_service = VehicleFilterService()
 vehicle_creation_service = VehicleCreationService()
 vehicle_update_service = VehicleUpdateService()
 vehicle_factory = VehicleFactory()
+favorite_toggle_service = FavoriteToggleService()
+favorite_batch_service = FavoriteBatchService()
 
 # Para compatibilidad con imports existentes
 vehicle_service = vehicle_creation_service
@@ -151,9 +154,13 @@ __all__ = [
     'VehicleCreationService',
     'VehicleUpdateService',
     'VehicleFactory',
+    'FavoriteToggleService',
+    'FavoriteBatchService',
     'vehicle_filter_service',
     'vehicle_creation_service', 
     'vehicle_update_service',
     'vehicle_factory',
+    'favorite_toggle_service',
+    'favorite_batch_service',
     'vehicle_service'
 ]
\ No newline at end of file
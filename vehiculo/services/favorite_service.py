@@ -0,0 +1,250 @@
+"""
+Servicio de favoritos con contadores desnormalizados.
+
+``Vehiculo.total_favoritos`` y ``EstadisticaUsuario.total_favoritos`` se
+ajustan con incrementos ``F()`` dentro de la misma transacción que el
+INSERT/DELETE del favorito, así las lecturas nunca necesitan un COUNT.
+El comando ``reconciliar_contadores`` corrige cualquier desviación.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+from ..models import EstadisticaUsuario, Favorito, Vehiculo
+from ..serializers import MAX_PK
+from . import BaseService
+
+
+def ajustar_contadores_favoritos(usuario_id: int, vehiculo_ids: Iterable[int], delta: int) -> None:
+    """
+    Suma ``delta`` al contador de cada vehículo y ``delta * len(vehiculo_ids)``
+    al del usuario. Debe llamarse dentro de la transacción que modificó los
+    favoritos.
+
+    Se usa ``QuerySet.update`` a propósito: no dispara señales de guardado
+    ni toca ``fecha_actualizacion``.
+    """
+    vehiculo_ids = list(vehiculo_ids)
+    if not vehiculo_ids or not delta:
+        return
+
+    Vehiculo.objects.filter(pk__in=vehiculo_ids).update(
+        total_favoritos=F('total_favoritos') + delta
+    )
+
+    updated = EstadisticaUsuario.objects.filter(usuario_id=usuario_id).update(
+        total_favoritos=F('total_favoritos') + delta * len(vehiculo_ids)
+    )
+    if not updated:
+        # Primera vez: la fila nace con el conteo real, que ya incluye el cambio
+        EstadisticaUsuario.objects.get_or_create(
+            usuario_id=usuario_id,
+            defaults={'total_favoritos': Favorito.objects.filter(usuario_id=usuario_id).count()},
+        )
+
+
+def agregar_favorito(usuario_id: int, vehiculo_id: int) -> bool:
+    """
+    Alta idempotente en una sola sentencia::
+
+        INSERT ... SELECT ... FROM vehiculo WHERE id = %s ON CONFLICT DO NOTHING
+
+    El SELECT sobre la tabla de vehículos hace de chequeo de existencia y
+    ``ON CONFLICT`` absorbe las carreras contra ``unique_together``. Devuelve
+    True solo si la fila se insertó. Debe llamarse dentro de una transacción
+    para que el ajuste de contadores quede en la misma.
+    """
+    connection = connections[router.db_for_write(Favorito)]
+    quote = connection.ops.quote_name
+    sql = (
+        f'INSERT INTO {quote(Favorito._meta.db_table)} '
+        f'({quote("usuario_id")}, {quote("vehiculo_id")}, {quote("fecha_agregado")}) '
+        f'SELECT %s, {quote("id")}, %s FROM {quote(Vehiculo._meta.db_table)} WHERE {quote("id")} = %s '
+        f'ON CONFLICT ({quote("usuario_id")}, {quote("vehiculo_id")}) DO NOTHING'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [usuario_id, timezone.now(), vehiculo_id])
+        insertado = cursor.rowcount == 1
+    if insertado:
+        ajustar_contadores_favoritos(usuario_id, [vehiculo_id], 1)
+    return insertado
+
+
+def quitar_favorito(usuario_id: int, vehiculo_id: int) -> bool:
+    """
+    Baja idempotente: un DELETE cuyo número de filas dice si había favorito.
+    Favorito no tiene señales ni dependientes, así que Django lo ejecuta
+    directamente sin un SELECT previo.
+    """
+    borrados, _ = Favorito.objects.filter(usuario_id=usuario_id, vehiculo_id=vehiculo_id).delete()
+    if borrados:
+        ajustar_contadores_favoritos(usuario_id, [vehiculo_id], -1)
+    return bool(borrados)
+
+
+def _ids_afectados(connection, sql: str, params: List[Any]) -> set:
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {fila[0] for fila in cursor.fetchall()}
+
+
+def agregar_favoritos(usuario_id: int, vehiculo_ids: Iterable[int]) -> List[int]:
+    """
+    Versión en bloque de ``agregar_favorito``: un solo ``INSERT ... SELECT
+    ... ON CONFLICT DO NOTHING RETURNING``. Los contadores se ajustan con los
+    ids que devuelve la base, no con una lectura previa: si otra petición
+    inserta el mismo favorito a la vez, solo una lo cuenta. Devuelve los ids
+    insertados en el orden recibido.
+    """
+    vehiculo_ids = list(vehiculo_ids)
+    if not vehiculo_ids:
+        return []
+    connection = connections[router.db_for_write(Favorito)]
+    if not connection.features.can_return_rows_from_bulk_insert:
+        # SQLite < 3.35 no tiene RETURNING: una sentencia por id
+        return [pk for pk in vehiculo_ids if agregar_favorito(usuario_id, pk)]
+
+    quote = connection.ops.quote_name
+    marcas = ', '.join(['%s'] * len(vehiculo_ids))
+    sql = (
+        f'INSERT INTO {quote(Favorito._meta.db_table)} '
+        f'({quote("usuario_id")}, {quote("vehiculo_id")}, {quote("fecha_agregado")}) '
+        f'SELECT %s, {quote("id")}, %s FROM {quote(Vehiculo._meta.db_table)} WHERE {quote("id")} IN ({marcas}) '
+        f'ON CONFLICT ({quote("usuario_id")}, {quote("vehiculo_id")}) DO NOTHING '
+        f'RETURNING {quote("vehiculo_id")}'
+    )
+    insertados = _ids_afectados(connection, sql, [usuario_id, timezone.now(), *vehiculo_ids])
+    insertados = [pk for pk in vehiculo_ids if pk in insertados]
+    ajustar_contadores_favoritos(usuario_id, insertados, 1)
+    return insertados
+
+
+def quitar_favoritos(usuario_id: int, vehiculo_ids: Iterable[int]) -> List[int]:
+    """Versión en bloque de ``quitar_favorito`` con ``DELETE ... RETURNING``."""
+    vehiculo_ids = list(vehiculo_ids)
+    if not vehiculo_ids:
+        return []
+    connection = connections[router.db_for_write(Favorito)]
+    if not connection.features.can_return_rows_from_bulk_insert:
+        return [pk for pk in vehiculo_ids if quitar_favorito(usuario_id, pk)]
+
+    quote = connection.ops.quote_name
+    marcas = ', '.join(['%s'] * len(vehiculo_ids))
+    sql = (
+        f'DELETE FROM {quote(Favorito._meta.db_table)} '
+        f'WHERE {quote("usuario_id")} = %s AND {quote("vehiculo_id")} IN ({marcas}) '
+        f'RETURNING {quote("vehiculo_id")}'
+    )
+    borrados = _ids_afectados(connection, sql, [usuario_id, *vehiculo_ids])
+    borrados = [pk for pk in vehiculo_ids if pk in borrados]
+    ajustar_contadores_favoritos(usuario_id, borrados, -1)
+    return borrados
+
+
+def total_favoritos_vehiculo(vehiculo_id: int) -> Optional[int]:
+    """Contador del vehículo, o None si no existe."""
+    return Vehiculo.objects.filter(pk=vehiculo_id).values_list('total_favoritos', flat=True).first()
+
+
+def total_favoritos_usuario(usuario) -> int:
+    """Favoritos del usuario leídos de su fila de estadísticas (0 si no existe)."""
+    try:
+        return usuario.estadisticas.total_favoritos
+    except EstadisticaUsuario.DoesNotExist:
+        return 0
+
+
+class FavoriteToggleService(BaseService):
+    """
+    Agrega o quita un vehículo de los favoritos del usuario y mantiene los
+    contadores en la misma transacción.
+    """
+
+    def validate_input(self, usuario, vehiculo: Vehiculo) -> None:
+        if not usuario or not usuario.is_authenticated:
+            raise ValidationError("El usuario debe estar autenticado")
+
+    def perform_operation(self, usuario, vehiculo: Vehiculo) -> Dict[str, Any]:
+        with transaction.atomic():
+            # Borrar primero: si había favorito, el rowcount lo dice sin un SELECT previo.
+            # Si no, el alta con ON CONFLICT no falla aunque otra petición se adelante.
+            if quitar_favorito(usuario.pk, vehiculo.pk):
+                is_favorite = False
+            else:
+                agregar_favorito(usuario.pk, vehiculo.pk)
+                is_favorite = True
+
+            total = total_favoritos_vehiculo(vehiculo.pk)
+
+        return {'is_favorite': is_favorite, 'total_favoritos': total or 0}
+
+    def format_output(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'success': True,
+            'is_favorite': result['is_favorite'],
+            'total_favoritos': result['total_favoritos'],
+            'message': 'Agregado a favoritos' if result['is_favorite'] else 'Eliminado de favoritos',
+        }
+
+
+class FavoriteBatchService(BaseService):
+    """
+    Sincroniza varios favoritos en una sola petición: un INSERT y un DELETE
+    con RETURNING (``agregar_favoritos``/``quitar_favoritos``), todo en una
+    transacción. Pensado para la app, que acumula cambios sin conexión.
+    """
+
+    MAX_IDS = 100
+
+    def _ids(self, valor, nombre: str) -> List[int]:
+        if valor is None:
+            return []
+        if not isinstance(valor, list) or not all(
+            isinstance(pk, int) and not isinstance(pk, bool) and 0 < pk <= MAX_PK for pk in valor
+        ):
+            raise ValidationError(f"'{nombre}' debe ser una lista de ids enteros")
+        return list(dict.fromkeys(valor))
+
+    def validate_input(self, usuario, agregar=None, quitar=None) -> None:
+        if not usuario or not usuario.is_authenticated:
+            raise ValidationError("El usuario debe estar autenticado")
+        agregar, quitar = self._ids(agregar, 'add'), self._ids(quitar, 'remove')
+        if len(agregar) + len(quitar) > self.MAX_IDS:
+            raise ValidationError(f"Se aceptan como máximo {self.MAX_IDS} ids por petición")
+        repetidos = set(agregar) & set(quitar)
+        if repetidos:
+            raise ValidationError(
+                f"Ids en 'add' y 'remove' a la vez: {', '.join(map(str, sorted(repetidos)))}"
+            )
+
+    def perform_operation(self, usuario, agregar=None, quitar=None) -> Dict[str, Any]:
+        agregar, quitar = self._ids(agregar, 'add'), self._ids(quitar, 'remove')
+
+        with transaction.atomic():
+            # Los contadores siguen a las filas que la base insertó o borró de verdad
+            nuevos = agregar_favoritos(usuario.pk, agregar)
+            borrados = quitar_favoritos(usuario.pk, quitar)
+            existentes = set(Vehiculo.objects.filter(pk__in=agregar).values_list('pk', flat=True))
+
+            favoritos = list(
+                Favorito.objects.filter(usuario=usuario).values_list('vehiculo_id', flat=True)
+            )
+
+        return {
+            'favoritos': favoritos,
+            'agregados': nuevos,
+            'eliminados': borrados,
+            'no_encontrados': [pk for pk in agregar if pk not in existentes],
+        }
+
+    def format_output(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'success': True,
+            'favoritos': result['favoritos'],
+            'added': result['agregados'],
+            'removed': result['eliminados'],
+            'not_found': result['no_encontrados'],
+            'total_favoritos': len(result['favoritos']),
+        }
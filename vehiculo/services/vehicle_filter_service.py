@@ -4,6 +4,7 @@ Servicio para manejo de filtros de vehículos usando Strategy Pattern
 
 from typing import Dict, Any, List
 from django.db.models import QuerySet
+from ..cache import vehiculo_cache
 from ..models import Vehiculo
 from . import QueryService
 
@@ -11,10 +12,16 @@ from . import QueryService
 class VehicleFilterStrategy:
     """
     Interfaz para estrategias de filtrado de vehículos.
+    ``apply`` filtra un queryset y ``matches`` evalúa el mismo criterio sobre
+    un objeto ya cargado (p. ej. un CambioVehiculo del feed SSE), para que
+    ambos caminos no diverjan.
     """
     
     def apply(self, queryset: QuerySet, value: Any) -> QuerySet:
         raise NotImplementedError
+    
+    def matches(self, obj: Any, value: Any) -> bool:
+        raise NotImplementedError
 
 
 class MarcaFilterStrategy(VehicleFilterStrategy):
@@ -24,6 +31,9 @@ class MarcaFilterStrategy(VehicleFilterStrategy):
         if value:
             return queryset.filter(marca__icontains=value)
         return queryset
+    
+    def matches(self, obj: Any, value: str) -> bool:
+        return not value or value.lower() in obj.marca.lower()
 
 
 class CategoriaFilterStrategy(VehicleFilterStrategy):
@@ -33,6 +43,9 @@ class CategoriaFilterStrategy(VehicleFilterStrategy):
         if value:
             return queryset.filter(categoria=value)
         return queryset
+    
+    def matches(self, obj: Any, value: str) -> bool:
+        return not value or obj.categoria == value
 
 
 class PrecioRangeFilterStrategy(VehicleFilterStrategy):
@@ -44,6 +57,13 @@ class PrecioRangeFilterStrategy(VehicleFilterStrategy):
         if value.get('max'):
             queryset = queryset.filter(precio__lte=value['max'])
         return queryset
+    
+    def matches(self, obj: Any, value: Dict[str, float]) -> bool:
+        if value.get('min') and obj.precio < value['min']:
+            return False
+        if value.get('max') and obj.precio > value['max']:
+            return False
+        return True
 
 
 class AñoRangeFilterStrategy(VehicleFilterStrategy):
@@ -55,6 +75,22 @@ class AñoRangeFilterStrategy(VehicleFilterStrategy):
         if value.get('max'):
             queryset = queryset.filter(año__lte=value['max'])
         return queryset
+    
+    def matches(self, obj: Any, value: Dict[str, int]) -> bool:
+        if value.get('min') and obj.año < value['min']:
+            return False
+        if value.get('max') and obj.año > value['max']:
+            return False
+        return True
+
+
+# Estrategias compartidas por el listado y el feed SSE (vehiculo/eventos.py)
+FILTER_STRATEGIES = {
+    'marca': MarcaFilterStrategy(),
+    'categoria': CategoriaFilterStrategy(),
+    'precio': PrecioRangeFilterStrategy(),
+    'año': AñoRangeFilterStrategy(),
+}
 
 
 class VehicleFilterService(QueryService):
@@ -65,12 +101,7 @@ class VehicleFilterService(QueryService):
     
     def __init__(self):
         super().__init__(Vehiculo)
-        self.filter_strategies = {
-            'marca': MarcaFilterStrategy(),
-            'categoria': CategoriaFilterStrategy(),
-            'precio': PrecioRangeFilterStrategy(),
-            'año': AñoRangeFilterStrategy(),
-        }
+        self.filter_strategies = FILTER_STRATEGIES
     
     def validate_input(self, filters: Dict[str, Any] = None, **kwargs) -> None:
         """Valida que los filtros sean válidos"""
@@ -142,7 +173,11 @@ class VehicleFilterService(QueryService):
     def get_filter_options(self) -> Dict[str, List[str]]:
         """
         Obtiene las opciones disponibles para cada filtro.
+        Se cachean en el namespace 'filtros', que se invalida al cambiar el catálogo.
         """
+        return vehiculo_cache.get_or_set('filtros', 'opciones', self._query_filter_options)
+    
+    def _query_filter_options(self) -> Dict[str, List[str]]:
         return {
             'marcas_disponibles': list(
                 self.model_class.objects.values_list('marca', flat=True)
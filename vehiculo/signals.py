@@ -0,0 +1,106 @@
+"""
+Señales de la app vehiculo.
+Mantienen las cachés y los contadores del catálogo coherentes cuando
+cambia un vehículo, y los contadores de favoritos cuando un borrado en
+cascada elimina favoritos sin pasar por el servicio. También escriben el
+registro de cambios (CambioVehiculo) que alimenta el feed SSE y ajustan
+las estadísticas de mercado (EstadisticaMercado).
+"""
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from . import contadores, estadisticas
+from .cache import vehiculo_cache
+from .models import CambioVehiculo, EstadisticaUsuario, Vehiculo
+
+
+@receiver(post_save, sender=Vehiculo)
+@receiver(post_delete, sender=Vehiculo)
+def invalidar_cache_catalogo(sender, instance, **kwargs):
+    """Las opciones de filtro dependen del catálogo: invalidar tras el commit."""
+    transaction.on_commit(lambda: vehiculo_cache.invalidate('filtros'))
+
+
+@receiver(pre_save, sender=Vehiculo)
+def recordar_estado_contadores(sender, instance, raw=False, using=None, **kwargs):
+    """
+    Guarda el estado previo (activo, categoría) para calcular los deltas, y
+    el aporte previo a las estadísticas de mercado, en una sola consulta.
+    """
+    instance._estado_contadores = instance._estado_mercado = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    previo = (
+        Vehiculo.objects.using(using)
+        .filter(pk=instance.pk)
+        .values_list('activo', 'categoria', 'marca', 'modelo', 'año', 'precio')
+        .first()
+    )
+    if previo is not None:
+        instance._estado_contadores = previo[:2]
+        instance._estado_mercado = estadisticas.aporte(*previo)
+
+
+@receiver(post_save, sender=Vehiculo)
+def actualizar_contadores_guardado(sender, instance, created, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    deltas = Counter(contadores.claves_para(instance.activo, instance.categoria))
+    estado_previo = getattr(instance, '_estado_contadores', None)
+    if not created and estado_previo is not None:
+        deltas.subtract(contadores.claves_para(*estado_previo))
+    contadores.aplicar_deltas(deltas, using=using)
+
+
+@receiver(post_delete, sender=Vehiculo)
+def actualizar_contadores_borrado(sender, instance, using=None, **kwargs):
+    deltas = Counter()
+    deltas.subtract(contadores.claves_para(instance.activo, instance.categoria))
+    contadores.aplicar_deltas(deltas, using=using)
+
+
+@receiver(pre_delete, sender=Vehiculo)
+def descontar_favoritos_vehiculo(sender, instance, using=None, **kwargs):
+    """Cada usuario que lo tenía en favoritos pierde uno (la cascada no avisa)."""
+    EstadisticaUsuario.objects.using(using).filter(
+        usuario__favoritos__vehiculo=instance
+    ).update(total_favoritos=F('total_favoritos') - 1)
+
+
+@receiver(pre_delete, sender=User)
+def descontar_favoritos_usuario(sender, instance, using=None, **kwargs):
+    """Los vehículos que el usuario tenía en favoritos pierden uno."""
+    Vehiculo.objects.using(using).filter(
+        favoritos__usuario=instance
+    ).update(total_favoritos=F('total_favoritos') - 1)
+
+
+@receiver(post_save, sender=Vehiculo)
+def registrar_cambio_guardado(sender, instance, created, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    tipo = CambioVehiculo.CREADO if created else CambioVehiculo.ACTUALIZADO
+    CambioVehiculo.registrar(instance, tipo, using=using)
+
+
+@receiver(post_delete, sender=Vehiculo)
+def registrar_cambio_borrado(sender, instance, using=None, **kwargs):
+    CambioVehiculo.registrar(instance, CambioVehiculo.ELIMINADO, using=using)
+
+
+@receiver(post_save, sender=Vehiculo)
+def actualizar_estadisticas_guardado(sender, instance, created, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    previo = None if created else getattr(instance, '_estado_mercado', None)
+    estadisticas.mover(previo, estadisticas.aporte_de(instance), using=using)
+
+
+@receiver(post_delete, sender=Vehiculo)
+def actualizar_estadisticas_borrado(sender, instance, using=None, **kwargs):
+    estadisticas.mover(estadisticas.aporte_de(instance), None, using=using)
@@ -0,0 +1,54 @@
+"""
+Perfil de producción para SQLite.
+
+``aplicar_pragmas`` se conecta a ``connection_created`` y ejecuta los
+PRAGMA de ``settings.SQLITE_PRAGMAS`` en cada conexión nueva. WAL permite
+lectores concurrentes con un escritor, ``busy_timeout`` hace que los
+escritores esperen el candado en lugar de fallar con "database is locked",
+y ``mmap_size``/``cache_size`` reducen lecturas al disco.
+
+Solo actúa sobre conexiones ``vendor == 'sqlite'``; con otro motor no hace
+nada.
+"""
+import re
+
+from django.conf import settings
+
+NOMBRE_PRAGMA = re.compile(r'^[a-z_]+$')
+VALOR_PRAGMA = re.compile(r'^-?[A-Za-z0-9_]+$')
+
+
+def sentencias_pragma(pragmas):
+    """``{'journal_mode': 'WAL'}`` → ``['PRAGMA journal_mode=WAL']``, validando nombres y valores."""
+    sentencias = []
+    for nombre, valor in pragmas.items():
+        valor = str(valor)
+        if not NOMBRE_PRAGMA.match(nombre) or not VALOR_PRAGMA.match(valor):
+            raise ValueError(f'PRAGMA no válido: {nombre}={valor}')
+        sentencias.append(f'PRAGMA {nombre}={valor}')
+    return sentencias
+
+
+def aplicar_pragmas(sender, connection, **kwargs):
+    """Receptor de ``connection_created``."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', None)
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for sentencia in sentencias_pragma(pragmas):
+            cursor.execute(sentencia)
+
+
+def pragmas_actuales(connection, nombres):
+    """Valores efectivos de los PRAGMA indicados en ``connection``."""
+    valores = {}
+    with connection.cursor() as cursor:
+        for nombre in nombres:
+            if not NOMBRE_PRAGMA.match(nombre):
+                raise ValueError(f'PRAGMA no válido: {nombre}')
+            cursor.execute(f'PRAGMA {nombre}')
+            fila = cursor.fetchone()
+            valores[nombre] = fila[0] if fila else None
+    return valores
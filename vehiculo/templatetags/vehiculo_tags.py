@@ -1,87 +1,98 @@
+import json
+from pathlib import Path
+
 from django import template
-import hashlib
+from django.templatetags.static import static
+
+from ..context_processors import obtener_tema
+from ..fragmentos import renderizar_tarjetas
+from ..image_providers import registry
 
 register = template.Library()
 
 
 @register.simple_tag
-def get_car_image_cdn(marca, modelo, año=None, width=800, height=600, provider='unsplash'):
+def get_car_image_cdn(marca, modelo, año=None, width=800, height=600, provider=None):
     """
     Genera URL de imagen de CDN para vehículos
     
-    Providers disponibles:
+    Providers disponibles (ver vehiculo/image_providers.py):
     - unsplash: Fotos de alta calidad de Unsplash (recomendado)
     - pexels: Fotos de Pexels
     - picsum: Imágenes placeholder aleatorias pero consistentes
     - placeholder: Placeholder simple con color
+
+    Sin provider se usa IMAGE_PROVIDERS['catalog']. Si el proveedor está
+    degradado el registro responde con FALLBACK_PROVIDER.
+    La URL devuelta apunta al proxy local /img/, nunca al CDN externo.
     """
-    
-    if provider == 'unsplash':
-        # Unsplash Source API - Imágenes de alta calidad relacionadas con la búsqueda
-        query = f"{marca}+{modelo}"
-        if año:
-            query += f"+{año}"
-        query += "+car+vehicle"
-        return f"https://source.unsplash.com/{width}x{height}/?{query}"
-    
-    elif provider == 'pexels':
-        # Nota: Pexels requiere API key para uso en producción
-        # Esta es una URL de ejemplo, necesitarías implementar con su API
-        query = f"{marca} {modelo} car".replace(" ", "%20")
-        # Para producción, usar: https://api.pexels.com/v1/search?query=...
-        return f"https://images.pexels.com/photos/car.jpeg?auto=compress&cs=tinysrgb&w={width}&h={height}"
-    
-    elif provider == 'picsum':
-        # Picsum con seed para consistencia - siempre la misma imagen para el mismo vehículo
-        seed = f"{marca}{modelo}".replace(" ", "")
-        return f"https://picsum.photos/seed/{seed}/{width}/{height}"
-    
-    elif provider == 'placeholder':
-        # Placeholder con color basado en marca
-        color_hash = hashlib.md5(marca.encode()).hexdigest()[:6]
-        text = f"{marca}+{modelo}".replace(" ", "+")
-        return f"https://via.placeholder.com/{width}x{height}/{color_hash}/ffffff?text={text}"
-    
-    else:
-        # Default: unsplash
-        return get_car_image_cdn(marca, modelo, año, width, height, 'unsplash')
+    return registry.image_url(marca, modelo, año, width, height,
+                              provider=provider, context='catalog')
+
+
+def _load_brand_logos():
+    """
+    Carga el manifest generado por ``manage.py construir_logos`` y devuelve
+    la tabla marca -> URL estática, el placeholder y la hoja CSS del sprite.
+    """
+    try:
+        with open(BRAND_LOGOS_MANIFEST, encoding='utf-8') as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        return {}, None, None
+    logos = {marca: static(path) for marca, path in manifest.get('logos', {}).items()}
+    placeholder = static(manifest['placeholder']) if manifest.get('placeholder') else None
+    sprite_css = manifest.get('sprite', {}).get('css')
+    return logos, placeholder, static(sprite_css) if sprite_css else None
+
+
+BRAND_LOGOS_MANIFEST = Path(__file__).resolve().parent.parent / 'static' / 'img' / 'marcas' / 'manifest.json'
+BRAND_LOGOS, BRAND_LOGO_PLACEHOLDER, BRAND_LOGOS_SPRITE_CSS = _load_brand_logos()
 
 
 @register.simple_tag
 def get_brand_logo_url(marca):
     """
-    Genera URL para el logo de la marca del vehículo
-    Puedes extender esto para usar logos reales de un CDN
+    Devuelve la URL del logo de la marca servido desde static/.
+    La tabla se carga una sola vez al importar el módulo.
     """
-    # Mapping de marcas a URLs de logos (ejemplo)
-    brand_logos = {
-        'Toyota': 'https://www.carlogos.org/car-logos/toyota-logo.png',
-        'Ford': 'https://www.carlogos.org/car-logos/ford-logo.png',
-        'BMW': 'https://www.carlogos.org/car-logos/bmw-logo.png',
-        'Mercedes-Benz': 'https://www.carlogos.org/car-logos/mercedes-benz-logo.png',
-        'Audi': 'https://www.carlogos.org/car-logos/audi-logo.png',
-        'Honda': 'https://www.carlogos.org/car-logos/honda-logo.png',
-        'Nissan': 'https://www.carlogos.org/car-logos/nissan-logo.png',
-        'Chevrolet': 'https://www.carlogos.org/car-logos/chevrolet-logo.png',
-        'Volkswagen': 'https://www.carlogos.org/car-logos/volkswagen-logo.png',
-        'Hyundai': 'https://www.carlogos.org/car-logos/hyundai-logo.png',
-        'Kia': 'https://www.carlogos.org/car-logos/kia-logo.png',
-        'Mazda': 'https://www.carlogos.org/car-logos/mazda-logo.png',
-        'Subaru': 'https://www.carlogos.org/car-logos/subaru-logo.png',
-        'Lexus': 'https://www.carlogos.org/car-logos/lexus-logo.png',
-        'Porsche': 'https://www.carlogos.org/car-logos/porsche-logo.png',
-        'Jaguar': 'https://www.carlogos.org/car-logos/jaguar-logo.png',
-        'Land Rover': 'https://www.carlogos.org/car-logos/land-rover-logo.png',
-        'Volvo': 'https://www.carlogos.org/car-logos/volvo-logo.png',
-        'Acura': 'https://www.carlogos.org/car-logos/acura-logo.png',
-        'Infiniti': 'https://www.carlogos.org/car-logos/infiniti-logo.png',
-    }
-    
-    return brand_logos.get(marca, 'https://via.placeholder.com/100x100?text=Logo')
+    return BRAND_LOGOS.get(marca, BRAND_LOGO_PLACEHOLDER)
+
+
+@register.simple_tag
+def brand_logos_sprite_css():
+    """
+    URL de la hoja CSS del sprite de logos.
+    Uso: <link rel="stylesheet" href="{% brand_logos_sprite_css %}">
+    y <span class="brand-logo brand-logo-toyota"></span>
+    """
+    return BRAND_LOGOS_SPRITE_CSS
+
+
+@register.filter
+def imagen_vehiculo(vehiculo, rendition='full'):
+    """
+    URL de la imagen principal en la rendition indicada
+    Uso: {{ vehiculo|imagen_vehiculo:'thumb' }}
+    """
+    return vehiculo.get_imagen_principal_url(rendition)
+
+
+@register.simple_tag(takes_context=True)
+def tarjetas_vehiculos(context, vehiculos, plantilla, rendition='full'):
+    """
+    Renderiza las tarjetas de una página usando la caché de fragmentos.
+    Uso: {% tarjetas_vehiculos vehiculos 'vehiculo/partials/tarjeta.html' as tarjetas %}
+    y luego {% for vehiculo, tarjeta in tarjetas %}
+    """
+    tema = context.get('theme')
+    if tema is None:
+        tema = obtener_tema(context.get('request'))
+    return renderizar_tarjetas(vehiculos, plantilla, rendition, tema)
 
 
 @register.filter
-def get_vehicle_image(vehiculo, provider='unsplash'):
+def get_vehicle_image(vehiculo, provider=None):
     """
     Filter para obtener la imagen del vehículo desde el modelo
     Uso: {{ vehiculo|get_vehicle_image:'unsplash' }}
@@ -1,3 +1,1058 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections, router, transaction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import resolve
+from django.utils import timezone
+
+from proyecto_vehiculos_django import settings as proyecto
+
+from . import checks, contadores, delta, estadisticas, eventos, fragmentos, image_proxy, warmup
+from .cache import TwoTierCache, vehiculo_cache
+from .estadisticas import PERCENTILES
+from .image_providers import ImageProvider, ProviderHealth, registry
+from .middleware import PrimariaStickyMiddleware, RateLimitMiddleware
+from .models import (
+    CambioVehiculo, ContadorCatalogo, EstadisticaMercado, EstadisticaUsuario, Favorito, Vehiculo,
+    es_ruta_fragmentada, vehiculo_image_path,
+)
+from .ratelimit import Regla, config as config_ratelimit, limiter
+from .routers import iniciar_request, lag_guard, terminar_request
+from .serializers import CAMPOS, CAMPOS_POR_DEFECTO, VehiculoSerializer, parse_expand, parse_fields
+from .services.favorite_service import agregar_favorito, agregar_favoritos, quitar_favorito, quitar_favoritos
+from .services.vehicle_filter_service import VehicleFilterService
+from .templatetags import vehiculo_tags
+
+REPLICA = 'replica_test'
+CACHES_EN_MEMORIA = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'},
+    'ratelimit': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-ratelimit'},
+}
+
+
+def crear_vehiculo(numero, **extra):
+    datos = {
+        'marca': 'Toyota', 'modelo': f'Corolla {numero}', 'año': 2020, 'precio': 10000 + numero,
+        'kilometraje': 1000, 'transmision': 'Manual', 'combustible': 'Gasolina',
+        'categoria': 'Sedán', 'color': 'Blanco', 'serial_carroceria': f'SC{numero}',
+        'serial_motor': f'SM{numero}', 'placa': f'PL{numero}', 'motor': '1.8L',
+    }
+    datos.update(extra)
+    return Vehiculo.objects.create(**datos)
+
+
+@override_settings(
+    DATABASE_ROUTERS=['vehiculo.routers.ReplicaRouter'],
+    VEHICULO_REPLICAS={'ALIASES': [REPLICA], 'MAX_LAG': 2.0, 'LAG_CHECK_INTERVAL': 0},
+)
+@unittest.skipUnless(connection.vendor == 'sqlite', 'La réplica se simula copiando el archivo SQLite')
+class ReplicaRouterTests(TransactionTestCase):
+    """
+    La primaria es la base de tests y la réplica otro archivo SQLite al que
+    se copian los datos con la API de backup, simulando la replicación.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # El alias se registra tras el setup del test runner, que solo crea
+        # bases de test para los alias de settings.DATABASES
+        cls.directorio = tempfile.TemporaryDirectory()
+        cls.replica_path = os.path.join(cls.directorio.name, 'replica.sqlite3')
+        connections.settings[REPLICA] = connections.configure_settings({
+            'default': connections.settings['default'],
+            REPLICA: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': cls.replica_path},
+        })[REPLICA]
+        cls.databases = cls.databases | {REPLICA}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        cls.directorio.cleanup()
+
+    def setUp(self):
+        connections[REPLICA].close()
+        if os.path.exists(self.replica_path):
+            os.remove(self.replica_path)
+        lag_guard.reset()
+
+    def replicar(self):
+        """Copia la primaria completa al archivo de la réplica."""
+        connections[REPLICA].close()
+        primaria = connections['default']
+        primaria.ensure_connection()
+        destino = sqlite3.connect(self.replica_path)
+        try:
+            primaria.connection.backup(destino)
+        finally:
+            destino.close()
+
+    def test_lecturas_del_catalogo_van_a_la_replica(self):
+        vehiculo = crear_vehiculo(1)
+        self.replicar()
+        crear_vehiculo(2)
+        # Mismo instante lógico: la réplica no se considera atrasada
+        Vehiculo.objects.update(fecha_actualizacion=vehiculo.fecha_actualizacion)
+
+        self.assertEqual(router.db_for_read(Vehiculo), REPLICA)
+        self.assertEqual(Vehiculo.objects.count(), 1)
+        self.assertEqual(Vehiculo.objects.using('default').count(), 2)
+
+    @override_settings(VEHICULO_REPLICAS={
+        'ALIASES': [REPLICA], 'MAX_LAG': 2.0, 'LAG_CHECK_INTERVAL': 0,
+        'MODELS': ['vehiculo.vehiculo', 'vehiculo.estadisticamercado'],
+    })
+    def test_reconstruir_estadisticas_lee_de_la_primaria(self):
+        vehiculo = crear_vehiculo(1, modelo='Corolla')
+        self.replicar()
+        crear_vehiculo(2, modelo='Corolla')
+        Vehiculo.objects.update(fecha_actualizacion=vehiculo.fecha_actualizacion)
+        self.assertEqual(router.db_for_read(EstadisticaMercado), REPLICA)
+
+        grupos = estadisticas.grupos_desactualizados()
+        self.assertEqual(grupos, [('Toyota', 'Corolla', 2020, 'Sedán')])
+        estadisticas.reconstruir(grupos)
+        fila = EstadisticaMercado.objects.using('default').get()
+        self.assertEqual((fila.cantidad, fila.desactualizada), (2, False))
+
+    def test_escrituras_y_otros_modelos_van_a_la_primaria(self):
+        self.replicar()
+        self.assertEqual(router.db_for_write(Vehiculo), 'default')
+        self.assertEqual(router.db_for_read(User), 'default')
+
+    def test_lecturas_en_transaccion_van_a_la_primaria(self):
+        self.replicar()
+        with transaction.atomic():
+            self.assertEqual(router.db_for_read(Vehiculo), 'default')
+
+    def test_tras_escribir_el_request_lee_de_la_primaria(self):
+        self.replicar()
+        estado, token = iniciar_request()
+        try:
+            self.assertEqual(router.db_for_read(Vehiculo), REPLICA)
+            crear_vehiculo(1)
+            self.assertTrue(estado.escribio)
+            self.assertEqual(router.db_for_read(Vehiculo), 'default')
+            self.assertEqual(Vehiculo.objects.count(), 1)
+        finally:
+            terminar_request(token)
+
+    def test_middleware_fija_y_respeta_la_cookie_sticky(self):
+        self.replicar()
+        factory = RequestFactory()
+
+        def vista_que_escribe(request):
+            crear_vehiculo(1)
+            return HttpResponse()
+
+        response = PrimariaStickyMiddleware(vista_que_escribe)(factory.post('/'))
+        self.assertIn('db_primaria', response.cookies)
+        self.assertEqual(response.cookies['db_primaria']['max-age'], 5)
+        self.replicar()
+
+        lecturas = []
+
+        def vista_que_lee(request):
+            lecturas.append(router.db_for_read(Vehiculo))
+            return HttpResponse()
+
+        request = factory.get('/')
+        request.COOKIES['db_primaria'] = '1'
+        response = PrimariaStickyMiddleware(vista_que_lee)(request)
+        PrimariaStickyMiddleware(vista_que_lee)(factory.get('/'))
+
+        self.assertNotIn('db_primaria', response.cookies)
+        self.assertEqual(lecturas, ['default', REPLICA])
+
+    def test_replica_atrasada_queda_fuera(self):
+        vehiculo = crear_vehiculo(1)
+        self.replicar()
+        Vehiculo.objects.filter(pk=vehiculo.pk).update(
+            fecha_actualizacion=vehiculo.fecha_actualizacion + timedelta(seconds=30)
+        )
+        self.assertEqual(router.db_for_read(Vehiculo), 'default')
+
+    @override_settings(VEHICULO_REPLICAS={'ALIASES': [REPLICA], 'MAX_LAG': 60.0, 'LAG_CHECK_INTERVAL': 0})
+    def test_retraso_dentro_del_limite_se_tolera(self):
+        vehiculo = crear_vehiculo(1)
+        self.replicar()
+        Vehiculo.objects.filter(pk=vehiculo.pk).update(
+            fecha_actualizacion=vehiculo.fecha_actualizacion + timedelta(seconds=30)
+        )
+        self.assertEqual(router.db_for_read(Vehiculo), REPLICA)
+
+    def test_replica_caida_queda_fuera(self):
+        # Archivo vacío: la tabla no existe y la medición falla
+        sqlite3.connect(self.replica_path).close()
+        self.assertEqual(router.db_for_read(Vehiculo), 'default')
+
+
+class FavoritoConcurrenciaTests(TransactionTestCase):
+    """Muchos hilos marcando y quitando el mismo par usuario/vehículo."""
+
+    HILOS = 16
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('concurrente', password='x')
+        self.vehiculo = crear_vehiculo(1)
+
+    def martillar(self, operacion):
+        barrera = threading.Barrier(self.HILOS)
+        resultados, errores = [], []
+
+        def trabajar():
+            try:
+                barrera.wait()
+                with transaction.atomic():
+                    resultados.append(operacion(self.usuario.pk, self.vehiculo.pk))
+            except Exception as e:  # pragma: no cover - se reporta en la aserción
+                errores.append(e)
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=trabajar) for _ in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(errores, [])
+        return resultados
+
+    def assertContadores(self, esperado):
+        self.vehiculo.refresh_from_db()
+        self.assertEqual(Favorito.objects.filter(usuario=self.usuario, vehiculo=self.vehiculo).count(), esperado)
+        self.assertEqual(self.vehiculo.total_favoritos, esperado)
+        self.assertEqual(EstadisticaUsuario.objects.get(usuario=self.usuario).total_favoritos, esperado)
+
+    def test_put_concurrente_inserta_una_sola_vez(self):
+        resultados = self.martillar(agregar_favorito)
+        self.assertEqual(resultados.count(True), 1)
+        self.assertContadores(1)
+
+    def test_delete_concurrente_borra_una_sola_vez(self):
+        with transaction.atomic():
+            agregar_favorito(self.usuario.pk, self.vehiculo.pk)
+        resultados = self.martillar(quitar_favorito)
+        self.assertEqual(resultados.count(True), 1)
+        self.assertContadores(0)
+
+    def test_lotes_concurrentes_cuentan_cada_cambio_una_vez(self):
+        resultados = self.martillar(lambda usuario, vehiculo: bool(agregar_favoritos(usuario, [vehiculo])))
+        self.assertEqual(resultados.count(True), 1)
+        self.assertContadores(1)
+        resultados = self.martillar(lambda usuario, vehiculo: bool(quitar_favoritos(usuario, [vehiculo])))
+        self.assertEqual(resultados.count(True), 1)
+        self.assertContadores(0)
+
+    def test_put_de_vehiculo_inexistente_no_inserta(self):
+        with transaction.atomic():
+            self.assertFalse(agregar_favorito(self.usuario.pk, self.vehiculo.pk + 1))
+        self.assertFalse(Favorito.objects.exists())
+
+
+@override_settings(
+    VEHICULO_RATELIMIT={
+        'RULES': {'vehiculo:vehiculos_api': '3/m'},
+        'IP_HEADER': 'HTTP_X_FORWARDED_FOR',
+        'TRUSTED_PROXIES': 1,
+    },
+)
+class RateLimitTests(SimpleTestCase):
+
+    def setUp(self):
+        caches['ratelimit'].clear()
+        limiter.reset()
+        self.middleware = RateLimitMiddleware(lambda request: HttpResponse())
+        self.factory = RequestFactory()
+
+    def procesar(self, ip='10.0.0.1', path='/vehiculo/api/vehiculos/', metodo='get', **extra):
+        request = getattr(self.factory, metodo)(path, REMOTE_ADDR='127.0.0.1', HTTP_X_FORWARDED_FOR=ip, **extra)
+        request.resolver_match = resolve(path)
+        return self.middleware.process_view(request, None, (), {})
+
+    def test_corta_con_429_y_retry_after_al_vaciar_el_bucket(self):
+        self.assertEqual([self.procesar() for _ in range(3)], [None, None, None])
+        response = self.procesar()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '20')
+        # Otra IP tiene su propio bucket y las URLs sin regla no se limitan
+        self.assertIsNone(self.procesar(ip='10.0.0.2'))
+        self.assertIsNone(self.procesar(path='/vehiculo/lista/'))
+        self.assertEqual(limiter.stats()['reglas']['vehiculo:vehiculos_api']['rechazados'], 1)
+
+    def test_rechazos_siguientes_no_consultan_la_cache(self):
+        for _ in range(4):
+            self.procesar()
+        self.procesar()
+        contadores = limiter.stats()['reglas']['vehiculo:vehiculos_api']
+        self.assertEqual((contadores['rechazados'], contadores['rechazados_locales']), (1, 1))
+
+    def test_la_ip_es_la_que_anade_el_proxy_y_no_la_del_cliente(self):
+        for numero in range(3):
+            self.procesar(ip=f'1.2.3.{numero}, 10.0.0.9')
+        # Cambiar la parte izquierda de X-Forwarded-For no estrena bucket
+        self.assertEqual(self.procesar(ip='6.6.6.6, 10.0.0.9').status_code, 429)
+
+    def test_los_buckets_no_usan_la_cache_del_catalogo(self):
+        self.procesar()
+        self.assertIsNotNone(caches['ratelimit'].get('vehiculo:rl:vehiculo:vehiculos_api:ip:10.0.0.1'))
+        self.assertIsNone(caches['default'].get('vehiculo:rl:vehiculo:vehiculos_api:ip:10.0.0.1'))
+
+    def test_las_urls_de_login_comparten_bucket(self):
+        # Las reglas reales del proyecto: alternar /auth/, /login/ y /signup/
+        # no triplica los 10 intentos
+        reglas = {**config_ratelimit(), 'RULES': proyecto.VEHICULO_RATELIMIT['RULES']}
+        rutas = ['/auth/', '/login/', '/signup/']
+        with override_settings(VEHICULO_RATELIMIT=reglas):
+            respuestas = [self.procesar(path=rutas[n % 3], metodo='post') for n in range(10)]
+            self.assertEqual(respuestas, [None] * 10)
+            for ruta in rutas:
+                self.assertEqual(self.procesar(path=ruta, metodo='post').status_code, 429)
+            # Los GET del formulario no gastan fichas
+            self.assertIsNone(self.procesar(path='/login/'))
+
+        self.assertIsNotNone(caches['ratelimit'].get('vehiculo:rl:auth:ip:10.0.0.1'))
+
+    def test_check_deploy_rechaza_la_cache_por_proceso(self):
+        errores = checks.check_cache_ratelimit(None)
+        self.assertEqual([error.id for error in errores], ['vehiculo.E001'])
+        redis = {**CACHES_EN_MEMORIA, 'ratelimit': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://127.0.0.1:6379',
+        }}
+        with override_settings(CACHES=redis):
+            self.assertEqual(checks.check_cache_ratelimit(None), [])
+        with override_settings(VEHICULO_RATELIMIT={'ENABLED': False}):
+            self.assertEqual(checks.check_cache_ratelimit(None), [])
+
+    def test_el_bucket_se_recarga_con_el_tiempo(self):
+        regla = Regla('prueba', '2/s')
+        self.assertEqual(limiter.consumir(regla, 'k', ahora=100.0), 0)
+        self.assertEqual(limiter.consumir(regla, 'k', ahora=100.0), 0)
+        self.assertAlmostEqual(limiter.consumir(regla, 'k', ahora=100.0), 0.5)
+        self.assertEqual(limiter.consumir(regla, 'k', ahora=100.5), 0)
+
+
+class EstadisticasMercadoTests(TestCase):
+
+    def grupo(self, modelo='Corolla'):
+        return EstadisticaMercado.objects.get(marca='Toyota', modelo=modelo, año=2020, categoria='Sedán')
+
+    def test_las_senales_ajustan_el_grupo_y_lo_marcan_desactualizado(self):
+        primero = crear_vehiculo(1, modelo='Corolla', precio=20000)
+        grupo = self.grupo()
+        # Un solo vehículo: los percentiles son exactos
+        self.assertEqual((grupo.cantidad, grupo.mediana, grupo.desactualizada), (1, 20000, False))
+
+        crear_vehiculo(2, modelo='Corolla', precio=10000)
+        grupo = self.grupo()
+        self.assertEqual((grupo.cantidad, grupo.precio_min, grupo.precio_max), (2, 10000, 20000))
+        self.assertEqual(grupo.precio_promedio, 15000)
+        self.assertTrue(grupo.desactualizada)
+
+        primero.modelo = 'Yaris'
+        primero.save()
+        self.assertEqual(self.grupo().cantidad, 1)
+        self.assertEqual(self.grupo('Yaris').cantidad, 1)
+
+    def test_la_reconstruccion_calcula_percentiles_como_numpy(self):
+        import numpy as np
+
+        precios = [12000, 9000, 30000, 15500, 21000, 18000, 9900]
+        for numero, precio in enumerate(precios):
+            crear_vehiculo(numero, modelo='Corolla', precio=precio)
+        crear_vehiculo(99, modelo='Yaris', precio=5000, activo=False)
+
+        call_command('reconstruir_estadisticas', stdout=io.StringIO())
+        grupo = self.grupo()
+        self.assertFalse(grupo.desactualizada)
+        self.assertEqual((grupo.cantidad, grupo.precio_min, grupo.precio_max), (7, 9000, 30000))
+        for nombre, q in PERCENTILES:
+            self.assertAlmostEqual(float(getattr(grupo, nombre)), np.percentile(precios, q * 100), places=2)
+        self.assertFalse(EstadisticaMercado.objects.filter(modelo='Yaris').exists())
+
+    def test_grupos_vaciados_se_borran_en_la_pasada_incremental(self):
+        vehiculo = crear_vehiculo(1, modelo='Corolla')
+        vehiculo.activo = False
+        vehiculo.save()
+        self.assertEqual(self.grupo().cantidad, 0)
+
+        call_command('reconstruir_estadisticas', desactualizadas=True, stdout=io.StringIO())
+        self.assertFalse(EstadisticaMercado.objects.exists())
+
+    def test_el_endpoint_lee_solo_la_tabla_materializada(self):
+        crear_vehiculo(1, modelo='Corolla', precio=20000)
+        crear_vehiculo(2, modelo='Yaris', precio=15000)
+        with self.assertNumQueries(1):
+            response = self.client.get('/vehiculo/api/estadisticas/', {'modelo': 'Corolla', 'año': '2020'})
+        datos = response.json()['estadisticas']
+        self.assertEqual(len(datos), 1)
+        self.assertEqual((datos[0]['cantidad'], datos[0]['mediana']), (1, '20000.00'))
+        self.assertEqual(self.client.get('/vehiculo/api/estadisticas/', {'año': 'x'}).status_code, 400)
+
+
+class ImageProxyTests(SimpleTestCase):
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        parche = mock.patch.multiple(
+            image_proxy,
+            _cache=image_proxy.DiskLRUCache(directorio.name, 1024 * 1024),
+            _fallos=image_proxy.FallosRecientes(60),
+        )
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def redireccion(self, destino):
+        response = mock.MagicMock(is_redirect=True, headers={'Location': destino})
+        return mock.patch('vehiculo.image_proxy.requests.get', return_value=response)
+
+    def test_no_sigue_redirecciones_a_hosts_no_permitidos(self):
+        with self.redireccion('http://169.254.169.254/latest/meta-data') as get:
+            _data, _tipo, cacheable = image_proxy.get_image('https://picsum.photos/seed/a/800/600', 'thumb')
+        self.assertFalse(cacheable)
+        self.assertEqual(get.call_count, 1)
+        self.assertFalse(get.call_args.kwargs['allow_redirects'])
+
+    def test_un_fallo_no_se_reintenta_durante_la_cache_negativa(self):
+        src = 'https://picsum.photos/seed/b/800/600'
+        with self.redireccion('http://evil.example/') as get:
+            image_proxy.get_image(src, 'thumb')
+            _data, _tipo, cacheable = image_proxy.get_image(src, 'thumb')
+        self.assertFalse(cacheable)
+        self.assertEqual(get.call_count, 1)
+
+    def abrir_circuito(self, proveedor):
+        parche = mock.patch.dict(registry._health, {proveedor: ProviderHealth(cooldown=60)})
+        parche.start()
+        self.addCleanup(parche.stop)
+        registry._health[proveedor]._open()
+
+    def test_circuito_abierto_sirve_el_placeholder_sin_descargar(self):
+        self.abrir_circuito('picsum')
+        with mock.patch('vehiculo.image_proxy.requests.get') as get:
+            _data, _tipo, cacheable = image_proxy.get_image('https://picsum.photos/seed/c/800/600', 'thumb')
+        self.assertFalse(cacheable)
+        get.assert_not_called()
+
+    def test_las_urls_de_respaldo_se_marcan_como_provisionales(self):
+        with registry.track_fallbacks() as tracker:
+            registry.image_url('Toyota', 'Corolla', provider='picsum')
+        self.assertFalse(tracker.used)
+        self.abrir_circuito('picsum')
+        with registry.track_fallbacks() as tracker:
+            url = registry.image_url('Toyota', 'Corolla', provider='picsum')
+        self.assertTrue(tracker.used)
+        self.assertNotIn('picsum', url)
+
+    def test_emitir_urls_no_consume_la_prueba_del_circuito(self):
+        self.abrir_circuito('picsum')
+        registry._health['picsum'].opened_at -= 60
+        for _ in range(2):
+            url = registry.build_url('Toyota', 'Corolla', provider='picsum')
+        self.assertIn('picsum', url)
+        self.assertEqual(registry._health['picsum'].state, ProviderHealth.OPEN)
+
+        self.assertTrue(registry.allow_url(url))
+        self.assertFalse(registry.allow_url(url))
+        registry.record_url(url, 0.01, ok=True)
+        self.assertEqual(registry._health['picsum'].state, ProviderHealth.CLOSED)
+
+    def test_image_provider_es_abstracto(self):
+        with self.assertRaises(TypeError):
+            ImageProvider()
+
+
+class VehiculosBatchApiTests(TestCase):
+
+    def test_ids_fuera_de_rango_o_no_ascii_son_400(self):
+        for ids in ('1,99999999999999999999999', '²', '1,-2'):
+            response = self.client.get('/vehiculo/api/vehiculos/batch/', {'ids': ids})
+            self.assertEqual(response.status_code, 400, ids)
+
+    def test_los_inactivos_se_informan_como_no_encontrados(self):
+        activo = crear_vehiculo(1)
+        inactivo = crear_vehiculo(2, activo=False)
+        response = self.client.get(
+            '/vehiculo/api/vehiculos/batch/', {'ids': f'{inactivo.pk},{activo.pk}', 'fields': 'id'},
+        )
+        datos = response.json()
+        self.assertEqual([v['id'] for v in datos['vehiculos']], [activo.pk])
+        self.assertEqual(datos['not_found'], [inactivo.pk])
+
+
+def eventos_sse(partes):
+    """``(id, tipo, vehiculo_id)`` de cada evento con datos en el cuerpo SSE."""
+    resultado = []
+    for parte in partes:
+        campos = dict(linea.split(': ', 1) for linea in parte.strip().splitlines() if ': ' in linea)
+        if 'event' in campos:
+            resultado.append((int(campos['id']), campos['event'], json.loads(campos['data'])['id']))
+    return resultado
+
+
+async def consumir(filtros, ultimo_id=None):
+    return [parte async for parte in eventos.flujo(filtros, ultimo_id)]
+
+
+@override_settings(VEHICULO_SSE={'COMMIT_MARGIN': 0, 'POLL_INTERVAL': 0.05, 'MAX_DURATION': 0.5})
+class EventosSseTests(TestCase):
+
+    def test_coincide_filtra_altas_pero_no_bajas(self):
+        toyota = CambioVehiculo(tipo=CambioVehiculo.CREADO, marca='Toyota', categoria='SUV', precio=20000, activo=True)
+        filtros = eventos.parse_filtros({'marca': 'Toyota', 'precio_max': '25000'})
+        self.assertTrue(eventos.coincide(toyota, filtros))
+        self.assertFalse(eventos.coincide(toyota, {**filtros, 'categoria': 'Sedán'}))
+        self.assertFalse(eventos.coincide(toyota, {**filtros, **eventos.parse_filtros({'precio_min': '20000.01'})}))
+        honda = CambioVehiculo(tipo=CambioVehiculo.ELIMINADO, marca='Honda', categoria='SUV', precio=90000, activo=True)
+        self.assertTrue(eventos.coincide(honda, filtros))
+        honda.tipo, honda.activo = CambioVehiculo.ACTUALIZADO, False
+        self.assertTrue(eventos.coincide(honda, filtros))
+
+    def test_la_marca_filtra_igual_que_vehiculos_api(self):
+        for numero, marca in enumerate(['Toyota', 'TOYOTA', 'Honda'], start=1):
+            crear_vehiculo(numero, marca=marca)
+        for valor in ('toy', 'Toyota', 'onda'):
+            with self.subTest(marca=valor):
+                listado = VehicleFilterService().perform_operation(filters={'marca': valor})
+                filtros = eventos.parse_filtros({'marca': valor})
+                feed = [c.vehiculo_id for c in CambioVehiculo.objects.all() if eventos.coincide(c, filtros)]
+                self.assertEqual(sorted(feed), sorted(listado.values_list('id', flat=True)))
+
+    def test_last_event_id_reanuda_desde_el_siguiente_cambio(self):
+        crear_vehiculo(1)
+        corte = CambioVehiculo.objects.latest('id').pk
+        segundo, tercero = crear_vehiculo(2), crear_vehiculo(3)
+
+        recibidos = eventos_sse(async_to_sync(consumir)({}, corte))
+        self.assertEqual([(tipo, vid) for _, tipo, vid in recibidos], [('creado', segundo.pk), ('creado', tercero.pk)])
+        self.assertTrue(all(id_evento > corte for id_evento, _, _ in recibidos))
+
+    def test_bajas_se_envian_aunque_no_coincidan_con_el_filtro(self):
+        toyota = crear_vehiculo(1)
+        honda = crear_vehiculo(2, marca='Honda')
+        desactivado = crear_vehiculo(3, marca='Honda')
+        honda_id = honda.pk
+        honda.delete()
+        desactivado.activo = False
+        desactivado.save()
+
+        recibidos = eventos_sse(async_to_sync(consumir)({'marca': 'Toyota'}, 0))
+        self.assertEqual(
+            [(tipo, vid) for _, tipo, vid in recibidos],
+            [('creado', toyota.pk), ('eliminado', honda_id), ('actualizado', desactivado.pk)],
+        )
+
+    def test_un_solo_sondeo_reparte_a_todas_las_conexiones(self):
+        async def escenario():
+            tareas = [asyncio.create_task(consumir({})), asyncio.create_task(consumir({'marca': 'Honda'}))]
+            await asyncio.sleep(0.1)
+            await sync_to_async(crear_vehiculo)(1, marca='Honda')
+            return await asyncio.gather(*tareas)
+
+        with mock.patch.object(eventos, 'aultimo_id', side_effect=eventos.aultimo_id) as inicio_sondeo:
+            todos, hondas = async_to_sync(escenario)()
+        self.assertEqual(inicio_sondeo.call_count, 1)
+        self.assertEqual([tipo for _, tipo, _ in eventos_sse(todos)], ['creado'])
+        self.assertEqual(eventos_sse(todos), eventos_sse(hondas))
+
+
+@override_settings(VEHICULO_DELTA={'MARGEN': 0, 'RETENCION_DIAS': 30})
+class VehiculosDeltaApiTests(TestCase):
+    URLS = ('/vehiculo/api/vehiculos/', '/vehiculo/api/async/vehiculos/')
+
+    def test_el_token_devuelve_cambios_y_bajas(self):
+        for base, url in enumerate(self.URLS):
+            with self.subTest(url=url):
+                borrado, desactivado, editado = (crear_vehiculo(base * 10 + n) for n in (1, 2, 3))
+                token = self.client.get(url).json()['token']
+
+                nuevo = crear_vehiculo(base * 10 + 4)
+                editado.precio = 9999
+                editado.save()
+                desactivado.activo = False
+                desactivado.save()
+                borrado_id = borrado.pk
+                borrado.delete()
+
+                datos = self.client.get(url, {'since': token, 'fields': 'id'}).json()
+                self.assertEqual([v['id'] for v in datos['vehiculos']], [nuevo.pk, editado.pk])
+                self.assertEqual(datos['eliminados'], sorted([borrado_id, desactivado.pk]))
+
+                datos = self.client.get(url, {'since': datos['token']}).json()
+                self.assertEqual((datos['vehiculos'], datos['eliminados']), ([], []))
+
+    def test_un_vehiculo_reactivado_no_figura_como_baja(self):
+        vehiculo = crear_vehiculo(1)
+        token = self.client.get(self.URLS[0]).json()['token']
+        vehiculo.activo = False
+        vehiculo.save()
+        vehiculo.activo = True
+        vehiculo.save()
+
+        datos = self.client.get(self.URLS[0], {'since': token, 'fields': 'id'}).json()
+        self.assertEqual(([v['id'] for v in datos['vehiculos']], datos['eliminados']), ([vehiculo.pk], []))
+
+    @override_settings(VEHICULO_DELTA={'MARGEN': 60.0, 'RETENCION_DIAS': 30})
+    def test_una_fila_confirmada_tarde_entra_en_un_delta_posterior(self):
+        url = self.URLS[0]
+        token = self.client.get(url).json()['token']
+        # Guardada hace 30 s y confirmada después de la lectura anterior
+        vehiculo = crear_vehiculo(1)
+        Vehiculo.objects.filter(pk=vehiculo.pk).update(fecha_actualizacion=timezone.now() - timedelta(seconds=30))
+
+        datos = self.client.get(url, {'since': token, 'fields': 'id'}).json()
+        self.assertEqual(datos['vehiculos'], [])  # Aún dentro del margen
+        despues = timezone.now() + timedelta(seconds=61)
+        with mock.patch('django.utils.timezone.now', return_value=despues):
+            datos = self.client.get(url, {'since': datos['token'], 'fields': 'id'}).json()
+        self.assertEqual([v['id'] for v in datos['vehiculos']], [vehiculo.pk])
+
+    def test_since_con_filtros_es_400_y_token_vencido_es_410(self):
+        vencido = delta.crear_token(timezone.now() - timedelta(days=31))
+        for url in self.URLS:
+            with self.subTest(url=url):
+                token = self.client.get(url).json()['token']
+                response = self.client.get(url, {'since': token, 'marca': 'Toyota'})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(self.client.get(url, {'since': 'otro'}).status_code, 400)
+                self.assertEqual(self.client.get(url, {'since': vencido}).status_code, 410)
+
+    def test_un_listado_filtrado_no_da_token(self):
+        crear_vehiculo(1)
+        for url in self.URLS:
+            with self.subTest(url=url):
+                datos = self.client.get(url, {'marca': 'Toyota'}).json()
+                self.assertEqual(datos['total_count'], 1)
+                self.assertNotIn('token', datos)
+
+
+class LogosMarcaTests(SimpleTestCase):
+
+    def test_el_manifest_cubre_todas_las_marcas_con_archivos_existentes(self):
+        with open(vehiculo_tags.BRAND_LOGOS_MANIFEST, encoding='utf-8') as fh:
+            manifest = json.load(fh)
+        self.assertEqual(set(manifest['logos']), {marca for marca, _ in Vehiculo.MARCAS})
+        rutas = [*manifest['logos'].values(), manifest['placeholder'], *manifest['sprite'].values()]
+        for ruta in (r for r in rutas if isinstance(r, str)):
+            self.assertTrue((vehiculo_tags.BRAND_LOGOS_MANIFEST.parent.parent.parent / ruta).is_file(), ruta)
+
+    def test_logo_de_marca_o_placeholder_local(self):
+        self.assertRegex(vehiculo_tags.get_brand_logo_url('Toyota'), r'^/static/img/marcas/toyota\.[0-9a-f]{12}\.png$')
+        self.assertEqual(vehiculo_tags.get_brand_logo_url('Desconocida'), vehiculo_tags.BRAND_LOGO_PLACEHOLDER)
+        self.assertIn('placeholder', vehiculo_tags.BRAND_LOGO_PLACEHOLDER)
+
+
+class MediaTemporalTestCase(TestCase):
+    """MEDIA_ROOT en un directorio temporal por test."""
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.media = directorio.name
+        ajustes = self.settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def crear_archivo(self, nombre, horas=0):
+        ruta = os.path.join(self.media, nombre)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, 'wb') as fh:
+            fh.write(b'imagen')
+        instante = time.time() - horas * 3600
+        os.utime(ruta, (instante, instante))
+        return ruta
+
+
+class LimpiarMediaTests(MediaTemporalTestCase):
+
+    def test_borra_solo_los_huerfanos_antiguos(self):
+        referenciado = self.crear_archivo('vehiculos/ab/cd/usado.jpg', horas=48)
+        huerfano = self.crear_archivo('vehiculos/ef/01/huerfano.jpg', horas=48)
+        reciente = self.crear_archivo('vehiculos/ef/01/subiendo.jpg')
+        crear_vehiculo(1, imagen_principal='vehiculos/ab/cd/usado.jpg')
+
+        call_command('limpiar_media', dry_run=True, stdout=io.StringIO())
+        self.assertTrue(os.path.exists(huerfano))
+
+        salida = io.StringIO()
+        call_command('limpiar_media', workers=2, stdout=salida)
+        self.assertFalse(os.path.exists(huerfano))
+        self.assertTrue(os.path.exists(referenciado))
+        self.assertTrue(os.path.exists(reciente))
+        self.assertIn('1 huérfanos', salida.getvalue())
+
+
+class FragmentarMediaTests(MediaTemporalTestCase):
+
+    def test_las_subidas_se_reparten_por_hash(self):
+        primera = vehiculo_image_path(None, 'Toyota_Corolla_2020.JPG')
+        segunda = vehiculo_image_path(None, 'Toyota_Corolla_2020.JPG')
+        self.assertNotEqual(primera, segunda)
+        self.assertTrue(es_ruta_fragmentada(primera))
+        self.assertTrue(primera.endswith('.jpg'))
+        self.assertFalse(es_ruta_fragmentada('vehiculos/Toyota_Corolla_2020.jpg'))
+
+    def test_mueve_los_archivos_antiguos_y_actualiza_la_fila(self):
+        antiguo = self.crear_archivo('vehiculos/Toyota_Corolla_2020.jpg')
+        vehiculo = crear_vehiculo(1, imagen_principal='vehiculos/Toyota_Corolla_2020.jpg',
+                                  imagen_2='vehiculos/no_existe.jpg')
+
+        call_command('fragmentar_media', stdout=io.StringIO())
+        movido = Vehiculo.objects.get(pk=vehiculo.pk)
+        self.assertTrue(es_ruta_fragmentada(movido.imagen_principal.name))
+        self.assertTrue(os.path.exists(os.path.join(self.media, movido.imagen_principal.name)))
+        self.assertFalse(os.path.exists(antiguo))
+        self.assertEqual(movido.imagen_2.name, 'vehiculos/no_existe.jpg')
+        self.assertGreater(movido.fecha_actualizacion, vehiculo.fecha_actualizacion)
+
+
+@override_settings(CACHES=CACHES_EN_MEMORIA)
+class TwoTierCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.cache = TwoTierCache()
+
+    def test_invalidate_deja_obsoletas_las_claves_en_l1_y_l2(self):
+        self.cache.set('filtros', 'marcas', ['Toyota'])
+        self.assertEqual(self.cache.get('filtros', 'marcas'), ['Toyota'])
+        self.cache.invalidate('filtros')
+        self.assertIsNone(self.cache.get('filtros', 'marcas'))
+        self.assertEqual(self.cache.stats()['namespaces']['filtros']['invalidations'], 1)
+
+    def test_una_version_desalojada_no_revive_valores_viejos(self):
+        self.cache.set('filtros', 'marcas', ['Toyota'])
+        versiones = {self.cache.version('filtros')}
+        for _ in range(2):
+            self.cache.invalidate('filtros')
+            versiones.add(self.cache.version('filtros'))
+        self.assertEqual(len(versiones), 3)
+
+        # El culling de L2 borra la clave de versión
+        caches['default'].delete(self.cache._version_key('filtros'))
+        self.cache.l1.clear()
+        self.assertNotIn(self.cache.version('filtros'), versiones)
+        self.assertIsNone(self.cache.get('filtros', 'marcas'))
+
+    def test_get_or_set_calcula_una_sola_vez_entre_hilos(self):
+        llamadas = []
+        barrera = threading.Barrier(4)
+
+        def calcular():
+            llamadas.append(1)
+            time.sleep(0.05)
+            return 42
+
+        def leer():
+            barrera.wait()
+            resultados.append(self.cache.get_or_set('filtros', 'total', calcular))
+
+        resultados = []
+        hilos = [threading.Thread(target=leer) for _ in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(resultados, [42] * 4)
+        self.assertEqual(len(llamadas), 1)
+
+
+class ContadoresCatalogoTests(TestCase):
+
+    def setUp(self):
+        self.addCleanup(contadores.invalidar)
+
+    def test_las_senales_mantienen_los_contadores(self):
+        crear_vehiculo(1, categoria='SUV')
+        segundo = crear_vehiculo(2)
+        segundo.activo = False
+        segundo.save()
+        crear_vehiculo(3).delete()
+
+        valores = dict(ContadorCatalogo.objects.values_list('clave', 'valor'))
+        self.assertEqual(valores['total'], 2)
+        self.assertEqual((valores['activo:1'], valores['activo:0']), (1, 1))
+        self.assertEqual(valores['categoria:SUV'], 1)
+        self.assertEqual(valores['categoria:Sedán'], 0)
+        self.assertEqual(dict(contadores.contar_desde_tabla()), {k: v for k, v in valores.items() if v})
+
+    def test_reconciliar_corrige_lo_que_update_no_registra(self):
+        crear_vehiculo(1)
+        Vehiculo.objects.update(activo=False)
+        self.assertEqual(ContadorCatalogo.objects.get(clave='activo:1').valor, 1)
+
+        salida = io.StringIO()
+        call_command('reconciliar_contadores', stdout=salida)
+        valores = dict(ContadorCatalogo.objects.values_list('clave', 'valor'))
+        self.assertEqual((valores['activo:1'], valores['activo:0'], valores['categoria:Sedán']), (0, 1, 0))
+        self.assertIn('corregidos', salida.getvalue())
+
+
+class ContadoresFavoritosTests(TestCase):
+
+    def setUp(self):
+        self.ana = User.objects.create_user('ana', password='x')
+        self.beto = User.objects.create_user('beto', password='x')
+        self.vehiculo = crear_vehiculo(1)
+        self.otro = crear_vehiculo(2)
+        for usuario in (self.ana, self.beto):
+            agregar_favorito(usuario.pk, self.vehiculo.pk)
+        agregar_favorito(self.ana.pk, self.otro.pk)
+
+    def total_usuario(self, usuario):
+        return EstadisticaUsuario.objects.get(usuario=usuario).total_favoritos
+
+    def test_los_borrados_en_cascada_descuentan_favoritos(self):
+        self.vehiculo.refresh_from_db()
+        self.assertEqual((self.vehiculo.total_favoritos, self.total_usuario(self.ana)), (2, 2))
+
+        self.vehiculo.delete()
+        self.assertEqual((self.total_usuario(self.ana), self.total_usuario(self.beto)), (1, 0))
+        self.ana.delete()
+        self.otro.refresh_from_db()
+        self.assertEqual(self.otro.total_favoritos, 0)
+
+    def test_reconciliar_corrige_favoritos_de_vehiculos_y_usuarios(self):
+        Favorito.objects.filter(usuario=self.beto).delete()
+        Vehiculo.objects.filter(pk=self.otro.pk).update(total_favoritos=7)
+
+        call_command('reconciliar_contadores', stdout=io.StringIO())
+        self.vehiculo.refresh_from_db()
+        self.otro.refresh_from_db()
+        self.assertEqual((self.vehiculo.total_favoritos, self.otro.total_favoritos), (1, 1))
+        self.assertEqual((self.total_usuario(self.ana), self.total_usuario(self.beto)), (2, 0))
+
+
+@override_settings(CACHES=CACHES_EN_MEMORIA)
+class TarjetasCacheadasTests(TestCase):
+    PLANTILLA = 'vehiculo/partials/tarjeta_vehiculo.html'
+
+    def setUp(self):
+        caches['default'].clear()
+        vehiculo_cache.l1.clear()
+
+    def renderizar(self, vehiculos):
+        with mock.patch('vehiculo.fragmentos.get_template', wraps=fragmentos.get_template) as cargar:
+            tarjetas = fragmentos.renderizar_tarjetas(vehiculos, self.PLANTILLA, 'thumb')
+        return [html for _, html in tarjetas], cargar.call_count
+
+    def test_la_tarjeta_se_reutiliza_hasta_que_cambia_el_vehiculo(self):
+        vehiculo = crear_vehiculo(1)
+        primera, renders = self.renderizar([vehiculo])
+        self.assertEqual(renders, 1)
+        self.assertIn('Corolla 1', primera[0])
+
+        segunda, renders = self.renderizar([Vehiculo.objects.get(pk=vehiculo.pk)])
+        self.assertEqual((segunda, renders), (primera, 0))
+
+        vehiculo.modelo = 'Yaris'
+        vehiculo.save()
+        tercera, renders = self.renderizar([vehiculo])
+        self.assertEqual(renders, 1)
+        self.assertIn('Yaris', tercera[0])
+
+    def test_una_pagina_renderiza_solo_las_tarjetas_ausentes(self):
+        vehiculos = [crear_vehiculo(n) for n in range(3)]
+        self.renderizar(vehiculos[:1])
+        with mock.patch.object(vehiculo_cache, 'set_many', wraps=vehiculo_cache.set_many) as guardar:
+            tarjetas, _ = self.renderizar(vehiculos)
+        self.assertEqual(len(tarjetas), 3)
+        self.assertEqual(len(guardar.call_args.args[1]), 2)
+
+
+@override_settings(CACHES=CACHES_EN_MEMORIA)
+class CachePaginasTests(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        vehiculo_cache.l1.clear()
+
+    def test_la_portada_anonima_se_sirve_de_la_cache_hasta_que_cambia_el_catalogo(self):
+        primera = self.client.get('/')
+        self.assertEqual(primera['X-Page-Cache'], 'MISS')
+        segunda = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual((segunda['X-Page-Cache'], segunda['Content-Encoding']), ('HIT', 'gzip'))
+        self.assertEqual(self.client.get('/', HTTP_IF_NONE_MATCH=primera['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            crear_vehiculo(1)
+        self.assertEqual(self.client.get('/')['X-Page-Cache'], 'MISS')
+
+    def test_usuarios_y_query_string_no_usan_la_cache(self):
+        self.assertNotIn('X-Page-Cache', self.client.get('/', {'utm': 'x'}))
+        self.client.force_login(User.objects.create_user('ana', password='x'))
+        self.assertNotIn('X-Page-Cache', self.client.get('/'))
+
+
+class CambiarTemaTests(TestCase):
+
+    def setUp(self):
+        self.client = Client(enforce_csrf_checks=True)
+
+    def test_post_del_mismo_sitio_fija_la_cookie_sin_token(self):
+        response = self.client.post('/tema/', {'tema': 'dark', 'next': '/vehiculo/lista/'},
+                                    HTTP_SEC_FETCH_SITE='same-origin')
+        self.assertRedirects(response, '/vehiculo/lista/', fetch_redirect_response=False)
+        self.assertIn('tema', response.cookies)
+        response = self.client.post('/tema/', {'tema': 'light'}, HTTP_ORIGIN='http://testserver')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.get('/vehiculo/lista/').wsgi_request.get_signed_cookie(
+            'tema', salt='vehiculo.tema'), 'light')
+
+    def test_post_de_otro_sitio_sin_token_es_403(self):
+        for cabeceras in ({'HTTP_SEC_FETCH_SITE': 'cross-site'}, {'HTTP_ORIGIN': 'https://evil.example'}, {}):
+            response = self.client.post('/tema/', {'tema': 'dark'}, **cabeceras)
+            self.assertEqual(response.status_code, 403, cabeceras)
+            self.assertNotIn('tema', response.cookies)
+
+    def test_post_con_token_sigue_funcionando(self):
+        self.client.get('/auth/')
+        token = self.client.cookies['csrftoken'].value
+        response = self.client.post('/tema/', {'tema': 'dark'}, HTTP_X_CSRFTOKEN=token,
+                                    HTTP_SEC_FETCH_SITE='cross-site')
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(CACHES=CACHES_EN_MEMORIA)
+class WarmupTests(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        vehiculo_cache.l1.clear()
+
+    def test_warmup_compila_plantillas_y_ceba_las_tarjetas(self):
+        vehiculo = crear_vehiculo(1)
+        salida = io.StringIO()
+        call_command('warmup', tarjetas=5, stdout=salida)
+        self.assertIn('plantillas', salida.getvalue())
+        self.assertNotIn('con errores', salida.getvalue())
+        self.assertIn('1 tarjetas', salida.getvalue())
+
+        vehiculo_cache.l1.clear()
+        clave = fragmentos.clave_tarjeta('vehiculo/partials/tarjeta_vehiculo.html', vehiculo, 'full', 'light')
+        self.assertIn(clave, vehiculo_cache.get_many(fragmentos.NAMESPACE, [clave]))
+
+    def test_un_fallo_al_arrancar_no_impide_el_arranque(self):
+        with mock.patch.object(warmup, 'PASOS_ARRANQUE', (('roto', mock.Mock(side_effect=ImportError)),)):
+            with self.assertLogs('vehiculo.warmup', 'ERROR'):
+                warmup.al_arrancar()
+
+
+class SparseFieldsetsTests(TestCase):
+
+    def test_parse_fields_y_expand(self):
+        self.assertEqual(parse_fields(None), CAMPOS_POR_DEFECTO)
+        self.assertEqual(parse_fields(' precio, id ,precio'), ('precio', 'id'))
+        self.assertEqual(parse_expand(''), ())
+        self.assertEqual(parse_expand('imagenes,vendedor'), ('imagenes', 'vendedor'))
+        for valor in (',', ' ', ' , ', 'id,clave_secreta'):
+            with self.subTest(valor=valor), self.assertRaises(ValueError):
+                parse_fields(valor)
+        with self.assertRaises(ValueError):
+            parse_expand('vendedor,favoritos')
+
+    def test_la_api_devuelve_solo_los_campos_pedidos(self):
+        vendedor = User.objects.create_user('vendedor', password='x')
+        crear_vehiculo(1, vendedor=vendedor)
+        datos = self.client.get('/vehiculo/api/vehiculos/', {'fields': 'id,precio', 'expand': 'vendedor'}).json()
+        vehiculo, = datos['vehiculos']
+        self.assertEqual(set(vehiculo), {'id', 'precio', 'vendedor'})
+        self.assertEqual(vehiculo['vendedor'], {'id': vendedor.pk, 'username': 'vendedor'})
+
+    def test_una_lista_de_campos_vacia_es_400(self):
+        crear_vehiculo(1)
+        for url in ('/vehiculo/api/vehiculos/', '/vehiculo/api/async/vehiculos/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url, {'fields': ','}).status_code, 400)
+
+
+@override_settings(CACHES=CACHES_EN_MEMORIA)
+class VistasAsyncTests(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        vehiculo_cache.l1.clear()
+        self.usuario = User.objects.create_user('ana', password='x')
+        self.vehiculo = crear_vehiculo(1, vendedor=self.usuario, imagen_principal='vehiculos/ab/cd/foto.jpg')
+        crear_vehiculo(2, marca='Honda')
+
+    async def test_el_listado_async_responde_igual_que_el_sync(self):
+        for params in ({}, {'marca': 'Honda'}, {'fields': 'id,precio', 'expand': 'vendedor,imagenes'}):
+            with self.subTest(params=params):
+                sync = (await sync_to_async(self.client.get)('/vehiculo/api/vehiculos/', params)).json()
+                asinc = (await self.async_client.get('/vehiculo/api/async/vehiculos/', params)).json()
+                # El token lleva el instante de cada lectura
+                self.assertEqual('token' in asinc, 'token' in sync)
+                sync.pop('token', None)
+                asinc.pop('token', None)
+                self.assertEqual(asinc, sync)
+
+    async def test_detalle_y_toggle_async(self):
+        url = f'/vehiculo/api/async/vehiculos/{self.vehiculo.pk}/'
+        self.assertEqual((await self.async_client.get(url)).status_code, 302)
+
+        await self.async_client.aforce_login(self.usuario)
+        detalle = (await self.async_client.get(url)).json()['vehiculo']
+        self.assertEqual((detalle['id'], detalle['vendedor']['username']), (self.vehiculo.pk, 'ana'))
+        self.assertFalse(detalle['is_favorite'])
+
+        toggle = f'/vehiculo/api/async/favorito/{self.vehiculo.pk}/toggle/'
+        self.assertEqual((await self.async_client.post(toggle)).status_code, 200)
+        self.assertTrue((await self.async_client.get(url)).json()['vehiculo']['is_favorite'])
+        self.assertTrue(await Favorito.objects.filter(usuario=self.usuario).aexists())
+        self.assertEqual((await self.async_client.post(toggle)).status_code, 200)
+        self.assertFalse(await Favorito.objects.filter(usuario=self.usuario).aexists())
+
+        self.assertEqual((await self.async_client.get('/vehiculo/api/async/vehiculos/999/')).status_code, 404)
+        self.assertEqual((await self.async_client.post('/vehiculo/api/async/favorito/999/toggle/')).status_code, 404)
+
+
+@override_settings(CACHES=CACHES_EN_MEMORIA)
+class CodificacionJsonTests(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        vehiculo_cache.l1.clear()
+
+    def test_el_json_precalculado_coincide_con_json_dumps_por_lotes(self):
+        vendedor = User.objects.create_user('vendedör', password='x')
+        for numero in range(5):
+            crear_vehiculo(numero, modelo=f'Coro"lla\\ ñ {numero}', vendedor=vendedor if numero % 2 else None,
+                           imagen_principal='vehiculos/ab/cd/foto.jpg' if numero == 3 else None)
+        serializer = VehiculoSerializer(CAMPOS, ('vendedor', 'imagenes'))
+        queryset = Vehiculo.objects.order_by('pk')
+
+        esperado = json.loads(json.dumps(serializer.serialize(queryset), cls=DjangoJSONEncoder))
+        for chunk_size in (2, 5, 2000):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(json.loads(serializer.serialize_json(queryset, chunk_size=chunk_size)), esperado)
+        self.assertEqual(serializer.serialize_json(queryset.none()), '[]')
+
+    def test_el_listado_se_comprime_con_gzip(self):
+        for numero in range(20):
+            crear_vehiculo(numero)
+        response = self.client.get('/vehiculo/api/vehiculos/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))['vehiculos']), 20)
@@ -8,11 +8,22 @@ urlpatterns = [
     path('registro/', views.agregar_vehiculo, name='registro'),  
     path('lista/', views.listar_vehiculos, name='lista'),
     path('api/vehiculos/', views.vehiculos_api, name='vehiculos_api'),
+    path('api/vehiculos/batch/', views.vehiculos_batch_api, name='vehiculos_batch'),
+    path('api/vehiculos/eventos/', views.vehiculos_eventos, name='vehiculos_eventos'),
+    path('api/estadisticas/', views.estadisticas_api, name='estadisticas'),
+    path('api/async/vehiculos/', views.vehiculos_api_async, name='vehiculos_api_async'),
+    path('api/async/vehiculos/<int:pk>/', views.detalle_vehiculo_api_async, name='detalle_api_async'),
+    path('api/async/favorito/<int:pk>/toggle/', views.toggle_favorito_async, name='toggle_favorito_async'),
+    path('api/imagenes/salud/', views.imagenes_salud_api, name='imagenes_salud'),
+    path('api/cache/estadisticas/', views.cache_estadisticas_api, name='cache_estadisticas'),
+    path('api/ratelimit/estadisticas/', views.ratelimit_estadisticas_api, name='ratelimit_estadisticas'),
     
     # Nuevas rutas: perfil, favoritos y detalle
     path('perfil/', views.perfil_usuario, name='perfil'),
     path('favoritos/', views.favoritos_usuario, name='favoritos'),
     path('<int:pk>/', views.detalle_vehiculo, name='detalle'),
+    path('favorito/<int:pk>/', views.favorito, name='favorito'),
     path('favorito/<int:pk>/toggle/', views.toggle_favorito, name='toggle_favorito'),
+    path('favoritos/batch/', views.favoritos_batch, name='favoritos_batch'),
 ]
 
@@ -3,22 +3,46 @@ Views refactorizadas siguiendo principios SOLID y clean code.
 Cada vista tiene una responsabilidad específica y usa los servicios apropiados.
 """
 
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.models import User
-from django.http import JsonResponse
+from django.http import (
+    JsonResponse, HttpResponse, HttpResponseBadRequest, HttpResponseNotModified, Http404, StreamingHttpResponse,
+)
+from django.views.decorators.csrf import csrf_protect
+from django.views.decorators.gzip import gzip_page
 from django.views.decorators.http import require_http_methods
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.contrib import messages
-
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from . import cdn_config, delta, estadisticas, eventos, image_proxy
+from .cache import vehiculo_cache
+from .cache_paginas import cache_anonimo
+from .context_processors import TEMAS, guardar_tema
+from .image_providers import registry as image_registry
+from .ratelimit import limiter
 from .models import Vehiculo, Favorito
 from .forms import VehiculoForm, CustomUserCreationForm
+from .serializers import CAMPOS, VehiculoSerializer, parse_expand, parse_fields, parse_ids
 from .services.vehicle_filter_service import VehicleFilterService
 from .services.vehicle_management_service import (
     VehicleCreationService, 
     VehicleUpdateService
 )
+from .services.favorite_service import (
+    FavoriteBatchService, FavoriteToggleService, agregar_favorito, quitar_favorito,
+    total_favoritos_usuario, total_favoritos_vehiculo,
+)
 
 
 class VehicleViewMixin:
@@ -270,10 +294,12 @@ class AuthenticationHandler:
 # VISTAS DE PÁGINAS ESTÁTICAS
 # ============================================================================
 
+@cache_anonimo
 def index(request):
     """
     Vista para la página principal.
     Principio de responsabilidad única: solo maneja la presentación del índice.
+    La portada anónima se sirve desde la caché de páginas.
     """
     if request.user.is_authenticated:
         return render(request, 'vehiculo/index_authenticated.html')
@@ -281,23 +307,84 @@ def index(request):
         return render(request, 'vehiculo/index_unauthenticated.html')
 
 
+def _mismo_origen(request):
+    """El navegador declara que la petición sale de una página de este sitio."""
+    sitio = request.headers.get('Sec-Fetch-Site')
+    if sitio is not None:
+        return sitio == 'same-origin'
+    origen = request.headers.get('Origin')
+    return origen is not None and origen == f'{request.scheme}://{request.get_host()}'
+
+
+def csrf_mismo_origen(view):
+    """
+    Protección CSRF para formularios de páginas cacheadas, que no llevan
+    token: el POST se acepta si el navegador declara que viene de este
+    sitio (Sec-Fetch-Site u Origin, que una página ajena no puede falsear);
+    si no, se exige el token como en cualquier otra vista.
+    """
+    protegida = csrf_protect(view)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if _mismo_origen(request):
+            return view(request, *args, **kwargs)
+        return protegida(request, *args, **kwargs)
+    # El middleware no repite la comprobación: la hace el wrapper
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+@csrf_mismo_origen
+@require_http_methods(["POST"])
+def cambiar_tema(request):
+    """
+    Cambia el tema visual guardándolo en una cookie firmada.
+    El formulario vive en páginas cacheadas sin token CSRF: ver csrf_mismo_origen.
+    """
+    tema = request.POST.get('tema')
+    if tema not in TEMAS:
+        return HttpResponseBadRequest('Tema no válido')
+    
+    destino = request.POST.get('next', '')
+    if not url_has_allowed_host_and_scheme(destino, allowed_hosts={request.get_host()},
+                                           require_https=request.is_secure()):
+        destino = 'index'
+    
+    return guardar_tema(redirect(destino), tema)
+
+
 # ============================================================================
 # VISTAS API (JSON)
 # ============================================================================
 
 @require_http_methods(["GET"])
+@gzip_page
 def vehiculos_api(request):
     """
     API endpoint para obtener vehículos en formato JSON.
     Principio de responsabilidad única: solo maneja respuestas API.
+    
+    Parámetros opcionales:
+    - fields: campos a devolver, ej. ?fields=id,marca,precio (ver serializers.CAMPOS)
+    - expand: datos relacionados, ej. ?expand=vendedor,imagenes
+    - since: token de una respuesta anterior; devuelve solo los cambios
+      desde entonces y los ids 'eliminados' (ver vehiculo/delta.py). El
+      token solo viene en los listados sin filtros.
     """
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+        expand = parse_expand(request.GET.get('expand'))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    if 'since' in request.GET:
+        return _vehiculos_delta(request, fields, expand)
+    
+    # Tomado antes de leer: lo que se guarde durante la lectura entra en el próximo delta
+    corte = delta.corte_actual()
     filter_service = VehicleFilterService()
-    filters = {
-        'marca': request.GET.get('marca'),
-        'categoria': request.GET.get('categoria'),
-        'precio_min': request.GET.get('precio_min'),
-        'precio_max': request.GET.get('precio_max'),
-    }
+    filters = _filtros_listado(request)
     
     result = filter_service.execute(filters=filters)
     
@@ -307,23 +394,283 @@ def vehiculos_api(request):
             'error': result.get('message', 'Error al cargar vehículos')
         })
     
-    # Serializar vehículos para JSON
-    vehiculos_data = [
-        {
-            'id': v.id,
-            'marca': v.marca,
-            'modelo': v.modelo,
-            'año': v.año,
-            'precio': str(v.precio),
-            'categoria': v.categoria,
-        }
-        for v in result['vehiculos']
-    ]
+    # Codificar directo desde values_list, sin instanciar Vehiculo ni usar DjangoJSONEncoder
+    vehiculos_json = VehiculoSerializer(fields, expand).serialize_json(result['vehiculos'])
+    
+    return _respuesta_vehiculos(
+        vehiculos_json, total_count=result['total_count'], **_token_listado(filters, corte)
+    )
+
+
+def _filtros_listado(request):
+    return {
+        'marca': request.GET.get('marca'),
+        'categoria': request.GET.get('categoria'),
+        'precio_min': request.GET.get('precio_min'),
+        'precio_max': request.GET.get('precio_max'),
+    }
+
+
+def _token_listado(filters, corte):
+    """Token de sincronización solo para el catálogo completo: un listado filtrado no sincroniza."""
+    if any(filters.values()):
+        return {}
+    return {'token': delta.crear_token(corte)}
+
+
+def _leer_since(request):
+    """Instante del token ?since=, o la respuesta de error si no se puede usar."""
+    if any(_filtros_listado(request).values()):
+        return None, JsonResponse({
+            'success': False,
+            'error': 'since no admite filtros: el delta cubre todo el catálogo activo',
+        }, status=400)
+    
+    try:
+        return delta.leer_token(request.GET['since']), None
+    except delta.TokenVencido as e:
+        return None, JsonResponse({'success': False, 'error': str(e)}, status=410)
+    except delta.TokenInvalido as e:
+        return None, JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+
+def _vehiculos_delta(request, fields, expand):
+    """Rama ?since= de vehiculos_api: altas y cambios, bajas y el token siguiente."""
+    desde, error = _leer_since(request)
+    if error:
+        return error
+    
+    hasta = delta.corte_actual()
+    vehiculos_json = VehiculoSerializer(fields, expand).serialize_json(delta.vehiculos_cambiados(desde, hasta))
+    
+    return _respuesta_vehiculos(
+        vehiculos_json,
+        eliminados=delta.eliminados(desde, hasta),
+        token=delta.crear_token(max(desde, hasta)),
+    )
+
+
+@require_http_methods(["GET"])
+@gzip_page
+def vehiculos_batch_api(request):
+    """
+    Varios vehículos por id en una sola consulta, en el orden pedido.
+    Uso: /vehiculo/api/vehiculos/batch/?ids=3,1,7&fields=id,marca&expand=vendedor
+    Como en vehiculos_api, solo vehículos activos: los ids inexistentes o
+    inactivos se informan en 'not_found'.
+    """
+    try:
+        ids = parse_ids(request.GET.get('ids'))
+        fields = parse_fields(request.GET.get('fields'))
+        expand = parse_expand(request.GET.get('expand'))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    vehiculos_data, not_found = VehiculoSerializer(fields, expand).serialize_ids(
+        Vehiculo.objects.filter(activo=True), ids
+    )
     
     return JsonResponse({
         'success': True,
         'vehiculos': vehiculos_data,
-        'total_count': result['total_count']
+        'not_found': not_found,
+    })
+
+
+@require_http_methods(["GET"])
+@gzip_page
+def estadisticas_api(request):
+    """
+    Precios del mercado por marca, modelo, año y categoría: cantidad,
+    promedio, mínimo, percentiles 10/25/50/75/90 y máximo. Lee solo la
+    tabla materializada (ver vehiculo/estadisticas.py), nunca Vehiculo.
+    'desactualizada' indica un grupo con cambios posteriores al cálculo.
+
+    Filtros opcionales: marca, modelo, año, categoria.
+    """
+    try:
+        filtros = estadisticas.parse_filtros(request.GET)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'estadisticas': estadisticas.consultar(filtros),
+    })
+
+
+# ============================================================================
+# VISTAS ASYNC (ASGI)
+# ============================================================================
+# Mismas respuestas que sus pares sync, pero con el ORM async: bajo ASGI un
+# request que espera I/O no ocupa un hilo del pool mientras tanto.
+
+@require_http_methods(["GET"])
+@gzip_page
+async def vehiculos_api_async(request):
+    """Versión async de vehiculos_api (mismos parámetros y respuesta)."""
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+        expand = parse_expand(request.GET.get('expand'))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    if 'since' in request.GET:
+        return await _avehiculos_delta(request, fields, expand)
+    
+    corte = delta.corte_actual()
+    filter_service = VehicleFilterService()
+    filters = _filtros_listado(request)
+    
+    # Construir el queryset no consulta la base de datos
+    try:
+        filter_service.validate_input(filters=filters)
+        queryset = filter_service.perform_operation(filters=filters)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+    
+    vehiculos_json = await VehiculoSerializer(fields, expand).aserialize_json(queryset)
+    
+    return _respuesta_vehiculos(
+        vehiculos_json, total_count=await queryset.acount(), **_token_listado(filters, corte)
+    )
+
+
+async def _avehiculos_delta(request, fields, expand):
+    """Versión async de _vehiculos_delta."""
+    desde, error = _leer_since(request)
+    if error:
+        return error
+    
+    hasta = delta.corte_actual()
+    vehiculos_json = await VehiculoSerializer(fields, expand).aserialize_json(delta.vehiculos_cambiados(desde, hasta))
+    
+    return _respuesta_vehiculos(
+        vehiculos_json,
+        eliminados=await delta.aeliminados(desde, hasta),
+        token=delta.crear_token(max(desde, hasta)),
+    )
+
+
+@login_required
+@require_http_methods(["GET"])
+@gzip_page
+async def detalle_vehiculo_api_async(request, pk):
+    """
+    Detalle de un vehículo en JSON: todos los campos públicos, vendedor,
+    imágenes y si es favorito del usuario.
+    """
+    serializer = VehiculoSerializer(CAMPOS, ('vendedor', 'imagenes'))
+    try:
+        fila = await Vehiculo.objects.values_list(*serializer.columnas).aget(pk=pk)
+    except Vehiculo.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Vehículo no encontrado'}, status=404)
+    
+    usuario = await request.auser()
+    vehiculo_data, = await serializer.aserialize_filas([fila])
+    vehiculo_data['is_favorite'] = await Favorito.objects.filter(usuario=usuario, vehiculo_id=pk).aexists()
+    
+    return JsonResponse({'success': True, 'vehiculo': vehiculo_data})
+
+
+@login_required
+@require_http_methods(["POST"])
+async def toggle_favorito_async(request, pk):
+    """Versión async de toggle_favorito."""
+    try:
+        vehiculo = await Vehiculo.objects.aget(pk=pk)
+    except Vehiculo.DoesNotExist:
+        raise Http404('Vehículo no encontrado')
+    
+    # El ORM async no abre transacciones: el servicio corre en el hilo de la base de datos
+    result = await sync_to_async(FavoriteToggleService().execute)(await request.auser(), vehiculo)
+    
+    return JsonResponse(result, status=200 if result['success'] else 400)
+
+
+@require_http_methods(["GET"])
+async def vehiculos_eventos(request):
+    """
+    Feed SSE de altas, cambios y bajas del catálogo (ver vehiculo/eventos.py).
+    Uso: new EventSource('/vehiculo/api/vehiculos/eventos/?categoria=SUV&precio_max=30000')
+    Filtros opcionales: marca, categoria, precio_min, precio_max.
+    """
+    try:
+        filtros = eventos.parse_filtros(request.GET)
+        ultimo_id = eventos.parse_last_event_id(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    # Sin ultimo_id (primera conexión) el flujo envía solo lo que ocurra desde ahora
+    response = StreamingHttpResponse(eventos.flujo(filtros, ultimo_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Sin buffer en nginx
+    return response
+
+
+@require_http_methods(["GET", "HEAD"])
+def imagen_proxy(request):
+    """
+    Sirve imágenes de proveedores externos desde la caché local en disco.
+    Uso: /img/?src=<url del proveedor>&r=<full|thumb>
+    """
+    src = request.GET.get('src', '')
+    rendition = request.GET.get('r', 'full')
+
+    if not image_proxy.is_allowed_source(src):
+        return HttpResponseBadRequest('Origen de imagen no permitido')
+    if rendition not in cdn_config.IMAGE_RENDITIONS:
+        return HttpResponseBadRequest('Variante de imagen no válida')
+
+    data, content_type, cacheable = image_proxy.get_image(src, rendition)
+    etag = image_proxy.compute_etag(data)
+
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(data, content_type=content_type)
+    response['ETag'] = etag
+    response['Cache-Control'] = image_proxy.cache_control(cacheable)
+    return response
+
+
+@staff_member_required
+@require_http_methods(["GET"])
+def imagenes_salud_api(request):
+    """
+    Estado de los proveedores de imágenes: latencia, tasa de errores y
+    estado del circuit breaker de cada uno.
+    """
+    return JsonResponse({
+        'success': True,
+        'proveedores': image_registry.health(),
+    })
+
+
+@staff_member_required
+@require_http_methods(["GET"])
+def cache_estadisticas_api(request):
+    """
+    Estadísticas de la caché de dos niveles de este proceso: aciertos en
+    L1 y L2, fallos y tasa de aciertos por namespace.
+    """
+    return JsonResponse({
+        'success': True,
+        'cache': vehiculo_cache.stats(),
+    })
+
+
+@staff_member_required
+@require_http_methods(["GET"])
+def ratelimit_estadisticas_api(request):
+    """
+    Contadores del límite de peticiones de este proceso: permitidos,
+    rechazados (consultando la caché) y rechazados locales (sin consultarla)
+    por regla.
+    """
+    return JsonResponse({
+        'success': True,
+        'ratelimit': limiter.stats(),
     })
 
 
@@ -345,6 +692,17 @@ def _user_can_edit_vehicle(user, vehiculo):
     return any(strategy() for strategy in permission_strategies)
 
 
+def _respuesta_vehiculos(vehiculos_json, **extra):
+    """
+    Respuesta JSON con el arreglo 'vehiculos' ya codificado por
+    VehiculoSerializer.serialize_json; 'extra' se codifica como siempre.
+    """
+    cuerpo = '{"success":true,"vehiculos":' + vehiculos_json
+    for clave, valor in extra.items():
+        cuerpo += ',' + json.dumps(clave) + ':' + json.dumps(valor, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return HttpResponse(cuerpo + '}', content_type='application/json')
+
+
 # ============================================================================
 # MANEJO DE ERRORES
 # ============================================================================
@@ -385,13 +743,16 @@ def perfil_usuario(request):
         return redirect('vehiculo:perfil')
     
     # Obtener estadísticas del usuario
-    vehiculos_count = Vehiculo.objects.filter(vendedor=request.user).count()
-    # TODO: Implementar sistema de favoritos en el modelo
-    favoritos_count = 0  # Placeholder
+    # Una sola consulta para las publicaciones y los favoritos que recibieron
+    publicaciones = Vehiculo.objects.filter(vendedor=request.user).aggregate(
+        total=Count('id'),
+        favoritos_recibidos=Sum('total_favoritos'),
+    )
     
     context = {
-        'vehiculos_count': vehiculos_count,
-        'favoritos_count': favoritos_count,
+        'vehiculos_count': publicaciones['total'],
+        'favoritos_count': total_favoritos_usuario(request.user),
+        'favoritos_recibidos': publicaciones['favoritos_recibidos'] or 0,
     }
     
     return render(request, 'vehiculo/perfil.html', context)
@@ -442,22 +803,53 @@ def toggle_favorito(request, pk):
     """
     vehiculo = get_object_or_404(Vehiculo, pk=pk)
     
-    # Intentar obtener el favorito existente
-    favorito = Favorito.objects.filter(usuario=request.user, vehiculo=vehiculo).first()
+    # Alta/baja del favorito y ajuste de contadores en una sola transacción
+    result = FavoriteToggleService().execute(request.user, vehiculo)
     
-    if favorito:
-        # Si existe, eliminarlo
-        favorito.delete()
-        is_favorite = False
-        message = 'Eliminado de favoritos'
-    else:
-        # Si no existe, crearlo
-        Favorito.objects.create(usuario=request.user, vehiculo=vehiculo)
-        is_favorite = True
-        message = 'Agregado a favoritos'
+    return JsonResponse(result, status=200 if result['success'] else 400)
+
+
+@login_required
+@require_http_methods(["PUT", "DELETE"])
+def favorito(request, pk):
+    """
+    Favorito idempotente: PUT lo marca y DELETE lo quita, sin importar el
+    estado previo. Repetir la petición (doble clic, reintentos) no cambia
+    nada. 'changed' indica si esta petición modificó el estado.
+    """
+    with transaction.atomic():
+        if request.method == 'PUT':
+            changed = agregar_favorito(request.user.pk, pk)
+        else:
+            changed = quitar_favorito(request.user.pk, pk)
+        total = total_favoritos_vehiculo(pk)
+    
+    if total is None:
+        return JsonResponse({'success': False, 'error': 'Vehículo no encontrado'}, status=404)
     
     return JsonResponse({
         'success': True,
-        'is_favorite': is_favorite,
-        'message': message
+        'is_favorite': request.method == 'PUT',
+        'changed': changed,
+        'total_favoritos': total,
     })
+
+
+@login_required
+@require_http_methods(["POST"])
+def favoritos_batch(request):
+    """
+    Alta y baja de varios favoritos en una sola petición.
+    Cuerpo JSON: {"add": [1, 2], "remove": [3]}
+    Retorna el conjunto de favoritos resultante.
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'JSON no válido'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'success': False, 'error': 'Se esperaba un objeto JSON'}, status=400)
+    
+    result = FavoriteBatchService().execute(request.user, data.get('add'), data.get('remove'))
+    
+    return JsonResponse(result, status=200 if result['success'] else 400)
@@ -0,0 +1,131 @@
+"""
+Precalentamiento de procesos recién arrancados.
+
+El primer request de cada worker pagaba la compilación de plantillas y la
+importación diferida de módulos pesados. Aquí se hace por adelantado:
+
+- ``precargar_modulos`` y ``compilar_plantillas`` no tocan la base de datos
+  y se ejecutan en ``VehiculoConfig.ready`` si ``VEHICULO_WARMUP_ON_STARTUP``
+  está activo.
+- ``cebar_caches`` consulta la base de datos, así que solo la ejecuta el
+  comando ``manage.py warmup`` (las cachés L2 son compartidas entre workers).
+
+Cada paso devuelve un detalle corto; ``ejecutar`` mide el tiempo de cada uno.
+"""
+import importlib
+import logging
+import os
+import time
+
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+from django.template.loaders.cached import Loader as CachedLoader
+
+logger = logging.getLogger(__name__)
+
+# Módulos que se importaban en el primer request que los necesitaba
+MODULOS_PESADOS = (
+    'requests',
+    'PIL.Image',
+    'crispy_forms.helper',
+    'crispy_forms.templatetags.crispy_forms_tags',
+    'crispy_bootstrap5',
+    'django_bootstrap5.templatetags.django_bootstrap5',
+    'vehiculo.image_proxy',
+    'vehiculo.forms',
+)
+
+
+def precargar_modulos():
+    for nombre in MODULOS_PESADOS:
+        importlib.import_module(nombre)
+    # Pillow registra sus codecs de forma perezosa en el primer open()
+    from PIL import Image
+    Image.init()
+    return f'{len(MODULOS_PESADOS)} módulos'
+
+
+def _directorios_plantillas(backend):
+    """Directorios de DIRS y de las apps que no son django.contrib."""
+    from django.apps import apps
+
+    directorios = [str(d) for d in backend.engine.dirs]
+    if backend.engine.app_dirs:
+        for app_config in apps.get_app_configs():
+            if app_config.name.startswith('django.contrib.'):
+                continue
+            directorio = os.path.join(app_config.path, 'templates')
+            if os.path.isdir(directorio):
+                directorios.append(directorio)
+    return directorios
+
+
+def compilar_plantillas():
+    """
+    Compila todas las plantillas del proyecto con el loader cacheado, que
+    las conserva en memoria para el resto de la vida del proceso.
+    """
+    compiladas = 0
+    errores = 0
+    for backend in engines.all():
+        if not isinstance(backend, DjangoTemplates):
+            continue
+        if not any(isinstance(loader, CachedLoader) for loader in backend.engine.template_loaders):
+            logger.warning('El motor %s no usa el loader cacheado: precompilar no sirve', backend.name)
+            continue
+        for directorio in _directorios_plantillas(backend):
+            for raiz, _dirs, archivos in os.walk(directorio):
+                for archivo in archivos:
+                    if not archivo.endswith(('.html', '.txt')):
+                        continue
+                    nombre = os.path.relpath(os.path.join(raiz, archivo), directorio).replace(os.sep, '/')
+                    try:
+                        backend.get_template(nombre)
+                        compiladas += 1
+                    except Exception as e:
+                        errores += 1
+                        logger.warning('No se pudo compilar %s: %s', nombre, e)
+    detalle = f'{compiladas} plantillas'
+    if errores:
+        detalle += f', {errores} con errores'
+    return detalle
+
+
+def cebar_caches(tarjetas=50):
+    """Llena las cachés compartidas: filtros, contadores y tarjetas de la portada."""
+    from .contadores import obtener_contadores
+    from .fragmentos import renderizar_tarjetas
+    from .models import Vehiculo
+    from .services.vehicle_filter_service import VehicleFilterService
+
+    VehicleFilterService().get_filter_options()
+    obtener_contadores()
+
+    vehiculos = list(Vehiculo.objects.filter(activo=True).order_by('-fecha_creacion')[:tarjetas])
+    renderizar_tarjetas(vehiculos, 'vehiculo/partials/tarjeta_vehiculo.html')
+    return f'filtros, contadores y {len(vehiculos)} tarjetas'
+
+
+PASOS_ARRANQUE = (
+    ('módulos', precargar_modulos),
+    ('plantillas', compilar_plantillas),
+)
+
+
+def ejecutar(pasos):
+    """Ejecuta ``[(nombre, función)]`` y devuelve ``[(nombre, segundos, detalle)]``."""
+    resultados = []
+    for nombre, paso in pasos:
+        inicio = time.perf_counter()
+        detalle = paso()
+        resultados.append((nombre, time.perf_counter() - inicio, detalle))
+    return resultados
+
+
+def al_arrancar():
+    """Hook de ``AppConfig.ready``: nunca debe impedir que el proceso arranque."""
+    try:
+        for nombre, segundos, detalle in ejecutar(PASOS_ARRANQUE):
+            logger.info('warmup %s: %s en %.0f ms', nombre, detalle, segundos * 1000)
+    except Exception:
+        logger.exception('Falló el precalentamiento al arrancar')